@@ -0,0 +1,44 @@
+"""
+Benchmark of the two ways of handing a CSP to Sugar (see setTransport)
+'expr' : Sugar expressions built node by node over JPype
+'text' : S-expression text parsed by Sugar in one call
+Both must give the same CNF
+
+python bench_transport.py [n]
+"""
+import sys
+import time
+from coppy import *
+from coppy.sugar import Solver
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+# n-queens with a few linear and boolean side constraints
+qs = IntList('q', n, 0, n - 1)
+ps = BoolList('p', n)
+add(Alldifferent(qs))
+add(Alldifferent([q + i for i, q in enumerate(qs)]))
+add(Alldifferent([q - i for i, q in enumerate(qs)]))
+for i in range(n - 1):
+    add(Imp(ps[i], qs[i] + 2 * qs[i + 1] <= n))
+    add(Or(ps[i], Abs(qs[i] - qs[i + 1]) >= 3, Max(qs[i], qs[i + 1]) == n - 1))
+add(Sum(qs[:n // 2]) >= n)
+
+cnfs = dict()
+# each mode twice, so that both are measured with a warmed up JVM
+for mode in ['expr', 'text'] * 2:
+    setTransport(mode)
+    solver = Solver('sat4j')
+    t = time.time()
+    expressions = solver.encoder.translator.toSugar(csp)
+    translated = time.time() - t
+    solver.renewSugar()
+    t = time.time()
+    solver.encode(csp)
+    encoded = time.time() - t
+    with open(solver.satFileName) as f:
+        cnfs[mode] = f.read()
+    print(f'{mode}: translate {translated:.3f}s, encode {encoded:.3f}s ({expressions.size()} expressions)')
+    solver.close()
+
+print('identical CNF' if cnfs['expr'] == cnfs['text'] else 'DIFFERENT CNF')
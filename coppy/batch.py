@@ -0,0 +1,216 @@
+"""
+Evaluation of terms and constraints over many solutions at once with NumPy
+
+A solution matrix has one row per solution and one column per variable:
+ints[i, j] is the value of csp.variables[j] and bools[i, j] the value of csp.bools[j] in the i-th solution
+(the column of a variable is its id in csp.varIds / csp.boolIds)
+"""
+from .csp import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def solutionMatrix(sols, csp=None):
+    """
+    (ints, bools) solution matrices of the solutions sols
+    """
+    if np is None:
+        raise Exception('NumPy is required for batch evaluation')
+    csp = csp if csp is not None else currentCsp()
+    ints = np.array([[sol.intValues[x] for x in csp.variables] for sol in sols], dtype=np.int64).reshape(len(sols), len(csp.variables))
+    bools = np.array([[sol.boolValues[p] for p in csp.bools] for sol in sols], dtype=bool).reshape(len(sols), len(csp.bools))
+    return ints, bools
+
+def evaluate(e, ints, bools=None, csp=None):
+    """
+    Values of the term or constraint e (or of each of a list of them) in each row of the solution matrices
+    """
+    evaluator = BatchEvaluator(ints, bools, csp)
+    if isinstance(e, (list, tuple)):
+        return [evaluator.evaluate(x) for x in e]
+    return evaluator.evaluate(e)
+
+def checkSolutions(ints, bools=None, csp=None):
+    """
+    Check each row of the solution matrices against the domains and the constraints of csp
+    Return (mask, violations):
+        mask[i] : whether the i-th solution satisfies csp (as CSP.satisfiedBy)
+        violations[k] : number of solutions violating csp.constraints[k]
+    """
+    evaluator = BatchEvaluator(ints, bools, csp)
+    csp = evaluator.csp
+    mask = np.ones(evaluator.size, dtype=bool)
+    for (j, x) in enumerate(csp.variables):
+        d = csp.dom[x]
+        column = evaluator.ints[:, j]
+        if isinstance(d, IntervalDomain):
+            mask &= (d.lo <= column) & (column <= d.hi)
+        else:
+            mask &= np.isin(column, np.array(sorted(d.values), dtype=np.int64))
+    violations = np.zeros(len(csp.constraints), dtype=np.int64)
+    for (k, c) in enumerate(csp.constraints):
+        satisfied = evaluator.evaluate(c)
+        violations[k] = evaluator.size - np.count_nonzero(satisfied)
+        mask &= satisfied
+    return mask, violations
+
+class BatchEvaluator:
+    """
+    Evaluate nodes over all the rows of the solution matrices
+    Each node is evaluated once (shared nodes are memoized by id), giving an int64 array for a term
+    and a bool array for a constraint, with one element per solution
+    """
+    def __init__(self, ints, bools=None, csp=None):
+        if np is None:
+            raise Exception('NumPy is required for batch evaluation')
+        self.csp = csp if csp is not None else currentCsp()
+        self.ints = np.asarray(ints, dtype=np.int64).reshape(-1, len(self.csp.variables))
+        self.size = len(self.ints)
+        if bools is None:
+            bools = np.zeros((self.size, len(self.csp.bools)), dtype=bool)
+        self.bools = np.asarray(bools, dtype=bool).reshape(self.size, len(self.csp.bools))
+        # evaluated nodes by id (the node is kept to pin its id)
+        self.values = dict()
+
+    def evaluate(self, x):
+        hit = self.values.get(id(x))
+        if hit is not None:
+            return hit[1]
+        for t in type(x).__mro__:
+            f = batchEvaluators.get(t)
+            if f is not None:
+                break
+        else:
+            raise Exception('cannot evaluate ' + str(x))
+        v = f(self, x)
+        self.values[id(x)] = (x, v)
+        return v
+
+    def children(self, x):
+        return [self.evaluate(y) for y in x.children()]
+
+    def full(self, v, dtype=None):
+        return np.full(self.size, v, dtype=dtype or np.int64)
+
+    def varId(self, x):
+        if x.name not in self.csp.varIds:
+            raise Exception('undeclared variable ' + x.name)
+        return self.csp.varIds[x.name]
+
+    def variable(self, x):
+        return self.ints[:, self.varId(x)]
+
+    def bool(self, p):
+        if p.name not in self.csp.boolIds:
+            raise Exception('undeclared variable ' + p.name)
+        return self.bools[:, self.csp.boolIds[p.name]]
+
+    def linear(self, x):
+        ids = [self.varId(y) for y in x.xs]
+        return self.ints[:, ids] @ np.frombuffer(x.coefs, dtype=np.int64) + x.const
+
+    def sub(self, x):
+        vs = self.children(x)
+        if len(vs) == 0:
+            return self.full(0)
+        return vs[0] - sum(vs[1:], self.full(0))
+
+    def div(self, x):
+        # floor division as Sugar
+        with np.errstate(divide='ignore'):
+            return np.floor_divide(self.evaluate(x.x0), self.evaluate(x.x1))
+
+    def mod(self, x):
+        with np.errstate(divide='ignore'):
+            return np.mod(self.evaluate(x.x0), self.evaluate(x.x1))
+
+    def table(self, x):
+        k = len(x.xs)
+        tuples = np.frombuffer(x.tuples, dtype=np.int64).reshape(-1, k)
+        values = np.stack(self.children(x), axis=1)
+        # a row is in the table if it gets the id of a tuple among the distinct rows of both
+        _, ids = np.unique(np.vstack([tuples, values]), axis=0, return_inverse=True)
+        ids = ids.reshape(-1)
+        return np.isin(ids[len(tuples):], ids[:len(tuples)]) == x.support
+
+    def tasks(self, xs):
+        if len(xs) == 0:
+            return np.zeros((self.size, 0), dtype=np.int64)
+        return np.stack([self.evaluate(y) for y in xs], axis=1).reshape(self.size, len(xs))
+
+    def cumulative(self, x):
+        starts, durations, demands = self.tasks(x.starts), self.tasks(x.durations), self.tasks(x.demands)
+        # the load changes at the starts and the ends of the tasks of positive duration
+        demands = np.where(durations > 0, demands, 0)
+        times = np.concatenate([starts, starts + durations], axis=1)
+        changes = np.concatenate([demands, -demands], axis=1)
+        # sweep of each row by time, each time checked after all its changes
+        order = np.lexsort((changes, times), axis=1)
+        times = np.take_along_axis(times, order, axis=1)
+        loads = np.cumsum(np.take_along_axis(changes, order, axis=1), axis=1)
+        last = np.ones(times.shape, dtype=bool)
+        last[:, :-1] = times[:, :-1] != times[:, 1:]
+        return ((loads <= self.evaluate(x.capacity)[:, None]) | ~last).all(axis=1)
+
+    def disjunctive(self, x):
+        starts, durations = self.tasks(x.starts), self.tasks(x.durations)
+        # tasks of positive duration sorted by start (the others at the end), each one ends before the next
+        empty = durations <= 0
+        order = np.lexsort((starts, empty), axis=1)
+        starts, durations, empty = [np.take_along_axis(a, order, axis=1) for a in (starts, durations, empty)]
+        ends = starts + durations
+        return ((ends[:, :-1] <= starts[:, 1:]) | empty[:, 1:]).all(axis=1)
+
+    def element(self, x):
+        index = self.evaluate(x.index)
+        inside = (0 <= index) & (index < len(x.array))
+        if len(x.array) == 0:
+            return inside
+        values = self.tasks(x.array)
+        picked = np.take_along_axis(values, np.clip(index, 0, len(x.array) - 1)[:, None], axis=1)[:, 0]
+        return inside & (picked == self.evaluate(x.item))
+
+    def alldifferent(self, x):
+        if len(x.xs) < 2:
+            return self.full(True, bool)
+        vs = np.sort(np.stack(self.children(x), axis=1), axis=1)
+        return (np.diff(vs, axis=1) != 0).all(axis=1)
+
+# functions evaluating each type of node
+batchEvaluators = {
+    Num: lambda ev, x: ev.full(x.v),
+    Var: BatchEvaluator.variable,
+    LinearExpr: BatchEvaluator.linear,
+    Abs: lambda ev, x: np.abs(ev.evaluate(x.x0)),
+    Neg: lambda ev, x: -ev.evaluate(x.x0),
+    Add: lambda ev, x: sum(ev.children(x), ev.full(0)),
+    Sum: lambda ev, x: sum(ev.children(x), ev.full(0)),
+    Sub: BatchEvaluator.sub,
+    Mul: lambda ev, x: np.prod(np.stack(ev.children(x)), axis=0),
+    Div: BatchEvaluator.div,
+    Mod: BatchEvaluator.mod,
+    Max: lambda ev, x: np.max(np.stack(ev.children(x)), axis=0),
+    Min: lambda ev, x: np.min(np.stack(ev.children(x)), axis=0),
+    If: lambda ev, x: np.where(ev.evaluate(x.c), ev.evaluate(x.x0), ev.evaluate(x.x1)),
+    TRUE: lambda ev, x: ev.full(True, bool),
+    FALSE: lambda ev, x: ev.full(False, bool),
+    BOOL: BatchEvaluator.bool,
+    Not: lambda ev, x: ~ev.evaluate(x.c0),
+    And: lambda ev, x: np.logical_and.reduce([ev.full(True, bool)] + ev.children(x)),
+    Or: lambda ev, x: np.logical_or.reduce([ev.full(False, bool)] + ev.children(x)),
+    Imp: lambda ev, x: ~ev.evaluate(x.c0) | ev.evaluate(x.c1),
+    Xor: lambda ev, x: ev.evaluate(x.c0) != ev.evaluate(x.c1),
+    Iff: lambda ev, x: ev.evaluate(x.c0) == ev.evaluate(x.c1),
+    Eq: lambda ev, x: ev.evaluate(x.x0) == ev.evaluate(x.x1),
+    Ne: lambda ev, x: ev.evaluate(x.x0) != ev.evaluate(x.x1),
+    Le: lambda ev, x: ev.evaluate(x.x0) <= ev.evaluate(x.x1),
+    Lt: lambda ev, x: ev.evaluate(x.x0) < ev.evaluate(x.x1),
+    Ge: lambda ev, x: ev.evaluate(x.x0) >= ev.evaluate(x.x1),
+    Gt: lambda ev, x: ev.evaluate(x.x0) > ev.evaluate(x.x1),
+    Alldifferent: BatchEvaluator.alldifferent,
+    Table: BatchEvaluator.table,
+    Cumulative: BatchEvaluator.cumulative,
+    Disjunctive: BatchEvaluator.disjunctive,
+    Element: BatchEvaluator.element,
+}
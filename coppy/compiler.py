@@ -0,0 +1,153 @@
+"""
+Compilation of terms and constraints into Python functions
+
+compileExpr(e, csp) generates one function f(iv, bv) computing e.value(solution) from the values of the solution indexed by variable id:
+iv[i] is the value of csp.variables[i] and bv[j] the value of csp.bools[j] (see Solution.valueArrays).
+The body is straight-line code: each distinct node below e is computed once into a local variable (in post order),
+so shared nodes are not computed again and deep expressions need no recursion
+"""
+import math
+import operator
+from .csp import *
+
+# n-ary operators with more operands are computed by sum or prod over a tuple (a long chain of + nests too deeply for the Python compiler)
+maxChain = 16
+
+def alldifferent(vs):
+    return len(set(vs)) == len(vs)
+
+class ExprCompiler:
+    """
+    Generate the source of the function computing a node (see compileExpr)
+    """
+    def __init__(self, e, csp):
+        self.e = e
+        self.ivs = csp.varIds
+        self.bvs = csp.boolIds
+        # names used by the generated code
+        self.env = {'alldifferent': alldifferent, 'cumulativeHolds': cumulativeHolds, 'disjunctiveHolds': disjunctiveHolds, 'mul': operator.mul, 'prod': math.prod}
+        self.lines = []
+
+    def constant(self, v):
+        name = 'k' + str(len(self.env))
+        self.env[name] = v
+        return name
+
+    def atom(self, x):
+        if isinstance(x, Var):
+            return 'iv[' + str(self.ivs[x.name]) + ']'
+        if isinstance(x, BOOL):
+            return 'bv[' + str(self.bvs[x.name]) + ']'
+        if isinstance(x, Num):
+            return '(' + repr(x.v) + ')'
+        if isinstance(x, TRUE):
+            return 'True'
+        if isinstance(x, FALSE):
+            return 'False'
+        return None
+
+    def compile(self):
+        if any([x.name not in self.ivs for x in self.e.variables()]) or any([p.name not in self.bvs for p in self.e.bools()]):
+            return None
+        # code of each node by id (the nodes are pinned by self.e)
+        codes = dict()
+        stack = [(self.e, False)]
+        while stack:
+            x, expanded = stack.pop()
+            if id(x) in codes:
+                continue
+            a = self.atom(x)
+            if a is not None:
+                codes[id(x)] = a
+            elif not expanded:
+                stack.append((x, True))
+                stack.extend([(y, False) for y in reversed(x.children())])
+            else:
+                for t in type(x).__mro__:
+                    f = exprCompilers.get(t)
+                    if f is not None:
+                        break
+                else:
+                    return None
+                name = 't' + str(len(self.lines))
+                self.lines.append('    ' + name + ' = ' + f(self, x, [codes[id(y)] for y in x.children()]))
+                codes[id(x)] = name
+        source = 'def f(iv, bv):\n' + ''.join([line + '\n' for line in self.lines]) + '    return ' + codes[id(self.e)] + '\n'
+        exec(compile(source, '<' + type(self.e).__name__ + '>', 'exec'), self.env)
+        return self.env['f']
+
+    def linear(self, x, args):
+        terms = [(a, y, v) for (a, y, v) in zip(x.coefs, x.xs, args) if a != 0]
+        if len(terms) <= maxChain:
+            return ' + '.join([v if a == 1 else str(a) + '*' + v for (a, y, v) in terms] + [str(x.const)])
+        coefs = self.constant(tuple([a for (a, y, v) in terms]))
+        values = self.constant(operator.itemgetter(*[self.ivs[y.name] for (a, y, v) in terms]))
+        return 'sum(map(mul, ' + coefs + ', ' + values + '(iv))) + ' + str(x.const)
+
+def nary(op, function, empty):
+    def f(compiler, x, args):
+        if len(args) == 0:
+            return empty
+        if len(args) <= maxChain:
+            return '(' + op.join(args) + ')'
+        return function + '((' + ', '.join(args) + ',))'
+    return f
+
+def sub(compiler, x, args):
+    if len(args) == 0:
+        return '0'
+    if len(args) <= maxChain:
+        return ' - '.join(args)
+    return args[0] + ' - sum((' + ', '.join(args[1:]) + ',))'
+
+def extremum(function):
+    def f(compiler, x, args):
+        if len(args) == 1:
+            return args[0]
+        return function + '((' + ', '.join(args) + ',))'
+    return f
+
+def infix(op):
+    return lambda compiler, x, args: args[0] + op + args[1]
+
+# functions giving the code of each type of node from the code of its children
+exprCompilers = {
+    LinearExpr: ExprCompiler.linear,
+    Abs: lambda compiler, x, args: 'abs(' + args[0] + ')',
+    Neg: lambda compiler, x, args: '-' + args[0],
+    Add: nary(' + ', 'sum', '0'),
+    Sum: nary(' + ', 'sum', '0'),
+    Sub: sub,
+    Mul: nary(' * ', 'prod', '1'),
+    Div: infix(' // '),
+    Mod: infix(' % '),
+    Max: extremum('max'),
+    Min: extremum('min'),
+    If: lambda compiler, x, args: args[1] + ' if ' + args[0] + ' else ' + args[2],
+    Not: lambda compiler, x, args: 'not ' + args[0],
+    And: nary(' and ', 'all', 'True'),
+    Or: nary(' or ', 'any', 'False'),
+    Imp: lambda compiler, x, args: 'not ' + args[0] + ' or ' + args[1],
+    Xor: infix(' ^ '),
+    Iff: infix(' == '),
+    Eq: infix(' == '),
+    Ne: infix(' != '),
+    Le: infix(' <= '),
+    Lt: infix(' < '),
+    Ge: infix(' >= '),
+    Gt: infix(' > '),
+    Alldifferent: lambda compiler, x, args: 'alldifferent((' + ', '.join(args) + ',))',
+    # hashed lookup in the set of tuples
+    Table: lambda compiler, x, args: '(' + ', '.join(args) + ',) ' + ('in ' if x.support else 'not in ') + compiler.constant(x.rowSet()),
+    Cumulative: lambda compiler, x, args: 'cumulativeHolds(' + ', '.join(['(' + ''.join([a + ', ' for a in args[k * len(x.starts):(k + 1) * len(x.starts)]]) + ')' for k in range(3)]) + ', ' + args[-1] + ')',
+    Disjunctive: lambda compiler, x, args: 'disjunctiveHolds((' + ''.join([a + ', ' for a in args[:len(x.starts)]]) + '), (' + ''.join([a + ', ' for a in args[len(x.starts):]]) + '))',
+    # the index is checked before the tuple of the array is indexed (a negative index would count from the end)
+    Element: lambda compiler, x, args: '(0 <= ' + args[0] + ' < ' + str(len(x.array)) + ' and (' + ''.join([a + ', ' for a in args[1:-1]]) + ')[' + args[0] + '] == ' + args[-1] + ')',
+}
+
+def compileExpr(e, csp):
+    """
+    Function f(iv, bv) computing the value of e from the values iv of csp.variables and bv of csp.bools
+    (None if e contains a node which cannot be compiled or a variable not declared in csp)
+    """
+    return ExprCompiler(e, csp).compile()
@@ -1,21 +1,34 @@
 from .csp import *
 from .sugar import *
+from .batch import *
+from .solutionset import *
+import os
+import sys
+import time
+import pickle
+import shutil
+import subprocess
+import threading
+from tempfile import mkdtemp
+from concurrent.futures import ThreadPoolExecutor
 
 class SatResult():
     def __init__(self, i):
         self.i = i
     
     def __eq__(self, other):
-        return self.i == other.i
+        return isinstance(other, SatResult) and self.i == other.i
     
     def __ne__(self, other):
-        return self.i != other.i
+        return not self == other
     
     def __str__(self):
         if self.i == 1:
             return 'SAT'
         elif self.i == -1:
             return 'UNSAT'
+        elif self.i == 0:
+            return 'UNKNOWN'
         else:
             return str(self.i)
     
@@ -24,185 +37,560 @@ class SatResult():
             return 'sat'
         elif self.i == -1:
             return 'unsat'
+        elif self.i == 0:
+            return 'unknown'
         else:
             return str(self.i)
 
 sat = SatResult(1)
 unsat = SatResult(-1)
+unknown = SatResult(0)
 
-solver = None
-__solution = None
-__solutions = []
 defaultSolver = 'sat4j'
+defaultPipeline = 'file'
+defaultEncoder = 'sugar'
+# models activated by 'with' in each thread
+_current = threading.local()
 
-# def init():
-#     global csp, solver, __solution, __solutions
-#     csp = CSP()
-#     solver= Solver(solver.solverName, solver.optNum)
-#     __solution = None
-#     __solutions = []
+class Model():
+    """
+    CSP with its own solver and solutions
+    Inside 'with model:', the variables (Int, Bool, BitVec...) are declared in the model
+    and the module functions (add, solve...) apply to it (the active model is local to each thread)
+    encoderName : 'sugar' or 'native' (see useEncoder)
+    """
+    def __init__(self, csp=None, encoderName=defaultEncoder):
+        self.csp = csp if csp is not None else CSP()
+        self.encoderName = encoderName
+        self.solver = None
+        self.__solution = None
+        self.__solutions = []
+        # whether solve() is enumerating on the current encoding (the next call blocks self.__solution)
+        self.__enumerating = False
+        self.__optimal = False
+
+    def __enter__(self):
+        pushCsp(self.csp)
+        if not hasattr(_current, 'models'):
+            _current.models = []
+        _current.models.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.models.pop()
+        popCsp()
+
+    def close(self):
+        if self.solver:
+            self.solver.close()
+            self.solver = None
+
+    def add(self, *c):
+        return self.csp.add(*c)
+
+    def commit(self):
+        self.csp.commit()
+
+    def cancel(self):
+        self.csp.cancel()
+
+    def minimize(self, x):
+        self.csp.minimize(x)
+
+    def maximize(self, x):
+        self.csp.maximize(x)
+
+    def isMinimize(self):
+        return self.csp.isMinimize()
+
+    def isMaximize(self):
+        return self.csp.isMaximize()
+
+    def objective(self):
+        return self.csp.objective
+
+    def clearObjective(self):
+        self.__stopEnumeration()
+        self.csp.clearObjective()
+
+    def satisfiedBy(self, solution):
+        return self.csp.satisfiedBy(solution)
+
+    def show(self):
+        print(self.csp.output(), end='')
+
+    #####################
+
+    def solve(self, solverName=defaultSolver, optNum=1, pipeline=defaultPipeline, project=None):
+        """
+        project : variables (Int or Bool) over which the next solutions must differ (all variables by default)
+        """
+        csp = self.csp
+        if not self.solver:
+            self.solver = Solver(solverName, optNum, pipeline, self.encoderName)
+        if csp.objective:
+            return self.optimize(solverName=solverName, optNum=optNum, pipeline=pipeline)
+        else:
+            if not self.__enumerating:
+                self.__solutions = []
+                res = self.solver.encode(csp)
+                if not res:
+                    self.__solution = None
+                    self.solver.renewSugar()
+                    return unsat
+                self.__enumerating = True
+            else:
+                csp.commit()
+                self.solver.commit()
+                self.__block(self.__solution, project)
+            self.__solution = self.solver.satSolve()
+            if self.__solution:
+                self.__solutions.append(self.__solution)
+                return sat
+            else:
+                self.__solution = None
+                self.__enumerating = False
+                self.solver.renewSugar()
+                return unsat
+
+    def optimize(self, strategy='binary', timeout=None, callback=None, solverName=defaultSolver, optNum=1, pipeline=defaultPipeline):
+        """
+        Optimize the objective set by minimize/maximize
+        strategy : name in 'strategies' ('binary', 'linear', 'unsat-sat', 'progressive')
+                   or a function taking an Incumbent
+        timeout : wall-clock seconds for the whole search
+        callback : called as callback(value, solution) on each improved solution
+        Return the best value found (isOptimal() tells whether it is proved optimal),
+        unsat, or unknown when the timeout expires before the first solution
+        """
+        csp = self.csp
+        if not self.solver:
+            self.solver = Solver(solverName, optNum, pipeline, self.encoderName)
+        if not csp.objective:
+            raise Exception('No objective is set')
+        if not callable(strategy):
+            strategy = strategies[strategy]
+        self.__solution = None
+        self.__stopEnumeration()
+        self.__optimal = False
+        v = csp.objective
+        inc = Incumbent(self, v, timeout, callback)
+        res = unknown
+        if self.solver.encode(csp):
+            csp.commit()
+            self.solver.commit()
+            try:
+                sol = self.solver.satSolve(inc.timeout())
+                if sol:
+                    inc.improve(sol)
+                    strategy(inc)
+                self.__optimal = True
+            except TimeoutError:
+                pass
+            csp.cancel()
+            if inc.best:
+                self.__solution = inc.best
+                res = self.solution(v)
+            elif self.__optimal:
+                res = unsat
+        else:
+            self.__optimal = True
+            res = unsat
+        self.solver.renewSugar()
+        return res
+
+    def __stopEnumeration(self):
+        """
+        End the enumeration of solve() (the encoder is renewed to encode the CSP again)
+        """
+        if self.__enumerating:
+            self.__enumerating = False
+            self.solver.renewSugar()
+
+    def isOptimal(self):
+        """
+        Whether the last optimization proved its result
+        """
+        return self.__optimal
+
+    def probeBounds(self, v, lo, hi, timeout=None):
+        """
+        Search a solution such that lo <= v <= hi
+        With sat4j the bounds are given as assumptions on the order encoding literals of v,
+        otherwise they are added as a constraint encoded incrementally, which is not committed
+        (so that the next probe does not inherit it)
+        """
+        if self.solver.canAssumeBounds(v):
+            return self.solver.satSolveBounds(v, lo, hi, timeout)
+        self.csp.cancel()
+        self.solver.cancel()
+        self.csp.add(And(lo <= v, v <= hi))
+        self.solver.encodeDelta(self.csp)
+        return self.solver.satSolve(timeout, commit=False)
+
+    def __block(self, sol, project=None):
+        """
+        Exclude the solution sol (restricted to the variables of project if given)
+        by a clause over the order encoding literals added to the SAT backend,
+        or by a constraint encoded incrementally when a variable has no SAT encoding
+        """
+        if project is None:
+            xs = [x for x in self.csp.variables if not x.aux]
+            ps = [p for p in self.csp.bools if not p.aux]
+        else:
+            xs = [x for x in project if isinstance(x, Var)]
+            ps = [p for p in project if isinstance(p, BOOL)]
+        if not self.solver.block(sol, xs, ps):
+            self.csp.add(blocking(sol, xs, ps))
+            self.solver.encodeDelta(self.csp)
+
+    def iterSolutions(self, limit=None, timeout=None, solverName=defaultSolver, optNum=1, pipeline=defaultPipeline, project=None):
+        """
+        Generate the solutions one by one as soon as they are found (no solution is kept)
+        limit : maximum number of solutions
+        timeout : wall-clock seconds for the whole enumeration (the generator stops when it expires)
+        project : variables (Int or Bool) over which the solutions are distinct (all variables by default)
+        The CSP is restored when the generator is exhausted or closed
+        """
+        csp = self.csp
+        if not self.solver:
+            self.solver = Solver(solverName, optNum, pipeline, self.encoderName)
+        self.__stopEnumeration()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        varsSize, boolsSize, consSize = csp.size()
+        count = 0
+        sol = None
+        try:
+            if not self.solver.encode(csp):
+                return
+            while limit is None or count < limit:
+                if sol:
+                    csp.commit()
+                    self.solver.commit()
+                    self.__block(sol, project)
+                sol = self.solver.satSolve(None if deadline is None else deadline - time.monotonic())
+                if not sol:
+                    break
+                count += 1
+                self.__solution = sol
+                yield sol
+        except TimeoutError:
+            pass
+        finally:
+            self.__solution = None
+            csp.cancel(varsSize, boolsSize, consSize)
+            self.solver.renewSugar()
+
+    def solveAll(self, solverName=defaultSolver, optNum=1, pipeline=defaultPipeline, jobs=1, split=None, cubes=None, project=None):
+        """
+        Search all solutions
+        project : variables (Int or Bool) over which the solutions are distinct (all variables by default)
+        jobs > 1 : cube-and-conquer, the search space is split into disjoint cubes
+                   enumerated by jobs worker processes and the solutions are merged
+                   (the cubes are dealt round-robin to the workers)
+        split : variable whose domain is split into the cubes
+                (by default order encoding literals x <= a of the largest domains are picked)
+        cubes : number of cubes (4 * jobs by default)
+        """
+        if jobs > 1:
+            return self.__solveAllCubes(solverName, optNum, pipeline, jobs, split, cubes or 4 * jobs, project)
+        # a fresh enumeration, even after solve()
+        self.__stopEnumeration()
+        varsSize, boolsSize, consSize = self.csp.size()
+        while self.solve(solverName, optNum, pipeline, project) == sat:
+            pass
+        self.csp.cancel(varsSize, boolsSize, consSize)
+        return self.__solutions
+
+    def __solveAllCubes(self, solverName, optNum, pipeline, jobs, split, n, project):
+        csp = self.csp
+        if self.solver:
+            solverName, optNum, pipeline = self.solver.solverName, self.solver.optNum, self.solver.pipeline
+        if split is None:
+            cubes = self.__orderCubes(n, project)
+        elif project is not None and all([x is not split for x in project]):
+            raise Exception('The split variable must be projected')
+        else:
+            cubes = [[(split, lo, hi)] for (lo, hi) in splitRange(csp.dom[split].lb(), csp.dom[split].ub(), n)]
+        workDir = mkdtemp(prefix='cube', dir=tmpDir)
+        # the workers import this package
+        paths = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        if 'PYTHONPATH' in os.environ:
+            paths.append(os.environ['PYTHONPATH'])
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(paths))
+        try:
+            def run(i):
+                task = {'csp': csp.getAll(), 'cubes': cubes[i::jobs], 'solver': (solverName, optNum, pipeline), 'encoder': self.encoderName, 'project': project}
+                outFileName = f'{workDir}/cube{i}.out'
+                res = subprocess.run([sys.executable, '-m', 'coppy.worker', outFileName], input=pickle.dumps(task), stderr=subprocess.PIPE, env=env)
+                if res.returncode != 0:
+                    raise Exception('Cube worker failed\n' + res.stderr.decode())
+                with open(outFileName, 'rb') as f:
+                    return pickle.load(f)
+            jobs = min(jobs, len(cubes))
+            with ThreadPoolExecutor(jobs) as executor:
+                results = list(executor.map(run, range(jobs)))
+        finally:
+            shutil.rmtree(workDir, True)
+        intVars = {x.name: x for x in csp.variables}
+        boolVars = {p.name: p for p in csp.bools}
+        self.__solution = None
+        self.__stopEnumeration()
+        self.__solutions = []
+        for i in range(len(cubes)):
+            for intValues, boolValues in results[i % jobs][i // jobs]:
+                self.__solutions.append(Solution({intVars[name]: v for name, v in intValues}, {boolVars[name]: v for name, v in boolValues}, csp))
+        return self.__solutions
+
+    def __orderCubes(self, n, project=None):
+        """
+        At least n cubes (if possible) made by halving the domains of the largest (projected) variables
+        Each cube is a list of (x, lo, hi)
+        """
+        dom = self.csp.dom
+        cubes = [[]]
+        if project is None:
+            xs = [x for x in self.csp.variables if not x.aux]
+        else:
+            xs = [x for x in project if isinstance(x, Var)]
+        xs = sorted(xs, key=lambda x: dom[x].lb() - dom[x].ub())
+        for x in xs:
+            if len(cubes) >= n:
+                break
+            lo, hi = dom[x].lb(), dom[x].ub()
+            if lo == hi:
+                break
+            mid = (lo + hi) // 2
+            cubes = [cube + [(x, lo, mid)] for cube in cubes] + [cube + [(x, mid + 1, hi)] for cube in cubes]
+        return cubes
+
+    def use(self, solverName, optNum=1, pipeline=defaultPipeline):
+        self.__enumerating = False
+        if self.solver:
+            self.solver.close()
+        self.solver = Solver(solverName, optNum, pipeline, self.encoderName)
+
+    def useEncoder(self, encoderName):
+        """
+        encoderName = 'sugar'  : encode the CSP to CNF by Sugar
+        encoderName = 'native' : encode it in Python (see native.py), by Sugar for unsupported constraints
+        """
+        if encoderName not in ('sugar', 'native'):
+            raise Exception(f'Invalid encoder {encoderName}')
+        self.encoderName = encoderName
+        if self.solver:
+            solver = self.solver
+            self.use(solver.solverName, solver.optNum, solver.pipeline)
+
+    def dump(self, fileName, format='csp'):
+        if format == 'csp':
+            # written without Sugar (nor the JVM)
+            dumpCsp(self.csp, fileName)
+            return
+        if not self.solver:
+            self.solver = Solver(defaultSolver, 1, encoderName=self.encoderName)
+        self.solver.dump(self.csp, fileName, format)
+
+    def solution(self, *args):
+        if len(args) == 0:
+            return self.allSolution()
+        if len(args) == 1:
+            if self.__solution:
+                return self.__solution.getValue(args[0])
+            else:
+                return None
+        elif len(args) == 2:
+            return args[0].getValue(args[1])
+
+    def allSolution(self, *args):
+        if len(args) == 0:
+            sol = self.__solution
+        elif len(args) == 1 and isinstance(args[0], Solution):
+            sol = args[0]
+        else:
+            return None
+        return sol.getAllValue()
+
+    def bitSolution(self, *args):
+        if len(args) == 1:
+            if self.__solution:
+                return self.__solution.getBitValue(args[0])
+            else:
+                None
+        elif len(args) == 2:
+            return args[0].getBitValue(args[1])
+
+def blocking(sol, xs, ps):
+    """
+    Constraint excluding the values of xs and ps in the solution sol
+    """
+    cs1 = [Eq(x, Num(sol.getValue(x))) for x in xs]
+    cs2 = [p if sol.getValue(p) else Not(p) for p in ps]
+    if len(cs1) == 0:
+        return Not(And(cs2))
+    elif len(cs2) == 0:
+        return Not(And(cs1))
+    else:
+        return Not(And(And(cs1), And(cs2)))
+
+def splitRange(lo, hi, n):
+    """
+    Split [lo, hi] into at most n disjoint ranges
+    """
+    n = max(1, min(n, hi - lo + 1))
+    bounds = [lo + (hi - lo + 1) * i // n for i in range(n + 1)]
+    return [(bounds[i], bounds[i + 1] - 1) for i in range(n)]
+
+class Incumbent():
+    """
+    State of an optimization of model seen as a minimization
+    (the objective value is negated for maximize)
+    lb, ub : bounds of the optimum cost, ub is the cost of best
+    """
+    def __init__(self, model, v, timeout=None, callback=None):
+        self.model = model
+        self.v = v
+        self.sign = -1 if model.isMaximize() else 1
+        lb, ub = model.csp.dom[v].lb(), model.csp.dom[v].ub()
+        self.lb, self.ub = (lb, ub) if self.sign == 1 else (-ub, -lb)
+        self.best = None
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.callback = callback
+
+    def timeout(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    def improve(self, sol):
+        self.best = sol
+        self.ub = self.sign * sol.getValue(self.v)
+        if self.callback:
+            self.callback(sol.getValue(self.v), sol)
+
+    def probe(self, hi):
+        """
+        Search a solution of cost in [lb, hi], otherwise raise lb to hi + 1
+        Return whether a solution is found
+        """
+        if self.sign == 1:
+            sol = self.model.probeBounds(self.v, self.lb, hi, self.timeout())
+        else:
+            sol = self.model.probeBounds(self.v, -hi, -self.lb, self.timeout())
+        if sol:
+            self.improve(sol)
+            return True
+        self.lb = hi + 1
+        return False
+
+def searchBinary(inc):
+    while inc.lb < inc.ub:
+        inc.probe((inc.lb + inc.ub) // 2)
+
+def searchLinear(inc):
+    """
+    SAT-UNSAT search: improve the incumbent one step at a time
+    """
+    while inc.lb < inc.ub:
+        inc.probe(inc.ub - 1)
+
+def searchUnsatSat(inc):
+    """
+    UNSAT-SAT search: raise the lower bound until it becomes satisfiable
+    """
+    while inc.lb < inc.ub:
+        inc.probe(inc.lb)
+
+def searchProgressive(inc):
+    """
+    Progressive search from the incumbent, the step doubles after each improvement
+    and is reset after each failure
+    """
+    step = 1
+    while inc.lb < inc.ub:
+        if inc.probe(max(inc.lb, inc.ub - step)):
+            step *= 2
+        else:
+            step = 1
+
+strategies = {
+    'binary': searchBinary,
+    'linear': searchLinear,
+    'unsat-sat': searchUnsatSat,
+    'progressive': searchProgressive,
+}
+
+defaultModel = Model(csp)
+
+def currentModel():
+    """
+    Model the module functions apply to (defaultModel, or the innermost model of 'with' in this thread)
+    """
+    models = getattr(_current, 'models', None)
+    return models[-1] if models else defaultModel
 
 def add(*c):
-    return csp.add(*c)
+    return currentModel().add(*c)
 
 def commit():
-    csp.commit()
+    currentModel().commit()
 
 def cancel():
-    csp.cancel()
+    currentModel().cancel()
 
 def minimize(x):
-    csp.minimize(x)
+    currentModel().minimize(x)
 
 def maximize(x):
-    csp.maximize(x)
+    currentModel().maximize(x)
 
 def isMinimize():
-    return csp.isMinimize()
+    return currentModel().isMinimize()
 
 def isMaximize():
-    return csp.isMaximize()
+    return currentModel().isMaximize()
 
 def objective():
-    return csp.objective
+    return currentModel().objective()
 
 def clearObjective():
-    csp.clearObjective()
+    currentModel().clearObjective()
 
 def satisfiedBy(solution):
-    return csp.satisfiedBy(solution)
+    return currentModel().satisfiedBy(solution)
 
 def show():
-    print(csp.output(), end='')
-
-#####################
-
-def solve(solverName=defaultSolver, optNum=1):
-    global __solution
-    global __solutions
-    global solver
-    if not solver:
-        solver = Solver(solverName, optNum)
-    if csp.objective:
-        __solution = None
-        v = csp.objective
-        lb = csp.dom[v].lb()
-        ub = csp.dom[v].ub()
-        solver.encode(csp)
-        csp.commit()
-        solver.commit()
-        __solution = solver.satSolve()
-        if __solution:
-            lastSolution = __solution
-            if isMinimize():
-                ub = solution(v)
-                while lb < ub:
-                    mid = (lb + ub) // 2
-                    csp.cancel()
-                    solver.cancel()
-                    add(And(lb <= v, v <= mid))
-                    solver.encodeDelta(csp)
-                    __solution = solver.satSolve()
-                    if __solution:
-                        ub = solution(v)
-                        lastSolution = __solution
-                    else:
-                        lb = mid + 1
-            else:
-                lb = solution(v)
-                while lb < ub:
-                    mid = (lb + ub + 1) // 2
-                    csp.cancel()
-                    solver.cancel()
-                    add(And(mid <= v, v <= ub))
-                    solver.encodeDelta(csp)
-                    __solution = solver.satSolve()
-                    if __solution:
-                        lb = solution(v)
-                        lastSolution = __solution
-                    else:
-                        ub = mid - 1
-            __solution = lastSolution
-            return solution(v)
-        else:
-            return unsat
-    else:
-        if len(__solutions) == 0:
-            res = solver.encode(csp)
-            if not res:
-                __solution = None
-                return unsat
-        else:
-            csp.commit()
-            solver.commit()
-            cs1 = [Eq(x, Num(__solution.getValue(x))) for x in csp.variables if not x.aux]
-            cs2 = [p if __solution.getValue(p) else Not(p) for p in csp.bools if not p.aux]
-            if len(cs1) == 0:
-                csp.add(Not(And(cs2)))
-            elif len(cs2) == 0:
-                csp.add(Not(And(cs1)))
-            else:
-                csp.add(Not(And(And(cs1), And(cs2))))
-            solver.encodeDelta(csp)
-        __solution = solver.satSolve()
-        if __solution:
-            __solutions.append(__solution)
-            return sat
-        else:
-            __solution = None
-            solver.renewSugar()
-            return unsat
-
-def solveAll(solverName=defaultSolver, optNum=1):
-    global __solutions
-    __solutions = []
-    varsSize, boolsSize, consSize = csp.size()
-    while solve(solverName, optNum) == sat:
-        pass
-    csp.cancel(varsSize, boolsSize, consSize)
-    return __solutions
-
-def use(solverName, optNum=1):
-    global solver
-    if not solver:
-        solver = Solver(solverName, optNum)
-    solver = Solver(solverName, optNum)
+    currentModel().show()
+
+def solve(solverName=defaultSolver, optNum=1, pipeline=defaultPipeline, project=None):
+    return currentModel().solve(solverName, optNum, pipeline, project)
+
+def optimize(strategy='binary', timeout=None, callback=None, solverName=defaultSolver, optNum=1, pipeline=defaultPipeline):
+    return currentModel().optimize(strategy, timeout, callback, solverName, optNum, pipeline)
+
+def isOptimal():
+    return currentModel().isOptimal()
+
+def iterSolutions(limit=None, timeout=None, solverName=defaultSolver, optNum=1, pipeline=defaultPipeline, project=None):
+    return currentModel().iterSolutions(limit, timeout, solverName, optNum, pipeline, project)
+
+def solveAll(solverName=defaultSolver, optNum=1, pipeline=defaultPipeline, jobs=1, split=None, cubes=None, project=None):
+    return currentModel().solveAll(solverName, optNum, pipeline, jobs, split, cubes, project)
+
+def use(solverName, optNum=1, pipeline=defaultPipeline):
+    currentModel().use(solverName, optNum, pipeline)
+
+def useEncoder(encoderName):
+    currentModel().useEncoder(encoderName)
 
 def dump(fileName, format='csp'):
-    global solver
-    if not solver:
-        solver = Solver(defaultSolver, 1)
-    solver.dump(csp, fileName, format)
+    currentModel().dump(fileName, format)
 
 def solution(*args):
-    global __solution
-    if len(args) == 0:
-        return allSolution()
-    if len(args) == 1:
-        if __solution:
-            return __solution.getValue(args[0])
-        else:
-            return None
-    elif len(args) == 2:
-        return args[0].getValue(args[1])
+    return currentModel().solution(*args)
 
 def allSolution(*args):
-    global __solution
-    global __solutions
-    if len(args) == 0:
-        sol = __solution
-    elif len(args) == 1 and isinstance(args[0], Solution):
-        sol = args[0]
-    else:
-        return None
-    return sol.getAllValue()
+    return currentModel().allSolution(*args)
 
 def bitSolution(*args):
-    global __solution
-    if len(args) == 1:
-        if __solution:
-            return __solution.getBitValue(args[0])
-        else:
-            None
-    elif len(args) == 2:
-        return args[0].getBitValue(args[1])
+    return currentModel().bitSolution(*args)
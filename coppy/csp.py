@@ -1,17 +1,81 @@
 import functools
 import operator
+import threading
+from array import array
 from abc import ABCMeta, abstractmethod
 
-class Expr(metaclass=ABCMeta):
+# shared nodes by structure while interning is on (see setInterning)
+internTable = None
+
+class ExprMeta(ABCMeta):
+    '''
+    metaclass of the nodes (setInterning installs internedCall as its __call__, so that building nodes costs nothing extra while interning is off)
+    '''
+    pass
+
+def internedCall(cls, *args, **kwargs):
+    e = type.__call__(cls, *args, **kwargs)
+    # a node built with keyword arguments is not shared
+    key = None if kwargs else e.internKey()
+    if key is None:
+        return e
+    return internTable.setdefault(key, e)
+
+class Expr(metaclass=ExprMeta):
+    # vs, bs: distinct int and bool variables below the node, collected on first use
+    # fn: (ids token of a CSP, function computing the value of the node over the variable ids of the CSP), compiled on first use (see compiled)
+    __slots__ = ('vs', 'bs', 'fn')
+
     def __init__(self):
-        pass
+        self.vs = None
+        self.bs = None
+        self.fn = None
+
+    def __getstate__(self):
+        # the compiled function is not pickled (it is compiled again in the unpickled node)
+        state = {k: getattr(self, k) for k in slotNames(type(self)) if hasattr(self, k)}
+        state['fn'] = None
+        return (None, state)
+
+    def children(self):
+        return ()
+
+    def internKey(self):
+        # children are interned before their parents, so their identities determine the structure
+        return (type(self),) + tuple([id(x) for x in self.children()])
+
+    def variables(self):
+        if self.vs is None:
+            self.vs, self.bs = collectVariables(self)
+        return self.vs
+
+    def bools(self):
+        if self.bs is None:
+            self.vs, self.bs = collectVariables(self)
+        return self.bs
+
+    def compiled(self, csp):
+        '''
+        function f(iv, bv) giving the value of the node from the values iv of csp.variables and bv of csp.bools,
+        generated by compileExpr on first use with csp (False if the node cannot be compiled)
+        '''
+        if self.fn is None or self.fn[0] is not csp.idsToken:
+            from .compiler import compileExpr
+            self.fn = (csp.idsToken, compileExpr(self, csp) or False)
+        return self.fn[1]
+
+@functools.lru_cache(maxsize=None)
+def slotNames(cls):
+    return tuple([k for c in cls.__mro__ for k in c.__dict__.get('__slots__', ())])
 
 #######################################
 '''
 Term Class
 '''
 
-class Term(Expr, metaclass=ABCMeta):
+class Term(Expr, metaclass=ExprMeta):
+    __slots__ = ('containsBitVec', 'n', 'signed')
+
     def __init__(self):
         super().__init__()
         self.containsBitVec = False
@@ -123,6 +187,8 @@ class Term(Expr, metaclass=ABCMeta):
         pass
 
 class NIL(Term):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -133,20 +199,19 @@ class NIL(Term):
         return 'nil'
 
 class Num(Term):
+    __slots__ = ('v',)
+
     def __init__(self, value):
         super().__init__()
         assert isinstance(value, int)
         self.v = value
+
+    def internKey(self):
+        return (type(self), self.v)
     
     def value(self, solution):
         return self.v
     
-    def variables(self):
-        return []
-    
-    def bools(self):
-        return []
-    
     def __str__(self):
         return str(self.v)
     
@@ -154,14 +219,19 @@ class Num(Term):
         return repr(self)
     
 class ZERO(Num):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0)
     
 class ONE(Num):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(1)
     
 class Var(Term):
+    __slots__ = ('name', 'aux')
     __count = 0
 
     def __init__(self, name):
@@ -169,15 +239,19 @@ class Var(Term):
         if name:
             self.name = name
         else:
-            self.__count += 1
-            self.name = '__I_' + str(self.__count)
+            Var.__count += 1
+            self.name = '__I_' + str(Var.__count)
         self.aux = False
 
+    def internKey(self):
+        # variables are identified by their names in a CSP, not by their nodes
+        return None
+
     def variables(self):
-        return [self]
+        return (self,)
 
     def bools(self):
-        return []
+        return ()
     
     def value(self, solution):
         return solution.intValues[self]
@@ -186,7 +260,7 @@ class Var(Term):
         return self.name
     
     def __repr__(self):
-        return 'Int("' + self.name + '",' + repr(csp.dom[self]) + ')'
+        return 'Int("' + self.name + '",' + repr(currentCsp().dom.get(self)) + ')'
     
     def trueRepr(self):
         return repr(self)
@@ -195,6 +269,8 @@ class Var(Term):
         return hash(self.name)
 
 class Abs(Term):
+    __slots__ = ('x0',)
+
     def __init__(self, x0):
         super().__init__()
         self.x0 = x0
@@ -202,11 +278,8 @@ class Abs(Term):
         self.n = x0.n
         self.signed = x0.signed
     
-    def variables(self):
-        return self.x0.variables()
-    
-    def bools(self):
-        return self.x0.bools()
+    def children(self):
+        return (self.x0,)
     
     def value(self, solution):
         return abs(self.x0.value(solution))
@@ -218,6 +291,12 @@ class Abs(Term):
         return 'Abs(' + self.x0.trueRepr() + ')'
     
 class Neg(Term):
+    __slots__ = ('x0',)
+
+    def __new__(cls, *xs):
+        e = linearNode(cls, xs)
+        return e if e is not None else super().__new__(cls)
+
     def __init__(self, x0):
         super().__init__()
         self.x0 = x0
@@ -225,11 +304,8 @@ class Neg(Term):
         self.n = x0.n
         self.signed = x0.signed
     
-    def variables(self):
-        return self.x0.variables()
-    
-    def bools(self):
-        return self.x0.bools()
+    def children(self):
+        return (self.x0,)
     
     def value(self, solution):
         return -self.x0.value(solution)
@@ -241,20 +317,154 @@ class Neg(Term):
         return 'Neg(' + self.x0.trueRepr() + ')'
 
 def xsToTermForm(xs):
-    res = xs[0] if isinstance(xs[0], list) else list(xs)
-    return list(map(lambda x: x if isinstance(x, Term) else Num(x), res))
+    res = xs[0] if isinstance(xs[0], (list, tuple)) else xs
+    return tuple([x if isinstance(x, Term) else Num(x) for x in res])
+
+def collectVariables(e):
+    '''
+    distinct int and bool variables below e (by name, in order of appearance)
+    '''
+    vs = dict()
+    bs = dict()
+    stack = [e]
+    while stack:
+        e = stack.pop()
+        if isinstance(e, Var):
+            vs.setdefault(e.name, e)
+        elif isinstance(e, BOOL):
+            bs.setdefault(e.name, e)
+        elif e.vs is not None:
+            for x in e.vs:
+                vs.setdefault(x.name, x)
+            for p in e.bs:
+                bs.setdefault(p.name, p)
+        else:
+            stack.extend(reversed(e.children()))
+    return tuple(vs.values()), tuple(bs.values())
+
+class LinearExpr(Term):
+    '''
+    sum of coefs[i] * xs[i] + const
+    xs : Vars, coefs : array of int64 (a NumPy array can be made from it without copy)
+    Add, Sum, Sub, Mul by constants and Neg of linear terms are built as LinearExpr (see linearNode),
+    like terms are merged by terms()
+    '''
+    __slots__ = ('xs', 'coefs', 'const')
+
+    def __init__(self, xs, coefs, const=0):
+        super().__init__()
+        self.xs = tuple(xs)
+        self.coefs = coefs if isinstance(coefs, array) else array('q', coefs)
+        self.const = const
+        assert len(self.xs) == len(self.coefs)
+
+    def children(self):
+        return self.xs
+
+    def internKey(self):
+        return (type(self), tuple([id(x) for x in self.xs]), tuple(self.coefs), self.const)
+
+    def terms(self):
+        '''
+        (variables, coefficients) with like terms merged and zero coefficients dropped
+        '''
+        coefs = dict()
+        xs = dict()
+        for (x, a) in zip(self.xs, self.coefs):
+            coefs[x.name] = coefs.get(x.name, 0) + a
+            xs.setdefault(x.name, x)
+        names = [name for name in coefs if coefs[name] != 0]
+        return [xs[name] for name in names], [coefs[name] for name in names]
+
+    def value(self, solution):
+        return sum(map(operator.mul, self.coefs, [x.value(solution) for x in self.xs])) + self.const
+
+    def __str__(self):
+        ts = [str(x) if a == 1 else str(a) + '*' + str(x) for (x, a) in zip(self.xs, self.coefs)]
+        if self.const != 0:
+            ts.append(str(self.const))
+        return 'LinearExpr(' + ','.join(ts) + ')'
+
+    def trueRepr(self):
+        return 'LinearExpr([' + ','.join([x.trueRepr() for x in self.xs]) + '],[' + ','.join(map(str, self.coefs)) + '],' + str(self.const) + ')'
+
+def linearParts(x):
+    '''
+    (variables, coefficients, constant) of x if it is an int or a linear term, otherwise None
+    '''
+    if isinstance(x, int):
+        return (), (), x
+    elif isinstance(x, Num):
+        return (), (), x.v
+    elif isinstance(x, Var):
+        return (x,), (1,), 0
+    elif isinstance(x, LinearExpr):
+        return x.xs, x.coefs, x.const
+    return None
+
+def linearNode(cls, xs):
+    '''
+    LinearExpr (or Num when no variable is left) equal to cls(*xs) for Add, Sum, Sub, Mul and Neg,
+    None if it is not linear (or a coefficient does not fit in int64)
+    '''
+    if len(xs) == 0:
+        return None
+    if cls is Mul and len(xs) == 2:
+        # a * x, the most frequent case
+        a, x = xs if isinstance(xs[0], int) else xs[::-1]
+        if isinstance(a, int) and type(x) is Var and -2**63 <= a < 2**63:
+            e = LinearExpr((x,), array('q', (a,)))
+            e.containsBitVec, e.n, e.signed = x.containsBitVec, x.n, x.signed
+            return e
+    if isinstance(xs[0], (list, tuple)):
+        xs = xs[0]
+    ps = [linearParts(x) for x in xs]
+    if any([p is None for p in ps]):
+        return None
+    if cls is Neg:
+        signs = [-1]
+    elif cls is Sub:
+        signs = [1] + [-1] * (len(ps) - 1)
+    elif cls is Mul:
+        linear = [p for p in ps if len(p[0]) > 0]
+        if len(linear) > 1:
+            return None
+        c = functools.reduce(operator.mul, [p[2] for p in ps if len(p[0]) == 0], 1)
+        if len(linear) == 0:
+            return Num(c)
+        ps, signs = linear, [c]
+    else:
+        signs = [1] * len(ps)
+    vs = []
+    coefs = array('q')
+    const = 0
+    try:
+        for ((ys, cs, c), sign) in zip(ps, signs):
+            vs.extend(ys)
+            coefs.extend(cs if sign == 1 else [sign * a for a in cs])
+            const += sign * c
+    except OverflowError:
+        return None
+    if len(vs) == 0:
+        return Num(const)
+    e = LinearExpr(vs, coefs, const)
+    e.containsBitVec, e.n, e.signed = bitVecInfo(xs)
+    return e
 
 class Add(Term):
+    __slots__ = ('xs',)
+
+    def __new__(cls, *xs):
+        e = linearNode(cls, xs)
+        return e if e is not None else super().__new__(cls)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
         self.containsBitVec, self.n, self.signed = bitVecInfo(self.xs)
     
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-    
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
     
     def value(self, solution):
         return sum([x.value(solution) for x in self.xs])
@@ -266,16 +476,19 @@ class Add(Term):
         return 'Add(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
 class Sum(Term):
+    __slots__ = ('xs',)
+
+    def __new__(cls, *xs):
+        e = linearNode(cls, xs)
+        return e if e is not None else super().__new__(cls)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
         self.containsBitVec, self.n, self.signed = bitVecInfo(self.xs)
     
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-    
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
     
     def value(self, solution):
         return sum([x.value(solution) for x in self.xs])
@@ -287,16 +500,19 @@ class Sum(Term):
         return 'Sum(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
 class Sub(Term):
+    __slots__ = ('xs',)
+
+    def __new__(cls, *xs):
+        e = linearNode(cls, xs)
+        return e if e is not None else super().__new__(cls)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
         self.containsBitVec, self.n, self.signed = bitVecInfo(self.xs)
     
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-    
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
     
     def value(self, solution):
         ys = [x.value(solution) for x in self.xs]
@@ -315,16 +531,19 @@ class Sub(Term):
         return 'Sub(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
 class Mul(Term):
+    __slots__ = ('xs',)
+
+    def __new__(cls, *xs):
+        e = linearNode(cls, xs)
+        return e if e is not None else super().__new__(cls)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
         self.containsBitVec, self.n, self.signed = bitVecInfo(self.xs)
     
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-    
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
     
     def value(self, solution):
         return functools.reduce(operator.mul, [x.value(solution) for x in self.xs])
@@ -336,31 +555,20 @@ class Mul(Term):
         return 'Mul(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
 class Div(Term):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
         self.containsBitVec, self.n, self.signed = bitVecInfo([x0, x1])
 
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
-        a0 = self.x0.value(solution)
-        a1 = self.x1.value(solution)
-        if a1 > 0:
-            if a0 >= 0:
-                return a0 // a1
-            else:
-                return (a0 - a1 + 1) // a1
-        else:
-            if a0 >= 0:
-                return (a0 - a1 - 1) // a1
-            else:
-                a0 // a1
+        # floor division as Sugar
+        return self.x0.value(solution) // self.x1.value(solution)
     
     def __str__(self):
         return 'Div(' + str(self.x0) + ',' + str(self.x1) + ')'
@@ -369,24 +577,19 @@ class Div(Term):
         return 'Div(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Mod(Term):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
         self.containsBitVec, self.n, self.signed = bitVecInfo([x0, x1])
 
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
-        r = self.x0.value(solution) % self.x1.value(solution)
-        if r > 0:
-            return r
-        else:
-            r + self.x1.value(solution)
+        return self.x0.value(solution) % self.x1.value(solution)
     
     def __str__(self):
         return 'Mod(' + str(self.x0) + ',' + str(self.x1) + ')'
@@ -400,16 +603,15 @@ class Mod(Term):
 #     ###
 
 class Max(Term):
+    __slots__ = ('xs',)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
         self.containsBitVec, self.n, self.signed = bitVecInfo(xs)
     
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-    
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
     
     def value(self, solution):
         return max([x.value(solution) for x in self.xs])
@@ -421,16 +623,15 @@ class Max(Term):
         return 'Max(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
 class Min(Term):
+    __slots__ = ('xs',)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
         self.containsBitVec, self.n, self.signed = bitVecInfo(xs)
     
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-    
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
     
     def value(self, solution):
         return min([x.value(solution) for x in self.xs])
@@ -442,6 +643,8 @@ class Min(Term):
         return 'Min(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
 class If(Term):
+    __slots__ = ('c', 'x0', 'x1',)
+
     def __init__(self, c, x0, x1):
         super().__init__()
         self.c = c
@@ -449,11 +652,8 @@ class If(Term):
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
         self.containsBitVec, self.n, self.signed = bitVecInfo([x0, x1])
     
-    def variables(self):
-        return self.c.variables() + self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.c.bools() + self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.c, self.x0, self.x1)
     
     def value(self, solution):
         if self.c.value(solution):
@@ -471,7 +671,9 @@ class If(Term):
 Constraint Class
 '''
 
-class Constraint(Expr, metaclass=ABCMeta):
+class Constraint(Expr, metaclass=ExprMeta):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
 
@@ -511,6 +713,8 @@ class Constraint(Expr, metaclass=ABCMeta):
         pass
 
 class FALSE(Constraint):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
     
@@ -524,6 +728,8 @@ class FALSE(Constraint):
         return repr(self)
 
 class TRUE(Constraint):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__()
     
@@ -537,16 +743,21 @@ class TRUE(Constraint):
         return repr(self)
     
 class BOOL(Constraint):
+    __slots__ = ('name', 'aux')
+
     def __init__(self, name):
         super().__init__()
         self.name = name
         self.aux = False
+
+    def internKey(self):
+        return None
     
     def variables(self):
-        return []
+        return ()
 
     def bools(self):
-        return [self]
+        return (self,)
     
     def value(self, solution):
         return solution.boolValues[self]
@@ -564,15 +775,14 @@ class BOOL(Constraint):
         return hash(self.name)
     
 class Not(Constraint):
+    __slots__ = ('c0',)
+
     def __init__(self, c0):
         super().__init__()
         self.c0 = c0
     
-    def variables(self):
-        return self.c0.variables()
-
-    def bools(self):
-        return self.c0.bools()
+    def children(self):
+        return (self.c0,)
 
     def value(self, solution):
         return not self.c0.value(solution)
@@ -584,15 +794,14 @@ class Not(Constraint):
         return 'Not(' + self.c0.trueRepr() + ')'
 
 class And(Constraint):
+    __slots__ = ('cs',)
+
     def __init__(self, *cs):
         super().__init__()
-        self.cs = cs[0] if isinstance(cs[0], list) else list(cs)
-    
-    def variables(self):
-        return sum([c.variables() for c in self.cs], [])
+        self.cs = tuple(cs[0]) if isinstance(cs[0], (list, tuple)) else cs
     
-    def bools(self):
-        return sum([c.bools() for c in self.cs], [])
+    def children(self):
+        return self.cs
 
     def value(self, solution):
         return all([c.value(solution) for c in self.cs])
@@ -604,15 +813,14 @@ class And(Constraint):
         return 'And(' + ','.join([c.trueRepr() for c in self.cs]) + ')'
 
 class Or(Constraint):
+    __slots__ = ('cs',)
+
     def __init__(self, *cs):
         super().__init__()
-        self.cs = cs[0] if isinstance(cs[0], list) else list(cs)
+        self.cs = tuple(cs[0]) if isinstance(cs[0], (list, tuple)) else cs
     
-    def variables(self):
-        return sum([c.variables() for c in self.cs], [])
-    
-    def bools(self):
-        return sum([c.bools() for c in self.cs], [])
+    def children(self):
+        return self.cs
 
     def value(self, solution):
         return any([c.value(solution) for c in self.cs])
@@ -624,16 +832,15 @@ class Or(Constraint):
         return 'Or(' + ','.join([c.trueRepr() for c in self.cs]) + ')'
 
 class Imp(Constraint):
+    __slots__ = ('c0', 'c1',)
+
     def __init__(self, c0, c1):
         super().__init__()
         self.c0 = c0
         self.c1 = c1
     
-    def variables(self):
-        return self.c0.variables() + self.c1.variables()
-    
-    def bools(self):
-        return self.c0.bools() + self.c1.bools()
+    def children(self):
+        return (self.c0, self.c1)
     
     def value(self, solution):
         return not self.c0.value(solution) or self.c1.value(solution)
@@ -645,16 +852,15 @@ class Imp(Constraint):
         return 'Imp(' + self.c0.trueRepr() + ',' + self.c1.trueRepr() + ')'
 
 class Xor(Constraint):
+    __slots__ = ('c0', 'c1',)
+
     def __init__(self, c0, c1):
         super().__init__()
         self.c0 = c0
         self.c1 = c1
     
-    def variables(self):
-        return self.c0.variables() + self.c1.variables()
-    
-    def bools(self):
-        return self.c0.bools() + self.c1.bools()
+    def children(self):
+        return (self.c0, self.c1)
     
     def value(self, solution):
         return self.c0.value(solution) ^ self.c1.value(solution)
@@ -666,16 +872,15 @@ class Xor(Constraint):
         return 'Xor(' + self.c0.trueRepr() + ',' + self.c1.trueRepr() + ')'
 
 class Iff(Constraint):
+    __slots__ = ('c0', 'c1',)
+
     def __init__(self, c0, c1):
         super().__init__()
         self.c0 = c0
         self.c1 = c1
     
-    def variables(self):
-        return self.c0.variables() + self.c1.variables()
-    
-    def bools(self):
-        return self.c0.bools() + self.c1.bools()
+    def children(self):
+        return (self.c0, self.c1)
     
     def value(self, solution):
         return self.c0.value(solution) == self.c1.value(solution)
@@ -687,19 +892,18 @@ class Iff(Constraint):
         return 'Iff(' + self.c0.trueRepr() + ',' + self.c1.trueRepr() + ')'
 
 class Eq(Constraint):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
     
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
-        return not self.x0.value(solution) or self.x1.value(solution)
+        return self.x0.value(solution) == self.x1.value(solution)
 
     def __str__(self):
         return 'Eq(' + str(self.x0) + ',' + str(self.x1) + ')'
@@ -708,16 +912,15 @@ class Eq(Constraint):
         return 'Eq(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Ne(Constraint):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
     
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
         return self.x0.value(solution) != self.x1.value(solution)
@@ -729,16 +932,15 @@ class Ne(Constraint):
         return 'Ne(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Le(Constraint):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
     
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
         return self.x0.value(solution) <= self.x1.value(solution)
@@ -750,16 +952,15 @@ class Le(Constraint):
         return 'Le(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Lt(Constraint):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
     
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
         return self.x0.value(solution) < self.x1.value(solution)
@@ -771,16 +972,15 @@ class Lt(Constraint):
         return 'Lt(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Ge(Constraint):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
     
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
         return self.x0.value(solution) >= self.x1.value(solution)
@@ -792,16 +992,15 @@ class Ge(Constraint):
         return 'Ge(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Gt(Constraint):
+    __slots__ = ('x0', 'x1',)
+
     def __init__(self, x0, x1):
         super().__init__()
         self.x0 = x0 if isinstance(x0, Term) else Num(x0)
         self.x1 = x1 if isinstance(x1, Term) else Num(x1)
     
-    def variables(self):
-        return self.x0.variables() + self.x1.variables()
-    
-    def bools(self):
-        return self.x0.bools() + self.x1.bools()
+    def children(self):
+        return (self.x0, self.x1)
     
     def value(self, solution):
         return self.x0.value(solution) > self.x1.value(solution)
@@ -813,15 +1012,14 @@ class Gt(Constraint):
         return 'Gt(' + self.x0.trueRepr() + ',' + self.x1.trueRepr() + ')'
 
 class Alldifferent(Constraint):
+    __slots__ = ('xs',)
+
     def __init__(self, *xs):
         super().__init__()
         self.xs = xsToTermForm(xs)
 
-    def variables(self):
-        return sum([x.variables() for x in self.xs], [])
-
-    def bools(self):
-        return sum([x.bools() for x in self.xs], [])
+    def children(self):
+        return self.xs
 
     def value(self, solution):
         a = [x.value(solution) for x in self.xs]
@@ -833,6 +1031,206 @@ class Alldifferent(Constraint):
     def trueRepr(self):
         return 'Alldifferent(' + ','.join([x.trueRepr() for x in self.xs]) + ')'
 
+class Table(Constraint):
+    '''
+    (xs[0], ..., xs[k-1]) is one of the tuples
+    tuples : list of k-tuples of ints or 2-D NumPy array with k columns,
+             stored as one array of int64 with a tuple per k elements (a NumPy array can be made from it without copy)
+    rows : set of the tuples, made on first use by value
+    '''
+    __slots__ = ('xs', 'tuples', 'rows')
+    # whether the tuples are the allowed ones (the forbidden ones for NegativeTable)
+    support = True
+
+    def __init__(self, xs, tuples):
+        super().__init__()
+        self.xs = xsToTermForm(xs)
+        assert len(self.xs) > 0, 'Table of no variable'
+        self.tuples = tupleArray(tuples, len(self.xs))
+        self.rows = None
+
+    def children(self):
+        return self.xs
+
+    def internKey(self):
+        return (type(self), tuple([id(x) for x in self.xs]), self.tuples.tobytes())
+
+    def size(self):
+        return len(self.tuples) // len(self.xs)
+
+    def rowSet(self):
+        if self.rows is None:
+            it = iter(self.tuples)
+            self.rows = frozenset(zip(*[it] * len(self.xs)))
+        return self.rows
+
+    def value(self, solution):
+        return (tuple([x.value(solution) for x in self.xs]) in self.rowSet()) == self.support
+
+    def decomposition(self):
+        '''
+        Or of the tuples as And of Eq (Not of it for NegativeTable)
+        '''
+        k = len(self.xs)
+        rows = [self.tuples[i:i + k] for i in range(0, len(self.tuples), k)]
+        c = Or([And([x == v for (x, v) in zip(self.xs, row)]) for row in rows])
+        return c if self.support else Not(c)
+
+    def rowsText(self):
+        k = len(self.xs)
+        return ','.join(['(' + ','.join(map(str, self.tuples[i:i + k])) + ')' for i in range(0, len(self.tuples), k)])
+
+    def __str__(self):
+        return type(self).__name__ + '([' + ','.join([str(x) for x in self.xs]) + '],[' + self.rowsText() + '])'
+
+    def trueRepr(self):
+        return type(self).__name__ + '([' + ','.join([x.trueRepr() for x in self.xs]) + '],[' + self.rowsText() + '])'
+
+class NegativeTable(Table):
+    '''
+    (xs[0], ..., xs[k-1]) is none of the tuples
+    '''
+    __slots__ = ()
+    support = False
+
+class Cumulative(Constraint):
+    '''
+    At each time t, the sum of demands[i] over the tasks i running at t (starts[i] <= t < starts[i] + durations[i])
+    is at most capacity (the demands are assumed non-negative)
+    '''
+    __slots__ = ('starts', 'durations', 'demands', 'capacity')
+
+    def __init__(self, starts, durations, demands, capacity):
+        super().__init__()
+        self.starts = termTuple(starts)
+        self.durations = termTuple(durations)
+        self.demands = termTuple(demands)
+        self.capacity = termTuple([capacity])[0]
+        assert len(self.starts) == len(self.durations) == len(self.demands), 'Cumulative of lists of different lengths'
+
+    def children(self):
+        return self.starts + self.durations + self.demands + (self.capacity,)
+
+    def value(self, solution):
+        return cumulativeHolds([x.value(solution) for x in self.starts], [x.value(solution) for x in self.durations], [x.value(solution) for x in self.demands], self.capacity.value(solution))
+
+    def __str__(self):
+        return 'Cumulative(' + ','.join(['[' + ','.join([str(x) for x in xs]) + ']' for xs in (self.starts, self.durations, self.demands)]) + ',' + str(self.capacity) + ')'
+
+    def trueRepr(self):
+        return 'Cumulative(' + ','.join(['[' + ','.join([x.trueRepr() for x in xs]) + ']' for xs in (self.starts, self.durations, self.demands)]) + ',' + self.capacity.trueRepr() + ')'
+
+class Disjunctive(Constraint):
+    '''
+    No two tasks overlap: starts[i] + durations[i] <= starts[j] or starts[j] + durations[j] <= starts[i] for i != j
+    (as in Sugar, a task of duration 0 overlaps no task)
+    '''
+    __slots__ = ('starts', 'durations')
+
+    def __init__(self, starts, durations):
+        super().__init__()
+        self.starts = termTuple(starts)
+        self.durations = termTuple(durations)
+        assert len(self.starts) == len(self.durations), 'Disjunctive of lists of different lengths'
+
+    def children(self):
+        return self.starts + self.durations
+
+    def decomposition(self):
+        '''
+        And of the disjunctions of the pairs of tasks (without the tasks of constant duration 0)
+        '''
+        tasks = [(s, d) for (s, d) in zip(self.starts, self.durations) if not (isinstance(d, Num) and d.v <= 0)]
+        cs = []
+        for (i, (s0, d0)) in enumerate(tasks):
+            for (s1, d1) in tasks[i + 1:]:
+                empty = [d <= 0 for d in (d0, d1) if not isinstance(d, Num)]
+                cs.append(Or(empty + [s0 + d0 <= s1, s1 + d1 <= s0]))
+        return And(cs)
+
+    def value(self, solution):
+        return disjunctiveHolds([x.value(solution) for x in self.starts], [x.value(solution) for x in self.durations])
+
+    def __str__(self):
+        return 'Disjunctive(' + ','.join(['[' + ','.join([str(x) for x in xs]) + ']' for xs in (self.starts, self.durations)]) + ')'
+
+    def trueRepr(self):
+        return 'Disjunctive(' + ','.join(['[' + ','.join([x.trueRepr() for x in xs]) + ']' for xs in (self.starts, self.durations)]) + ')'
+
+class Element(Constraint):
+    '''
+    item == array[index] (0 <= index < len(array))
+    array : list of terms or ints
+    '''
+    __slots__ = ('index', 'array', 'item')
+
+    def __init__(self, index, array, item):
+        super().__init__()
+        self.index, self.item = termTuple([index, item])
+        self.array = termTuple(array)
+
+    def children(self):
+        return (self.index,) + self.array + (self.item,)
+
+    def decomposition(self):
+        '''
+        Or of index == k and item == array[k]
+        '''
+        return Or([And(self.index == k, self.item == a) for (k, a) in enumerate(self.array)])
+
+    def isConstant(self):
+        return all([isinstance(a, Num) for a in self.array])
+
+    def table(self):
+        '''
+        Table of the pairs (index, item) for an array of constants
+        '''
+        return Table([self.index, self.item], [(k, a.v) for (k, a) in enumerate(self.array)])
+
+    def value(self, solution):
+        i = self.index.value(solution)
+        return 0 <= i < len(self.array) and self.array[i].value(solution) == self.item.value(solution)
+
+    def __str__(self):
+        return 'Element(' + str(self.index) + ',[' + ','.join([str(x) for x in self.array]) + '],' + str(self.item) + ')'
+
+    def trueRepr(self):
+        return 'Element(' + self.index.trueRepr() + ',[' + ','.join([x.trueRepr() for x in self.array]) + '],' + self.item.trueRepr() + ')'
+
+def termTuple(xs):
+    return tuple([x if isinstance(x, Term) else Num(int(x)) for x in xs])
+
+def cumulativeHolds(starts, durations, demands, capacity):
+    # the load changes at the starts and the ends of the tasks (sorted by time, each time checked after all its changes)
+    events = sorted([(s, h) for (s, d, h) in zip(starts, durations, demands) if d > 0] + [(s + d, -h) for (s, d, h) in zip(starts, durations, demands) if d > 0])
+    load = 0
+    for (i, (t, h)) in enumerate(events):
+        load += h
+        if load > capacity and (i + 1 == len(events) or events[i + 1][0] != t):
+            return False
+    return True
+
+def disjunctiveHolds(starts, durations):
+    tasks = list(zip(starts, durations))
+    return all([d0 <= 0 or d1 <= 0 or s0 + d0 <= s1 or s1 + d1 <= s0 for (i, (s0, d0)) in enumerate(tasks) for (s1, d1) in tasks[i + 1:]])
+
+def tupleArray(tuples, k):
+    '''
+    array of int64 of the k-tuples (row major)
+    '''
+    a = array('q')
+    if hasattr(tuples, 'shape') and hasattr(tuples, 'astype'):
+        # NumPy array
+        if len(tuples.shape) != 2 or tuples.shape[1] != k:
+            raise Exception(f'tuples of shape {tuples.shape} for {k} variables')
+        a.frombytes(tuples.astype('int64').tobytes())
+        return a
+    for t in tuples:
+        if len(t) != k:
+            raise Exception(f'tuple {tuple(t)} for {k} variables')
+        a.extend(t)
+    return a
+
 #######################################
 
 '''
@@ -910,26 +1308,39 @@ CSP Class
 '''
 
 class CSP:
-    def __init__(self, variables=[], bools=[], dom=dict(), constraints=[], objective=None, target=0):
-        self.variables = variables
-        self.bools = bools
-        self.dom = dom
-        self.constraints = constraints
+    def __init__(self, variables=None, bools=None, dom=None, constraints=None, objective=None, target=0):
+        self.variables = variables if variables is not None else []
+        self.bools = bools if bools is not None else []
+        self.dom = dom if dom is not None else dict()
+        self.constraints = constraints if constraints is not None else []
+        # dense ids of the variables and bools by name (their positions in variables and bools)
+        self.varIds = {x.name: i for (i, x) in enumerate(self.variables)}
+        self.boolIds = {p.name: i for (i, p) in enumerate(self.bools)}
+        # replaced when an id may be given to another variable (the functions compiled with the old ids are then compiled again)
+        self.idsToken = object()
 
         self.objective = objective
         self.target = target
     
     def Int(self, x, d):
-        if all([x.name != y.name for y in self.variables]):
+        if x.name not in self.varIds:
+            self.varIds[x.name] = len(self.variables)
             self.variables.append(x)
             self.dom[x] = d
         return x
 
     def Bool(self, p):
-        if all([p.name != q.name for q in self.bools]):
+        if p.name not in self.boolIds:
+            self.boolIds[p.name] = len(self.bools)
             self.bools.append(p)
         return p
 
+    def varId(self, x):
+        return self.varIds[x.name]
+
+    def boolId(self, p):
+        return self.boolIds[p.name]
+
     # def Real():
     #     ###
     #     unimplemented
@@ -942,16 +1353,25 @@ class CSP:
     def getAll(self):
         return (self.variables, self.bools, self.dom, self.constraints)
 
+    def setAll(self, variables, bools, dom, constraints):
+        self.variables = variables
+        self.bools = bools
+        self.dom = dom
+        self.constraints = constraints
+        self.varIds = {x.name: i for (i, x) in enumerate(variables)}
+        self.boolIds = {p.name: i for (i, p) in enumerate(bools)}
+        self.idsToken = object()
+
     def add(self, *cs):
         if len(cs) == 1 and isinstance(cs[0], list) and all([isinstance(c, Constraint) for c in cs[0]]):
             cs = cs[0]
         assert all([isinstance(c, Constraint) for c in cs]), 'only constraints are allowed'
-        badVariables = list(filter(lambda _: not _ in self.variables, sum([c.variables() for c in cs], [])))
-        badBools = list(filter(lambda _: not _ in self.bools, sum([c.bools() for c in cs], [])))
+        badVariables = {x.name for c in cs for x in c.variables() if x.name not in self.varIds}
+        badBools = {p.name for c in cs for p in c.bools() if p.name not in self.boolIds}
         if len(badVariables):
-            raise('undeclared int varialbles ' + ','.join(list(badVariables)))
+            raise Exception('undeclared int variables ' + ','.join(sorted(badVariables)))
         if len(badBools):
-            raise('undeclared bool varialbles ' + ','.join(list(badBools)))
+            raise Exception('undeclared bool variables ' + ','.join(sorted(badBools)))
         if len(cs) == 1:
             self.constraints.append(cs[0])
         else:
@@ -967,15 +1387,20 @@ class CSP:
 
     def cancel(self, *args):
         if len(args) == 0:
-            self.variables = self.variables[:self.variablesSizeCommit]
-            self.bools = self.bools[:self.boolsSizeCommit]
-            self.constraints = self.constraints[:self.constraintsSizeCommit]
+            varsSize, boolsSize, consSize = self.variablesSizeCommit, self.boolsSizeCommit, self.constraintsSizeCommit
         elif len(args) == 3:
-            self.variables = self.variables[:args[0]]
-            self.bools = self.bools[:args[1]]
-            self.constraints = self.constraints[:args[2]]
+            varsSize, boolsSize, consSize = args
         else:
             raise('Invalid arguments')
+        for x in self.variables[varsSize:]:
+            del self.varIds[x.name]
+        for p in self.bools[boolsSize:]:
+            del self.boolIds[p.name]
+        if varsSize < len(self.variables) or boolsSize < len(self.bools):
+            self.idsToken = object()
+        self.variables = self.variables[:varsSize]
+        self.bools = self.bools[:boolsSize]
+        self.constraints = self.constraints[:consSize]
     
     def variablesDelta(self):
         return self.variables[self.variablesSizeCommit:]
@@ -1005,7 +1430,7 @@ class CSP:
         self.target = 0
     
     def satisfiedBy(self, solution):
-        return all([self.dom[x].contains(x.value(solution)) for x in self.variables]) and all([c.value(solution) for c in self.constraints])
+        return all([self.dom[x].contains(x.value(solution)) for x in self.variables]) and all([solution.evaluate(c, self) for c in self.constraints])
 
     def output(self):
         res = ''
@@ -1048,9 +1473,13 @@ class CSP:
 ##########################
 
 class Solution:
-    def __init__(self, intValues, boolValues):
+    def __init__(self, intValues, boolValues, csp=None):
         self.intValues = intValues
         self.boolValues = boolValues
+        # CSP of the solution (the current CSP if None)
+        self.csp = csp
+        # (ids token, iv, bv) given by valueArrays
+        self.arrays = None
     
     def getValue(self, *args):
         if len(args) == 1:
@@ -1059,17 +1488,40 @@ class Solution:
                 if isinstance(x, Var):
                     return self.intValues[x]
                 else:
-                    return x.value(self)
+                    return self.evaluate(x)
             elif isinstance(x, Constraint):
                 if isinstance(x, BOOL):
                     return self.boolValues[x]
                 else:
-                    return x.value(self)
+                    return self.evaluate(x)
             elif isinstance(x, list):
                 return [self.getValue(a) for a in x]
         if len(args) > 1:
             return [self.getValue(a) for a in args]
     
+    def valueArrays(self, csp):
+        '''
+        lists (iv, bv) of the values of csp.variables and csp.bools (None for a variable without value)
+        '''
+        a = self.arrays
+        if a is None or a[0] is not csp.idsToken or len(a[1]) != len(csp.variables) or len(a[2]) != len(csp.bools):
+            a = (csp.idsToken, valueArray(self.intValues, csp.variables), valueArray(self.boolValues, csp.bools))
+            self.arrays = a
+        return a[1], a[2]
+
+    def evaluate(self, x, csp=None):
+        '''
+        value of the term or constraint x by its compiled function
+        '''
+        csp = csp if csp is not None else self.csp if self.csp is not None else currentCsp()
+        f = x.compiled(csp)
+        if f:
+            iv, bv = self.valueArrays(csp)
+            # a variable without value is evaluated below by value(), which raises as before
+            if all([iv[csp.varIds[y.name]] is not None for y in x.variables()]) and all([bv[csp.boolIds[p.name]] is not None for p in x.bools()]):
+                return f(iv, bv)
+        return x.value(self)
+
     def getAllValue(self):
         return {**self.intValues, **self.boolValues}
 
@@ -1097,9 +1549,46 @@ class Solution:
     def __repr__(self):
         return 'Solution(' + str(self.intValues)  + ',' + str(self.boolValues) + ')'
 
+def valueArray(values, xs):
+    # the values of a decoded solution are in the order of the variables (a prefix of them when variables were added since)
+    if len(values) <= len(xs) and all(map(operator.is_, values, xs)):
+        return list(values.values()) + [None] * (len(xs) - len(values))
+    return [values.get(x) for x in xs]
+
 ##########################
 
 csp = CSP()
+# CSPs activated by Model in each thread
+_current = threading.local()
+
+def currentCsp():
+    """
+    CSP where the variables are declared (csp, or the CSP of the innermost active Model of this thread)
+    """
+    stack = getattr(_current, 'stack', None)
+    return stack[-1] if stack else csp
+
+def pushCsp(c):
+    if not hasattr(_current, 'stack'):
+        _current.stack = []
+    _current.stack.append(c)
+
+def popCsp():
+    return _current.stack.pop()
+
+def setInterning(on=True):
+    """
+    Share structurally identical terms and constraints built from now on (off by default).
+    setInterning(False) releases the shared nodes.
+    """
+    global internTable
+    if not on:
+        if internTable is not None:
+            del ExprMeta.__call__
+        internTable = None
+    elif internTable is None:
+        internTable = dict()
+        ExprMeta.__call__ = internedCall
 
 '''
 
@@ -1156,12 +1645,12 @@ def Int(*args):
         dom = args[0]
     else:
         raise('Invalid arguments')
-    return csp.Int(Var(name), dom)
+    return currentCsp().Int(Var(name), dom)
 
 def Ints(names, *args):
     if isinstance(names, str):
         names = names.split()
-    return [Int(name, *args) for name in names]
+    return TermList([Int(name, *args) for name in names])
 
 def IntList(*args):
     """
@@ -1175,27 +1664,27 @@ def IntList(*args):
     global __intNameCount
     if len(args) == 4 and isinstance(args[0], str) and all([isinstance(a, int) for a in args[1:]]):
         name, size, lo, hi = args
-        return [Int(f'{name}_{i}', lo, hi) for i in range(size)]
+        return TermList([Int(f'{name}_{i}', lo, hi) for i in range(size)])
     elif len(args) == 3 and all([isinstance(a, int) for a in args]):
         __intNameCount += 1
         name = f'__I_{__intNameCount}'
         size, lo, hi = args
-        return [Int(f'{name}_{i}', lo, hi) for i in range(size)]
+        return TermList([Int(f'{name}_{i}', lo, hi) for i in range(size)])
     elif len(args) == 2 and isinstance(args[0], int) and isinstance(args[1], int):
         __intNameCount += 1
         name = f'__I_{__intNameCount}'
         size, v = args
         lo = min(v, 0)
         hi = max(v, 0)
-        return [Int(f'{name}_{i}', lo, hi) for i in range(size)]
+        return TermList([Int(f'{name}_{i}', lo, hi) for i in range(size)])
     elif len(args) == 3 and isinstance(args[0], str) and isinstance(args[1], int) and isinstance(args[2], set) and all([isinstance(a, int) for a in args[2]]):
         name, size, dset = args
-        return [Int(f'{name}_{i}', dset) for i in range(size)]
+        return TermList([Int(f'{name}_{i}', dset) for i in range(size)])
     elif len(args) == 2 and isinstance(args[0], int) and isinstance(args[1], set) and all([isinstance(a, int) for a in args[1]]):
         __intNameCount += 1
         name = f'__I_{__intNameCount}'
         size, dset = args
-        return [Int(f'{name}_{i}', dset) for i in range(size)]
+        return TermList([Int(f'{name}_{i}', dset) for i in range(size)])
     else:
         raise('Invalid arguments')
 
@@ -1214,7 +1703,7 @@ def Bool(*args):
         name = f'__B_{__boolNameCount}'
     else:
         raise('Invalid arguments')
-    return csp.Bool(BOOL(name))
+    return currentCsp().Bool(BOOL(name))
 
 def Bools(names):
     if isinstance(names, str):
@@ -1268,12 +1757,50 @@ def Bit(*args):
         name = f'__BI_{__bitNameCount}'
     else:
         raise('Invalid arguments')
-    return csp.Bit(Var(name))
+    return currentCsp().Bit(Var(name))
+
+class TermList(list):
+    '''
+    List of terms where xs[i] for a term i is the element at index i (see At)
+    '''
+    __slots__ = ()
+
+    def __getitem__(self, i):
+        if isinstance(i, Term):
+            return At(self, i)
+        if isinstance(i, slice):
+            return TermList(list.__getitem__(self, i))
+        return list.__getitem__(self, i)
+
+def At(array, index):
+    '''
+    Auxiliary variable v with Element(index, array, v), i.e. v == array[index]
+    array : list of Int variables, ints or Nums
+    '''
+    csp = currentCsp()
+    doms = []
+    for x in array:
+        if isinstance(x, Var):
+            doms.append(csp.dom[x])
+        elif isinstance(x, (int, Num)):
+            doms.append(SetDomain({int(x.v if isinstance(x, Num) else x)}))
+        else:
+            raise Exception('Element of term ' + str(x))
+    if len(doms) == 0:
+        raise Exception('Element of empty array')
+    if all([isinstance(d, SetDomain) for d in doms]):
+        dom = SetDomain(set().union(*[d.values for d in doms]))
+    else:
+        dom = IntervalDomain(min([d.lb() for d in doms]), max([d.ub() for d in doms]))
+    v = Int(dom)
+    v.aux = True
+    csp.add(Element(index, array, v))
+    return v
 
 def Bits(names):
     if isinstance(names, str):
         names = names.split()
-    return [Bit(name) for name in names]
+    return TermList([Bit(name) for name in names])
 
 def BitList(*args):
     """
@@ -1288,7 +1815,7 @@ def BitList(*args):
         __bitNameCount += 1
         name = f'__BI_{__bitNameCount}'
         size = args[0]
-    return [Bit(f'{name}_{i + 1}') for i in range(size)]
+    return TermList([Bit(f'{name}_{i + 1}') for i in range(size)])
 
 '''
 BitVec class
@@ -1329,9 +1856,9 @@ def BitVec(*args, signed=False):
         raise('Invalid arguments')
     if n > 0:
         if signed:
-            itg = csp.Int(Var(name), IntervalDomain(-2**(n - 1), 2**(n - 1) - 1))
+            itg = currentCsp().Int(Var(name), IntervalDomain(-2**(n - 1), 2**(n - 1) - 1))
         else:
-            itg = csp.Int(Var(name), IntervalDomain(0, 2**n - 1))
+            itg = currentCsp().Int(Var(name), IntervalDomain(0, 2**n - 1))
         itg.containsBitVec = True
         itg.n = n
         itg.signed = signed
@@ -1371,10 +1898,10 @@ def BitVecWithBits(*args, signed=False, value=None):
         if value:
             N = 2**n
             if signed:
-                csp.add(Imp(value % N < (N//2), value % N == itg))
-                csp.add(Imp(value % N >= (N//2), (value % N) - N == itg))
+                currentCsp().add(Imp(value % N < (N//2), value % N == itg))
+                currentCsp().add(Imp(value % N >= (N//2), (value % N) - N == itg))
             else:
-                csp.add(value % N == itg)
+                currentCsp().add(value % N == itg)
         itg.containsBitVec = True
         itg.n = n
         itg.signed = signed
@@ -1404,14 +1931,14 @@ def BitAnd(x0, x1):
     if isinstance(x1, int):
         for i in range(n):
             if x1 & (1 << i):
-                csp.add(bits0[i] == bits2[i])
+                currentCsp().add(bits0[i] == bits2[i])
     else:
         _, bits1 = BitVecWithBits(n, signed=signed, value=x1)
         for b in bits1:
             for v in b.variables():
                 v.aux = True
         for i in range(n):
-            csp.add(bits0[i] * bits1[i] == bits2[i])
+            currentCsp().add(bits0[i] * bits1[i] == bits2[i])
     return bv2
     
 def BitOr(x0, x1):
@@ -1429,16 +1956,16 @@ def BitOr(x0, x1):
     if isinstance(x1, int):
         for i in range(n):
             if x1 & (1 << i):
-                csp.add(bits2[i] == 1)
+                currentCsp().add(bits2[i] == 1)
             else:
-                csp.add(bits0[i] == bits2[i])
+                currentCsp().add(bits0[i] == bits2[i])
     else:
         _, bits1 = BitVecWithBits(n, signed=signed, value=x1)
         for b in bits1:
             for v in b.variables():
                 v.aux = True
         for i in range(n):
-            csp.add(Imp((bits0[i] + bits1[i] > 0), bits2[i] == 1))
+            currentCsp().add(Imp((bits0[i] + bits1[i] > 0), bits2[i] == 1))
     return bv2
     
 def BitXor(x0, x1):
@@ -1456,16 +1983,16 @@ def BitXor(x0, x1):
     if isinstance(x1, int):
         for i in range(n):
             if x1 & (1 << i):
-                csp.add(bits0[i] + bits2[i] == 1)
+                currentCsp().add(bits0[i] + bits2[i] == 1)
             else:
-                csp.add(bits0[i] == bits2[i])
+                currentCsp().add(bits0[i] == bits2[i])
     else:
         _, bits1 = BitVecWithBits(n, signed=signed, value=x1)
         for b in bits1:
             for v in b.variables():
                 v.aux = True
         for i in range(n):
-            csp.add((bits0[i] + bits1[i]) % 2 == bits2[i])
+            currentCsp().add((bits0[i] + bits1[i]) % 2 == bits2[i])
     return bv2
     
 def AshL(x, sw):
@@ -1485,14 +2012,14 @@ def AshL(x, sw):
             for v in b.variables():
                 v.aux = True
         for i in range(n - sw):
-            csp.add(bits[sw + i] == xbits[i])
+            currentCsp().add(bits[sw + i] == xbits[i])
         for i in range(sw):
-            csp.add(bits[i] == 0)
+            currentCsp().add(bits[i] == 0)
     else:
         bv = BitVec(n, signed=signed)
         for v in bv.variables():
             v.aux = True
-        csp.add((x * (2**sw)) % N == bv)
+        currentCsp().add((x * (2**sw)) % N == bv)
     return bv
 
 def AshR(x, sw):
@@ -1511,8 +2038,8 @@ def AshR(x, sw):
         for b in xbits + bits:
             for v in b.variables():
                 v.aux = True
-        csp.add(Imp(xbv >= 0, And(And([xbits[sw + i] == bits[i] for i in range(n - sw -1)]), And([bits[i] == 0 for i in range(n - sw - 1, n)]))))
-        csp.add(Imp(xbv < 0, And(And([xbits[sw + i] == bits[i] for i in range(n - sw -1)]), And([bits[i] == 1 for i in range(n - sw - 1, n)]))))
+        currentCsp().add(Imp(xbv >= 0, And(And([xbits[sw + i] == bits[i] for i in range(n - sw -1)]), And([bits[i] == 0 for i in range(n - sw - 1, n)]))))
+        currentCsp().add(Imp(xbv < 0, And(And([xbits[sw + i] == bits[i] for i in range(n - sw -1)]), And([bits[i] == 1 for i in range(n - sw - 1, n)]))))
         return bv
     else:
         return LshR(x, sw)
@@ -1535,7 +2062,7 @@ def LshR(x, sw):
     for v in bv.variables():
         v.aux = True
     N = 2**n
-    csp.add(x % N - x % (2**sw) == Sum([bits[i] * (2**(i + sw)) for i in range(n - sw)]))
+    currentCsp().add(x % N - x % (2**sw) == Sum([bits[i] * (2**(i + sw)) for i in range(n - sw)]))
     for i in range(n - sw, n):
-        csp.add(bits[i] == 0)
+        currentCsp().add(bits[i] == 0)
     return bv
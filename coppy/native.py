@@ -0,0 +1,723 @@
+"""
+Order encoding of CSPs into DIMACS CNF in Python (with NumPy), without Sugar and the JVM
+
+Supported:
+    Int variables with IntervalDomain or SetDomain, Bool variables
+    Eq, Ne, Le, Lt, Ge, Gt of linear terms (Num, Var, LinearExpr, Add, Sum, Sub, Neg, and Mul by constants)
+    Alldifferent of linear terms
+    Table and NegativeTable of Int variables
+    Cumulative of Int variables with constant durations, demands and capacity, Disjunctive of linear terms
+    Element of linear terms (indexed by an Int variable for the direct encoding)
+    Not, And, Or, Imp, Xor, Iff
+Other constraints raise UnsupportedConstraint (the solver then uses Sugar)
+The objective is not encoded: Model.optimize bounds the objective variable by constraints or assumptions
+"""
+import os
+from .csp import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# codes of the literals decided by the domains (FALSE_CODE == -TRUE_CODE)
+TRUE_CODE = 2**40
+FALSE_CODE = -TRUE_CODE
+# the DIMACS header is padded to this width, so that it can be rewritten in place
+headerWidth = 64
+# sums of two terms whose value sets are larger than this get an interval domain
+maxSumValues = 10**6
+
+class UnsupportedConstraint(Exception):
+    pass
+
+def linearize(roots):
+    """
+    Linear form of the sum of a * t for (t, a) in roots, as ([(x, coefficient)], constant)
+    """
+    terms = dict()
+    const = 0
+    stack = list(roots)
+    while stack:
+        t, a = stack.pop()
+        if isinstance(t, Num):
+            const += a * t.v
+        elif isinstance(t, Var):
+            if t.name in terms:
+                terms[t.name][1] += a
+            else:
+                terms[t.name] = [t, a]
+        elif isinstance(t, LinearExpr):
+            for (x, c) in zip(t.xs, t.coefs):
+                stack.append((x, a * c))
+            const += a * t.const
+        elif isinstance(t, (Add, Sum)):
+            stack.extend([(x, a) for x in t.xs])
+        elif isinstance(t, Sub):
+            if len(t.xs) > 0:
+                stack.append((t.xs[0], a))
+                stack.extend([(x, -a) for x in t.xs[1:]])
+        elif isinstance(t, Neg):
+            stack.append((t.x0, -a))
+        elif isinstance(t, Mul):
+            rest = []
+            for x in t.xs:
+                if isinstance(x, Num):
+                    a *= x.v
+                else:
+                    rest.append(x)
+            if len(rest) > 1:
+                raise UnsupportedConstraint('non linear term ' + str(t))
+            elif len(rest) == 1:
+                stack.append((rest[0], a))
+            else:
+                const += a
+        else:
+            raise UnsupportedConstraint('unsupported term ' + str(t))
+    return [(x, a) for (x, a) in terms.values() if a != 0], const
+
+def clauseText(block):
+    """
+    DIMACS lines of the clauses given as the rows of block
+    """
+    fmt = ' '.join(['%d'] * block.shape[1]) + ' 0\n'
+    return (fmt * len(block)) % tuple(block.ravel().tolist())
+
+class NativeEncoder:
+    """
+    Encoder writing the order encoding of a CSP to satFileName (same interface as sugar.Encoder)
+    An Int variable with values d_0 < ... < d_k-1 has the SAT variables code + i for x <= d_i (i < k - 1)
+    """
+    def __init__(self, satFileName):
+        if np is None:
+            raise UnsupportedConstraint('NumPy is not installed')
+        self.satFileName = satFileName
+        self.reset()
+
+    def reset(self):
+        # (code, values) of the Int variables by name, codes of the Bool variables by name
+        self.codes = dict()
+        self.boolCodes = dict()
+        # (code, values) of the auxiliary variables for sums of two terms
+        self.sums = dict()
+        self.variablesCount = 0
+        self.clausesCount = 0
+        self.fileSize = 0
+        self.unsat = False
+        # clause text not yet written
+        self.chunks = []
+        # (dict, key) entries added since the last commit, removed by cancel
+        self.added = []
+        self.committed = (0, 0, 0, False)
+        self.intValues = dict()
+        self.boolValues = dict()
+
+    #####################
+    # interface of sugar.Encoder
+
+    def encode(self, csp):
+        self.reset()
+        self.encodeVariables(csp, csp.variables, csp.bools)
+        for c in csp.constraints:
+            self.encodeFormula(c, [], True)
+        with open(self.satFileName, 'w') as f:
+            f.write(self.header())
+        self.fileSize = len(self.header())
+        self.flush()
+        return not self.unsat
+
+    def encodeDelta(self, csp):
+        self.encodeVariables(csp, csp.variablesDelta(), csp.boolsDelta())
+        for c in csp.constraintsDelta():
+            self.encodeFormula(c, [], True)
+        self.flush()
+
+    def commit(self):
+        if not self.unsat:
+            self.committed = (self.variablesCount, self.clausesCount, self.fileSize, self.unsat)
+            self.added = []
+
+    def cancel(self):
+        self.chunks = []
+        for (d, key) in self.added:
+            del d[key]
+        self.added = []
+        self.variablesCount, self.clausesCount, size, self.unsat = self.committed
+        if size < self.fileSize:
+            with open(self.satFileName, 'r+b') as f:
+                f.truncate(size)
+            self.fileSize = size
+        self.writeHeader()
+
+    def satVariablesCount(self):
+        return self.variablesCount
+
+    def satClausesCount(self):
+        return self.clausesCount
+
+    def satFileSize(self):
+        return self.fileSize
+
+    def isUnsatisfiable(self):
+        return self.unsat
+
+    def hasVariable(self, x):
+        return isinstance(x, Var) and x.name in self.codes
+
+    def codeLE(self, x, a):
+        """
+        SAT literal of x <= a (TRUE_CODE or FALSE_CODE if it is decided by the domain)
+        """
+        return int(self.le(self.codes[x.name], a))
+
+    def boundLiterals(self, x, lo, hi):
+        """
+        Literals for lo <= x <= hi (None if the bounds are inconsistent with the domain)
+        lo or hi can be None for a one-sided bound
+        """
+        lits = []
+        if hi is not None:
+            le = self.codeLE(x, hi)
+            if le == FALSE_CODE:
+                return None
+            elif le != TRUE_CODE:
+                lits.append(le)
+        if lo is not None:
+            lt = self.codeLE(x, lo - 1)
+            if lt == TRUE_CODE:
+                return None
+            elif lt != FALSE_CODE:
+                lits.append(-lt)
+        return lits
+
+    def blockingClause(self, sol, xs, ps):
+        """
+        Clause of the literals x <= v - 1 or x >= v + 1 for each x of xs
+        and of the negated values of ps, where v is the value in sol
+        (None if a variable is not encoded)
+        """
+        clause = []
+        for x in xs:
+            if x.name not in self.codes:
+                return None
+            v = sol.getValue(x)
+            lt = self.codeLE(x, v - 1)
+            if lt != FALSE_CODE:
+                clause.append(lt)
+            le = self.codeLE(x, v)
+            if le != TRUE_CODE:
+                clause.append(-le)
+        for p in ps:
+            if p.name not in self.boolCodes:
+                return None
+            b = self.boolCodes[p.name]
+            clause.append(-b if sol.getValue(p) else b)
+        return clause
+
+    def addClause(self, clause):
+        self.chunks.append(' '.join([str(lit) for lit in clause]) + ' 0\n')
+        self.clausesCount += 1
+        self.flush()
+
+    def newSatVariable(self):
+        self.variablesCount += 1
+        self.writeHeader()
+        self.commit()
+        return self.variablesCount
+
+    def decode(self, outFileName, csp):
+        from .sugar import parseSatOutput
+        with open(outFileName) as f:
+            return self.decodeModel(parseSatOutput(f.read()), csp)
+
+    def decodeModel(self, model, csp):
+        if model is None:
+            return None
+        lits = np.array(model, dtype=np.int64)
+        lits = lits[(lits > 0) & (lits <= self.variablesCount)]
+        truth = np.zeros(self.variablesCount + 1, dtype=bool)
+        truth[lits] = True
+        self.intValues = dict()
+        for (name, (code, values)) in self.codes.items():
+            le = truth[code:code + len(values) - 1]
+            self.intValues[name] = int(values[np.argmax(le)] if le.any() else values[-1])
+        self.boolValues = {name: bool(truth[code]) for (name, code) in self.boolCodes.items()}
+        return self.solution(csp)
+
+    def solution(self, csp):
+        intValues = {x: self.intValues[x.name] for x in csp.variables if x.name in self.intValues}
+        boolValues = {p: self.boolValues[p.name] for p in csp.bools if p.name in self.boolValues}
+        return Solution(intValues, boolValues, csp)
+
+    #####################
+    # CNF file
+
+    def header(self):
+        return f'p cnf {self.variablesCount} {self.clausesCount}'.ljust(headerWidth - 1) + '\n'
+
+    def writeHeader(self):
+        if self.fileSize > 0:
+            with open(self.satFileName, 'r+b') as f:
+                f.write(self.header().encode())
+
+    def flush(self):
+        if self.chunks:
+            data = ''.join(self.chunks).encode()
+            self.chunks = []
+            with open(self.satFileName, 'ab') as f:
+                f.write(data)
+            self.fileSize += len(data)
+        self.writeHeader()
+
+    def addBlock(self, block, guard=[]):
+        """
+        Add the clauses given as the rows of block, each extended by the literals of guard
+        TRUE_CODE satisfies a clause and FALSE_CODE is dropped from it
+        """
+        if len(block) == 0:
+            return
+        if len(guard) > 0:
+            block = np.hstack([block, np.tile(np.array(guard, dtype=np.int64), (len(block), 1))])
+        block = block[~(block == TRUE_CODE).any(axis=1)]
+        false = block == FALSE_CODE
+        # rows of no literal (zero width) or of dropped literals only
+        empty = false.all(axis=1)
+        if empty.any():
+            self.addEmptyClause()
+            block, false = block[~empty], false[~empty]
+        if false.any():
+            # a dropped literal is replaced by a literal kept in the clause
+            kept = block[np.arange(len(block)), np.argmax(~false, axis=1)]
+            block = np.where(false, kept[:, None], block)
+        if len(block) > 0:
+            self.chunks.append(clauseText(block))
+            self.clausesCount += len(block)
+
+    def addLiterals(self, lits):
+        self.addBlock(np.array([lits], dtype=np.int64))
+
+    def addEmptyClause(self):
+        p = self.newVariables(1)
+        self.chunks.append(f'{p} 0\n{-p} 0\n')
+        self.clausesCount += 2
+        self.unsat = True
+
+    #####################
+    # variables
+
+    def newVariables(self, n):
+        code = self.variablesCount + 1
+        self.variablesCount += n
+        return code
+
+    def newIntVariable(self, values):
+        """
+        (code, values) of a new Int variable with the order axioms x <= d_i -> x <= d_i+1
+        """
+        code = self.newVariables(len(values) - 1)
+        if len(values) > 2:
+            c = np.arange(code, code + len(values) - 2, dtype=np.int64)
+            self.addBlock(np.stack([-c, c + 1], axis=1))
+        return (code, values)
+
+    def encodeVariables(self, csp, variables, bools):
+        for x in variables:
+            if x.name in self.codes:
+                continue
+            d = csp.dom[x]
+            if isinstance(d, IntervalDomain):
+                values = np.arange(d.lo, d.hi + 1, dtype=np.int64)
+            elif isinstance(d, SetDomain):
+                values = np.array(sorted(d.values), dtype=np.int64)
+            else:
+                raise UnsupportedConstraint('unsupported domain ' + str(d))
+            if len(values) == 0:
+                self.addEmptyClause()
+                values = np.zeros(1, dtype=np.int64)
+            self.codes[x.name] = self.newIntVariable(values)
+            self.added.append((self.codes, x.name))
+        for p in bools:
+            if p.name in self.boolCodes:
+                continue
+            self.boolCodes[p.name] = self.newVariables(1)
+            self.added.append((self.boolCodes, p.name))
+
+    def intVariable(self, x):
+        if x.name not in self.codes:
+            raise UnsupportedConstraint('undeclared variable ' + x.name)
+        return self.codes[x.name]
+
+    def boolVariable(self, p):
+        if p.name not in self.boolCodes:
+            raise UnsupportedConstraint('undeclared variable ' + p.name)
+        return self.boolCodes[p.name]
+
+    def sumVariable(self, t1, t2):
+        """
+        Auxiliary variable y = a1 * x1 + a2 * x2 for the terms ti = (enc, ai)
+        """
+        key = (t1[0][0], t1[1], t2[0][0], t2[1])
+        if key in self.sums:
+            return self.sums[key]
+        v1 = t1[0][1] * t1[1]
+        v2 = t2[0][1] * t2[1]
+        if len(v1) * len(v2) <= maxSumValues:
+            values = np.unique(np.add.outer(v1, v2))
+        else:
+            values = np.arange(v1.min() + v2.min(), v1.max() + v2.max() + 1, dtype=np.int64)
+        y = self.newIntVariable(values)
+        self.sums[key] = y
+        self.added.append((self.sums, key))
+        self.encodeLE([(y, 1), (t1[0], -t1[1]), (t2[0], -t2[1])], 0, [])
+        self.encodeLE([(y, -1), t1, t2], 0, [])
+        return y
+
+    #####################
+    # literals
+
+    def le(self, enc, b):
+        """
+        Codes of x <= b for the Int variable enc = (code, values) (b can be an array)
+        """
+        code, values = enc
+        k = np.searchsorted(values, b, side='right')
+        return np.where(k == 0, FALSE_CODE, np.where(k == len(values), TRUE_CODE, code + k - 1))
+
+    def termLE(self, enc, a, b):
+        """
+        Codes of a * x <= b
+        """
+        if a > 0:
+            return self.le(enc, np.floor_divide(b, a))
+        else:
+            # x >= ceil(b / a)
+            return -self.le(enc, -np.floor_divide(-np.asarray(b), a) - 1)
+
+    #####################
+    # constraints
+
+    def encodeTerms(self, terms):
+        return [(self.intVariable(x), a) for (x, a) in terms]
+
+    def encodeLE(self, terms, const, guard):
+        """
+        sum of a * x for (x, a) in terms (x given by its (code, values)) + const <= 0, when all the literals of guard are false
+        """
+        # sums of more than three terms are split with auxiliary variables (a balanced tree of pairs)
+        terms = list(terms)
+        while len(terms) > 3:
+            t1, t2 = terms[0], terms[1]
+            terms = terms[2:] + [(self.sumVariable(t1, t2), 1)]
+        if len(terms) == 0:
+            if const > 0:
+                self.addBlock(np.full((1, 1), FALSE_CODE, dtype=np.int64), guard)
+            return
+        # the term with most values gets the bound of each clause
+        terms = sorted(terms, key=lambda t: len(t[0][1]))
+        last = terms[-1]
+        if len(terms) == 1:
+            self.addBlock(np.array([[self.termLE(last[0], last[1], -const)]], dtype=np.int64), guard)
+            return
+        # clauses a_i * x_i <= u_i - 1 (i < n) or a_n * x_n <= -const - sum u_i for each u_i in the values of a_i * x_i
+        us = np.meshgrid(*[np.sort(enc[1] * a) for (enc, a) in terms[:-1]], indexing='ij')
+        us = [u.ravel() for u in us]
+        cols = [self.termLE(enc, a, u - 1) for ((enc, a), u) in zip(terms[:-1], us)]
+        cols.append(self.termLE(last[0], last[1], -const - sum(us)))
+        self.addBlock(np.stack(cols, axis=1), guard)
+
+    def encodeNE(self, terms, const, guard):
+        """
+        sum of a * x for (x, a) in terms + const != 0, when all the literals of guard are false
+        """
+        if len(terms) == 0:
+            if const == 0:
+                self.addBlock(np.full((1, 1), FALSE_CODE, dtype=np.int64), guard)
+        elif len(terms) == 1:
+            (enc, a), = terms
+            if -const % a == 0 and -const // a in enc[1]:
+                v = -const // a
+                self.addBlock(np.array([[self.le(enc, v - 1), -self.le(enc, v)]], dtype=np.int64), guard)
+        elif len(terms) == 2:
+            # not (x = u and y = w) for each pair of values with a * u + b * w + const = 0
+            (ex, a), (ey, b) = sorted(terms, key=lambda t: len(t[0][1]))
+            u = ex[1]
+            num = -const - a * u
+            mask = num % b == 0
+            u, w = u[mask], num[mask] // b
+            k = np.minimum(np.searchsorted(ey[1], w), len(ey[1]) - 1)
+            mask = ey[1][k] == w
+            u, w = u[mask], w[mask]
+            block = np.stack([self.le(ex, u - 1), -self.le(ex, u), self.le(ey, w - 1), -self.le(ey, w)], axis=1)
+            self.addBlock(block, guard)
+        else:
+            # sum + const <= -1 or sum + const >= 1
+            g = self.newVariables(2)
+            self.addLiterals(guard + [g, g + 1])
+            self.encodeLE(terms, const + 1, [-g])
+            self.encodeLE([(enc, -a) for (enc, a) in terms], -const + 1, [-g - 1])
+
+    def encodeEQ(self, terms, const, guard):
+        self.encodeLE(terms, const, guard)
+        self.encodeLE([(enc, -a) for (enc, a) in terms], -const, guard)
+
+    def comparison(self, c, positive):
+        """
+        (kind, terms, const) of the comparison c (or its negation) where kind is 'le', 'eq' or 'ne'
+        for sum + const <= 0, == 0 or != 0
+        """
+        if isinstance(c, (Le, Lt, Ge, Gt)):
+            if isinstance(c, (Le, Lt)):
+                x0, x1 = c.x0, c.x1
+            else:
+                x0, x1 = c.x1, c.x0
+            # x0 <= x1 (- 1 for Lt and Gt)
+            strict = isinstance(c, (Lt, Gt))
+            if positive:
+                terms, const = linearize([(x0, 1), (x1, -1)])
+                return 'le', terms, const + (1 if strict else 0)
+            else:
+                terms, const = linearize([(x1, 1), (x0, -1)])
+                return 'le', terms, const + (0 if strict else 1)
+        terms, const = linearize([(c.x0, 1), (c.x1, -1)])
+        if isinstance(c, Eq) == positive:
+            return 'eq', terms, const
+        return 'ne', terms, const
+
+    def literals(self, c, positive):
+        """
+        Literals of a clause equivalent to c (or its negation), None if there is none
+        """
+        if isinstance(c, BOOL):
+            p = self.boolVariable(c)
+            return [p if positive else -p]
+        elif isinstance(c, Not):
+            return self.literals(c.c0, not positive)
+        elif isinstance(c, (TRUE, FALSE)):
+            return [TRUE_CODE if isinstance(c, TRUE) == positive else FALSE_CODE]
+        elif isinstance(c, (Or, And)) and isinstance(c, Or) == positive:
+            lits = []
+            for cc in c.cs:
+                ls = self.literals(cc, positive)
+                if ls is None:
+                    return None
+                lits += ls
+            return lits
+        elif isinstance(c, (Le, Lt, Ge, Gt, Eq, Ne)):
+            kind, terms, const = self.comparison(c, positive)
+            if len(terms) == 0:
+                sat = const <= 0 if kind == 'le' else (const == 0) == (kind == 'eq')
+                return [TRUE_CODE if sat else FALSE_CODE]
+            elif len(terms) == 1 and kind == 'le':
+                (x, a), = terms
+                return [int(self.termLE(self.intVariable(x), a, -const))]
+            elif len(terms) == 1 and kind == 'ne':
+                (x, a), = terms
+                enc = self.intVariable(x)
+                if -const % a != 0:
+                    return [TRUE_CODE]
+                v = -const // a
+                return [int(self.le(enc, v - 1)), -int(self.le(enc, v))]
+        return None
+
+    def encodeFormula(self, c, guard, positive):
+        """
+        Clauses of c (or its negation if not positive), each extended by the literals of guard
+        """
+        lits = self.literals(c, positive)
+        if lits is not None:
+            self.addLiterals(guard + lits)
+        elif isinstance(c, Not):
+            self.encodeFormula(c.c0, guard, not positive)
+        elif isinstance(c, (And, Or)):
+            if isinstance(c, And) == positive:
+                for cc in c.cs:
+                    self.encodeFormula(cc, guard, positive)
+            else:
+                self.encodeDisjunction([(cc, positive) for cc in c.cs], guard)
+        elif isinstance(c, Imp):
+            if positive:
+                self.encodeDisjunction([(c.c0, False), (c.c1, True)], guard)
+            else:
+                self.encodeFormula(c.c0, guard, True)
+                self.encodeFormula(c.c1, guard, False)
+        elif isinstance(c, (Iff, Xor)):
+            # c0 == c1 for a positive Iff or a negative Xor
+            same = isinstance(c, Iff) == positive
+            self.encodeDisjunction([(c.c0, False), (c.c1, same)], guard)
+            self.encodeDisjunction([(c.c0, True), (c.c1, not same)], guard)
+        elif isinstance(c, (Le, Lt, Ge, Gt, Eq, Ne)):
+            kind, terms, const = self.comparison(c, positive)
+            terms = self.encodeTerms(terms)
+            if kind == 'le':
+                self.encodeLE(terms, const, guard)
+            elif kind == 'eq':
+                self.encodeEQ(terms, const, guard)
+            else:
+                self.encodeNE(terms, const, guard)
+        elif isinstance(c, Alldifferent):
+            pairs = [(x0, x1) for (i, x0) in enumerate(c.xs) for x1 in c.xs[i + 1:]]
+            if positive:
+                for (x0, x1) in pairs:
+                    terms, const = linearize([(x0, 1), (x1, -1)])
+                    self.encodeNE(self.encodeTerms(terms), const, guard)
+            else:
+                self.encodeDisjunction([(Eq(x0, x1), True) for (x0, x1) in pairs], guard)
+        elif isinstance(c, Table):
+            self.encodeTable(c, guard, positive)
+        elif isinstance(c, Disjunctive):
+            self.encodeFormula(c.decomposition(), guard, positive)
+        elif isinstance(c, Cumulative):
+            self.encodeCumulative(c, guard, positive)
+        elif isinstance(c, Element):
+            self.encodeElement(c, guard, positive)
+        else:
+            raise UnsupportedConstraint('unsupported constraint ' + str(c))
+
+    def encodeTable(self, c, guard, positive):
+        """
+        Clauses of the Table c (or its negation): a forbidden tuple is excluded by one clause,
+        and each allowed tuple gets a selector literal implying the values of the tuple,
+        one of the selectors being true when the literals of guard are false
+        """
+        if not all([isinstance(x, Var) for x in c.xs]):
+            raise UnsupportedConstraint('Table of terms ' + str(c))
+        encs = [self.intVariable(x) for x in c.xs]
+        tuples = np.unique(np.frombuffer(c.tuples, dtype=np.int64).reshape(-1, len(encs)), axis=0)
+        # the tuples out of the domains never occur
+        mask = np.ones(len(tuples), dtype=bool)
+        for (j, enc) in enumerate(encs):
+            mask &= np.isin(tuples[:, j], enc[1])
+        tuples = tuples[mask]
+        if c.support != positive:
+            cols = []
+            for (j, enc) in enumerate(encs):
+                cols += [self.le(enc, tuples[:, j] - 1), -self.le(enc, tuples[:, j])]
+            self.addBlock(np.stack(cols, axis=1), guard)
+        elif len(tuples) == 0:
+            self.addBlock(np.full((1, 1), FALSE_CODE, dtype=np.int64), guard)
+        else:
+            s = self.newVariables(len(tuples))
+            selectors = np.arange(s, s + len(tuples), dtype=np.int64)
+            self.addLiterals(guard + selectors.tolist())
+            for (j, enc) in enumerate(encs):
+                self.addBlock(np.stack([-selectors, self.le(enc, tuples[:, j])], axis=1))
+                self.addBlock(np.stack([-selectors, -self.le(enc, tuples[:, j] - 1)], axis=1))
+
+    def encodeElement(self, c, guard, positive):
+        """
+        Clauses of the Element c (direct encoding): a literal e_k for each value k of the index in the array
+        implies index == k and item == array[k], and one of them is true when the literals of guard are false
+        (for an array of constants and an Int variable item, item == v also implies one of the e_k with array[k] == v)
+        """
+        if not positive or not isinstance(c.index, Var):
+            self.encodeFormula(c.decomposition(), guard, positive)
+            return
+        enc = self.intVariable(c.index)
+        ks = enc[1][(0 <= enc[1]) & (enc[1] < len(c.array))]
+        if len(ks) == 0:
+            self.addBlock(np.full((1, 1), FALSE_CODE, dtype=np.int64), guard)
+            return
+        e = self.newVariables(len(ks))
+        es = np.arange(e, e + len(ks), dtype=np.int64)
+        self.addLiterals(guard + es.tolist())
+        self.addBlock(np.stack([-es, self.le(enc, ks)], axis=1))
+        self.addBlock(np.stack([-es, -self.le(enc, ks - 1)], axis=1))
+        if not (c.isConstant() and isinstance(c.item, Var)):
+            for (k, code) in zip(ks.tolist(), es.tolist()):
+                terms, const = linearize([(c.array[k], 1), (c.item, -1)])
+                self.encodeEQ(self.encodeTerms(terms), const, [-code])
+            return
+        item = self.intVariable(c.item)
+        array = np.array([a.v for a in c.array], dtype=np.int64)[ks]
+        self.addBlock(np.stack([-es, self.le(item, array)], axis=1))
+        self.addBlock(np.stack([-es, -self.le(item, array - 1)], axis=1))
+        # item == v implies one of the e_k with array[k] == v (the clauses with the same number of e_k make one block)
+        order = np.argsort(array, kind='stable')
+        vs, starts, counts = np.unique(array[order], return_index=True, return_counts=True)
+        values = item[1]
+        missing = values[~np.isin(values, vs)]
+        self.addBlock(np.stack([self.le(item, missing - 1), -self.le(item, missing)], axis=1), guard)
+        for n in np.unique(counts).tolist():
+            sel = counts == n
+            lits = es[order][starts[sel][:, None] + np.arange(n)]
+            self.addBlock(np.hstack([self.le(item, vs[sel] - 1)[:, None], -self.le(item, vs[sel])[:, None], lits]), guard)
+
+    def encodeCumulative(self, c, guard, positive):
+        """
+        Clauses of the Cumulative c (time-indexed): a literal r_it is true iff task i is running at time t (s_i <= t < s_i + d_i),
+        and at each time t when a task can start, a sequential counter of the demands h_i of the literals r_it
+        (v_jk : the sum of the first j demands is larger than k) never exceeds the capacity
+        """
+        if not positive:
+            raise UnsupportedConstraint('negation of ' + str(c))
+        if not all([isinstance(s, Var) for s in c.starts]) or not all([isinstance(t, Num) for t in c.durations + c.demands + (c.capacity,)]):
+            raise UnsupportedConstraint('Cumulative of terms ' + str(c))
+        if any([h.v < 0 for h in c.demands]):
+            raise UnsupportedConstraint('negative demand in ' + str(c))
+        tasks = [(self.intVariable(s), d.v, h.v) for (s, d, h) in zip(c.starts, c.durations, c.demands) if d.v > 0 and h.v > 0]
+        if len(tasks) == 0:
+            if c.capacity.v < 0:
+                self.addBlock(np.full((1, 1), FALSE_CODE, dtype=np.int64), guard)
+            return
+        # the load is largest at a start time (the demands being non-negative), so only those times are checked
+        times = np.unique(np.concatenate([enc[1] for (enc, d, h) in tasks]))
+        const = np.zeros(len(times), dtype=np.int64)
+        # (time index, literal, demand) of the tasks which may be running
+        items = []
+        for (enc, d, h) in tasks:
+            a = self.le(enc, times)
+            b = self.le(enc, times - d)
+            running = (a != FALSE_CODE) & (b != TRUE_CODE)
+            always = running & (a == TRUE_CODE) & (b == FALSE_CODE)
+            const[always] += h
+            ks = np.flatnonzero(running & ~always)
+            if len(ks) == 0:
+                continue
+            r = self.newVariables(len(ks))
+            rs = np.arange(r, r + len(ks), dtype=np.int64)
+            self.addBlock(np.stack([-a[ks], b[ks], rs], axis=1))
+            self.addBlock(np.stack([-rs, a[ks]], axis=1))
+            self.addBlock(np.stack([-rs, -b[ks]], axis=1))
+            items.append(np.stack([ks, rs, np.full(len(ks), h, dtype=np.int64)], axis=1))
+        items = np.concatenate(items) if items else np.zeros((0, 3), dtype=np.int64)
+        items = items[np.argsort(items[:, 0], kind='stable')]
+        bounds = np.searchsorted(items[:, 0], np.arange(len(times) + 1))
+        for (k, limit) in enumerate((c.capacity.v - const).tolist()):
+            rs, hs = items[bounds[k]:bounds[k + 1], 1], items[bounds[k]:bounds[k + 1], 2]
+            if limit < 0:
+                self.addBlock(np.full((1, 1), FALSE_CODE, dtype=np.int64), guard)
+            elif len(rs) > 0:
+                self.encodeCounter(rs, np.minimum(hs, limit + 1), limit, guard)
+
+    def encodeCounter(self, rs, hs, limit, guard):
+        """
+        Clauses of sum of hs[j] for the true literals rs[j] <= limit (hs[j] <= limit + 1), when all the literals of guard are false
+        """
+        m, n = len(rs), limit + 1
+        v = self.newVariables(m * n)
+        # v[j, k] : the sum of the first j + 1 terms is larger than k (k = limit : the sum exceeds the limit)
+        v = np.arange(v, v + m * n, dtype=np.int64).reshape(m, n)
+        k = np.arange(n)
+        j, kk = np.nonzero(k[None, :] < hs[:, None])
+        self.addBlock(np.stack([-rs[j], v[j, kk]], axis=1))
+        if m > 1:
+            self.addBlock(np.stack([-v[:-1].ravel(), v[1:].ravel()], axis=1))
+            # r_j and (sum of the first j terms > k) imply (sum of the first j + 1 terms > k + h_j)
+            up = np.minimum(k[None, :] + hs[1:, None], limit)
+            rows = np.repeat(np.arange(1, m), n)
+            self.addBlock(np.stack([-rs[rows], -v[:-1].ravel(), v[rows, up.ravel()]], axis=1))
+        self.addBlock(np.array([[-v[-1, limit]]], dtype=np.int64), guard)
+
+    def encodeDisjunction(self, cs, guard):
+        """
+        Clause of the constraints (c, positive) of cs extended by guard,
+        where a constraint which is not a clause is replaced by a new literal implying it
+        """
+        lits = []
+        for (c, positive) in cs:
+            ls = self.literals(c, positive)
+            if ls is None:
+                g = self.newVariables(1)
+                self.encodeFormula(c, [-g], positive)
+                ls = [g]
+            lits += ls
+        self.addLiterals(guard + lits)
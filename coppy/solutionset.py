@@ -0,0 +1,269 @@
+"""
+Solutions stored as NumPy columns, and sinks streaming them to files
+
+A SolutionSet keeps one integer column per variable (of the smallest signed dtype holding its domain)
+and one bool column per bool, instead of two dicts per solution.
+The solutions are appended row by row and packed into the columns chunk by chunk,
+and each chunk is also written to the sinks (NDJSON, CSV or .npy files), so an enumeration can be streamed to disk
+    with SolutionSet(sinks=[CsvSink('sols.csv')], keep=False) as sols:
+        sols.extend(iterSolutions())
+"""
+import json
+from .csp import *
+from .batch import BatchEvaluator
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class SolutionSet:
+    """
+    Columns of the values of variables and bools in the solutions
+    variables, bools : stored variables (all the variables and bools of csp by default)
+    chunkSize : number of solutions packed into the columns (and written to the sinks) at once
+    sinks : NdjsonSink, CsvSink, NpySink... receiving each chunk
+    keep : whether the columns are kept in memory (False to only stream the solutions to the sinks)
+    """
+    def __init__(self, variables=None, bools=None, csp=None, chunkSize=65536, sinks=None, keep=True):
+        if np is None:
+            raise Exception('NumPy is required for SolutionSet')
+        self.csp = csp if csp is not None else currentCsp()
+        self.variables = list(variables) if variables is not None else list(self.csp.variables)
+        self.bools = list(bools) if bools is not None else list(self.csp.bools)
+        self.intPos = {x.name: j for (j, x) in enumerate(self.variables)}
+        self.boolPos = {p.name: j for (j, p) in enumerate(self.bools)}
+        self.dtypes = [compactType(self.csp.dom[x]) for x in self.variables]
+        self.chunkSize = chunkSize
+        self.sinks = list(sinks) if sinks is not None else []
+        self.keep = keep
+        # packed chunks of each column, and the rows (lists of values by variable id) not packed yet
+        self.intColumns = [[] for x in self.variables]
+        self.boolColumns = [[] for p in self.bools]
+        self.size = 0
+        self.pendingInts = []
+        self.pendingBools = []
+        self.closed = False
+        for sink in self.sinks:
+            sink.start([x.name for x in self.variables], [p.name for p in self.bools])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, sol):
+        iv, bv = sol.valueArrays(self.csp)
+        self.pendingInts.append(iv)
+        self.pendingBools.append(bv)
+        if len(self.pendingInts) >= self.chunkSize:
+            self.flush()
+
+    def extend(self, sols):
+        for sol in sols:
+            self.append(sol)
+        return self
+
+    def flush(self):
+        """
+        Pack the pending rows into the columns and write them to the sinks
+        """
+        if len(self.pendingInts) == 0:
+            return
+        n = len(self.pendingInts)
+        if any([None in iv for iv in self.pendingInts]) or any([None in bv for bv in self.pendingBools]):
+            raise Exception('a solution has no value for some variables of the CSP')
+        ints = np.array(self.pendingInts, dtype=np.int64).reshape(n, len(self.csp.variables))
+        ints = ints[:, [self.csp.varIds[x.name] for x in self.variables]]
+        bools = np.array(self.pendingBools, dtype=bool).reshape(n, len(self.csp.bools))
+        bools = bools[:, [self.csp.boolIds[p.name] for p in self.bools]]
+        self.pendingInts = []
+        self.pendingBools = []
+        for sink in self.sinks:
+            sink.write(ints, bools)
+        if self.keep:
+            for (j, column) in enumerate(self.intColumns):
+                column.append(ints[:, j].astype(self.dtypes[j]))
+            for (j, column) in enumerate(self.boolColumns):
+                column.append(bools[:, j].copy())
+        self.size += n
+
+    def close(self):
+        """
+        Pack the pending rows and close the sinks
+        """
+        if self.closed:
+            return
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
+        self.closed = True
+
+    def __len__(self):
+        return self.size + len(self.pendingInts)
+
+    def column(self, chunks, dtype):
+        if not self.keep:
+            raise Exception('the solutions are not kept (keep=False)')
+        self.flush()
+        if len(chunks) != 1:
+            a = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+            chunks[:] = [a]
+        return chunks[0]
+
+    def __getitem__(self, x):
+        """
+        solutionSet[x] : column of the variable or bool x (or of the variable named x),
+                         or values of the term or constraint x in each solution (evaluated with NumPy)
+        solutionSet[i] : i-th solution
+        """
+        if isinstance(x, (int, np.integer)):
+            return self.solution(int(x))
+        if isinstance(x, str):
+            if x in self.intPos:
+                x = self.variables[self.intPos[x]]
+            elif x in self.boolPos:
+                x = self.bools[self.boolPos[x]]
+            else:
+                raise KeyError(x)
+        if isinstance(x, Var) and x.name in self.intPos:
+            j = self.intPos[x.name]
+            return self.column(self.intColumns[j], self.dtypes[j])
+        if isinstance(x, BOOL) and x.name in self.boolPos:
+            return self.column(self.boolColumns[self.boolPos[x.name]], bool)
+        return self.evaluate(x)
+
+    def evaluate(self, e):
+        """
+        Values of the term or constraint e in each solution
+        """
+        ints = np.zeros((len(self), len(self.csp.variables)), dtype=np.int64)
+        bools = np.zeros((len(self), len(self.csp.bools)), dtype=bool)
+        for x in e.variables():
+            if x.name not in self.intPos:
+                raise Exception('variable ' + x.name + ' is not stored')
+            ints[:, self.csp.varIds[x.name]] = self[x]
+        for p in e.bools():
+            if p.name not in self.boolPos:
+                raise Exception('variable ' + p.name + ' is not stored')
+            bools[:, self.csp.boolIds[p.name]] = self[p]
+        return BatchEvaluator(ints, bools, self.csp).evaluate(e)
+
+    def solution(self, i):
+        if i < 0:
+            i += len(self)
+        intValues = {x: int(self[x][i]) for x in self.variables}
+        boolValues = {p: bool(self[p][i]) for p in self.bools}
+        return Solution(intValues, boolValues, self.csp)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.solution(i)
+
+    def columns(self):
+        """
+        Dict of the columns by variable name (pandas.DataFrame(solutionSet.columns()) makes a data frame without copy)
+        """
+        res = {x.name: self[x] for x in self.variables}
+        res.update({p.name: self[p] for p in self.bools})
+        return res
+
+    def matrix(self):
+        """
+        (ints, bools) solution matrices with the stored variables and bools as columns (as solutionMatrix)
+        """
+        ints = np.stack([self[x] for x in self.variables], axis=1).astype(np.int64) if self.variables else np.zeros((len(self), 0), dtype=np.int64)
+        bools = np.stack([self[p] for p in self.bools], axis=1) if self.bools else np.zeros((len(self), 0), dtype=bool)
+        return ints, bools
+
+    def __str__(self):
+        return 'SolutionSet(' + str(len(self)) + ' solutions of ' + str(len(self.variables)) + ' variables and ' + str(len(self.bools)) + ' bools)'
+
+    def __repr__(self):
+        return str(self)
+
+def compactType(d):
+    lo, hi = d.lb(), d.ub()
+    for t in (np.int8, np.int16, np.int32):
+        info = np.iinfo(t)
+        if info.min <= lo and hi <= info.max:
+            return t
+    return np.int64
+
+'''
+Sinks
+
+start(intNames, boolNames) is called once, then write(ints, bools) with each chunk
+(ints : int64 array and bools : bool array, with one row per solution), and close() at the end
+'''
+
+class NdjsonSink:
+    """
+    One JSON object per line mapping the variable names to their values
+    """
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.file = None
+
+    def start(self, intNames, boolNames):
+        self.names = intNames + boolNames
+        self.file = open(self.fileName, 'w')
+
+    def write(self, ints, bools):
+        lines = [json.dumps(dict(zip(self.names, a + b))) + '\n' for (a, b) in zip(ints.tolist(), bools.tolist())]
+        self.file.writelines(lines)
+
+    def close(self):
+        self.file.close()
+
+class CsvSink:
+    """
+    CSV with a header line of the variable names (bools are written as 0 or 1)
+    """
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.file = None
+
+    def start(self, intNames, boolNames):
+        self.file = open(self.fileName, 'w')
+        self.file.write(','.join(intNames + boolNames) + '\n')
+
+    def write(self, ints, bools):
+        np.savetxt(self.file, np.hstack([ints, bools.astype(np.int64)]), fmt='%d', delimiter=',')
+
+    def close(self):
+        self.file.close()
+
+class NpySink:
+    """
+    One int64 array in the .npy format with one row per solution: the values of the variables then of the bools (as 0 or 1)
+    The number of rows is written into the header when the sink is closed
+    (np.load(fileName, mmap_mode='r') reads it without loading it in memory)
+    """
+    # fixed size of the header, so that it can be rewritten in place
+    headerSize = 128
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.file = None
+
+    def start(self, intNames, boolNames):
+        self.width = len(intNames) + len(boolNames)
+        self.rows = 0
+        self.file = open(self.fileName, 'wb')
+        self.writeHeader()
+
+    def writeHeader(self):
+        header = repr({'descr': '<i8', 'fortran_order': False, 'shape': (self.rows, self.width)})
+        # magic string, version 1.0, header length, header padded with spaces and ended by a newline
+        n = self.headerSize - 10
+        self.file.write(b'\x93NUMPY\x01\x00' + n.to_bytes(2, 'little') + header.ljust(n - 1).encode('latin1') + b'\n')
+
+    def write(self, ints, bools):
+        self.file.write(np.ascontiguousarray(np.hstack([ints, bools.astype(np.int64)]), dtype='<i8').tobytes())
+        self.rows += len(ints)
+
+    def close(self):
+        self.file.seek(0)
+        self.writeHeader()
+        self.file.close()
@@ -1,100 +1,257 @@
 from .csp import *
+from .native import NativeEncoder, UnsupportedConstraint
 
 import os
-from tempfile import gettempdir
-from random import randint
+import re
+from tempfile import gettempdir, mkdtemp
+import shutil
+import weakref
 import subprocess
-import functools
+import threading
+import queue
+import time
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 jarLibDir = os.path.dirname(__file__) + '/lib/'
 sugarPath = jarLibDir + 'sugar-2.3.4.jar'
 sat4jPath = jarLibDir + 'org.sat4j.core.jar'
-import jpype
-import jpype.imports
-from jpype.types import *
-jpype.startJVM(classpath=[sugarPath, sat4jPath])
-# jpype.startJVM(classpath=['../../prog-sugar/build/sugar-2.3.4.jar'])
-from jp.kobe_u import sugar as javaSugar
-from jp.kobe_u.sugar.expression import Expression as SugarExpr
-import java
+# options of the JVM (e.g. '-Xmx4g'), used when it is started
+jvmOptions = []
+# how the CSP is handed to Sugar (see setTransport)
+transport = 'expr'
+# Java packages and types bound by startJVM
+javaSugar = None
+SugarExpr = None
+java = None
+JArray = JInt = JByte = None
 
 tmpDir = gettempdir()
+# memory backed directory used by the 'memory' pipeline (falls back to tmpDir)
+memDir = '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tmpDir
+# Sugar keeps static state (options, interned expressions), so translations and encodings are serialized
+sugarLock = threading.RLock()
+
+def startJVM():
+    """
+    Start the JVM with the Sugar and sat4j jars
+    It is called by the first operation using Sugar, so that building models needs no Java
+    """
+    global javaSugar, SugarExpr, java, JArray, JInt, JByte
+    with sugarLock:
+        if javaSugar is not None:
+            return
+        import jpype
+        import jpype.imports
+        import jpype.config
+        if not jpype.isJVMStarted():
+            if threading.current_thread() is not threading.main_thread():
+                # a JVM started by a thread of a pool can not be destroyed at exit by the main thread
+                jpype.config.destroy_jvm = False
+            jpype.startJVM(*jvmOptions, classpath=[sugarPath, sat4jPath])
+            # jpype.startJVM(classpath=['../../prog-sugar/build/sugar-2.3.4.jar'])
+        from jpype.types import JArray, JInt, JByte
+        import java
+        from jp.kobe_u.sugar.expression import Expression as SugarExpr
+        from jp.kobe_u import sugar as javaSugar
+
+def setJVMOptions(*options):
+    """
+    Set the options of the JVM (heap size, GC...), for example setJVMOptions('-Xmx8g', '-XX:+UseParallelGC')
+    They must be set before the first operation using Sugar starts the JVM
+    """
+    if javaSugar is not None:
+        raise Exception('The JVM is already started')
+    jvmOptions[:] = options
+
+def setTransport(mode):
+    """
+    mode = 'expr' : the Sugar expressions are built node by node over JPype (default)
+    mode = 'text' : the CSP is written in the S-expression syntax of Sugar and parsed by Sugar in one call
+    Both give the same CNF; it applies to the solvers created afterwards
+    """
+    global transport
+    if mode not in ('expr', 'text'):
+        raise Exception(f'Invalid transport {mode}')
+    transport = mode
 
 class Solver():
-    def __init__(self, solverName='sat_solver', optNum=1):
+    """
+    pipeline = 'file'   : CNF, map and SAT output files are written to tmpDir
+    pipeline = 'memory' : no map file and no SAT output file, the model is decoded in memory
+                          (the CNF Sugar writes for the backend is kept under memDir)
+    sat4j models are always decoded in memory from the int[] model
+    solverName can be a list of solvers raced as a Portfolio
+    encoderName = 'sugar'  : the CSP is encoded by Sugar
+    encoderName = 'native' : the CSP is encoded by NativeEncoder (no JVM for external SAT solvers),
+                             or by Sugar when it has constraints NativeEncoder does not support
+    """
+    def __init__(self, solverName='sat_solver', optNum=1, pipeline='file', encoderName='sugar'):
+        if pipeline not in ('file', 'memory'):
+            raise Exception(f'Invalid pipeline {pipeline}')
+        if encoderName not in ('sugar', 'native'):
+            raise Exception(f'Invalid encoder {encoderName}')
         self.solverName = solverName
         self.optNum = optNum
-        self.tmpNum = randint(10**9, 10**10-1)
-        self.satFileName = f'{tmpDir}/sugar{self.tmpNum}.cnf'
-        self.mapFileName = f'{tmpDir}/sugar{self.tmpNum}.map'
-        self.outFileName = f'{tmpDir}/sugar{self.tmpNum}.out'
-        # self.logFileName = f'{tmpDir}/sugar{self.tmpNum}.log'
-        javaSugar.SugarMain().init()
-        self.encoder = Encoder(self.satFileName, self.mapFileName)
+        self.pipeline = pipeline
+        self.encoderName = encoderName
+        self.workDir = mkdtemp(prefix='sugar', dir=memDir if pipeline == 'memory' else tmpDir)
+        self.finalizer = weakref.finalize(self, shutil.rmtree, self.workDir, True)
+        self.satFileName = f'{self.workDir}/sugar.cnf'
+        self.mapFileName = f'{self.workDir}/sugar.map' if pipeline == 'file' else None
+        self.outFileName = f'{self.workDir}/sugar.out'
+        self.portfolio = Portfolio(solverName, self.workDir) if isinstance(solverName, (list, tuple)) else None
+        # self.logFileName = f'{self.workDir}/sugar.log'
+        self.csp = None
+        self.renewSugar()
         self.stats = dict()
     
+    def close(self):
+        self.session.close()
+        self.finalizer()
+    
     def renewSugar(self):
-        javaSugar.SugarMain().init()
-        self.encoder = Encoder(self.satFileName, self.mapFileName)
+        if self.encoderName == 'native':
+            # the encoder is chosen by encode
+            self.encoder = None
+        else:
+            self.newSugarEncoder()
+        self.session = Sat4jSession(self.encoder)
+
+    def newSugarEncoder(self):
+        startJVM()
+        with sugarLock:
+            javaSugar.SugarMain().init()
+            self.encoder = Encoder(self.satFileName, self.mapFileName)
     
     def encode(self, csp):
-        return self.encoder.encode(csp)
+        self.csp = csp
+        self.session.close()
+        if self.encoderName == 'native':
+            try:
+                encoder = NativeEncoder(self.satFileName)
+                res = encoder.encode(csp)
+                self.encoder = encoder
+                self.session = Sat4jSession(encoder)
+                return res
+            except UnsupportedConstraint:
+                self.newSugarEncoder()
+                self.session = Sat4jSession(self.encoder)
+        with sugarLock:
+            return self.encoder.encode(csp)
     
     def encodeDelta(self, csp):
-        return self.encoder.encodeDelta(csp)
+        self.csp = csp
+        self.cancel()
+        if isinstance(self.encoder, NativeEncoder):
+            try:
+                return self.encoder.encodeDelta(csp)
+            except UnsupportedConstraint:
+                self.cancel()
+                if not self.encodeCommittedBySugar(csp):
+                    # the committed CSP is unsatisfiable, and so is the delta
+                    v = self.encoder.newSatVariable()
+                    self.encoder.addClause([v])
+                    self.encoder.addClause([-v])
+                    return
+        with sugarLock:
+            return self.encoder.encodeDelta(csp)
+
+    def encodeCommittedBySugar(self, csp):
+        """
+        Encode the committed part of csp by Sugar instead of NativeEncoder, for a delta NativeEncoder does not support
+        Return False if Sugar finds it unsatisfiable (NativeEncoder is then kept)
+        """
+        committed = CSP(csp.variables[:csp.variablesSizeCommit], csp.bools[:csp.boolsSizeCommit], csp.dom,
+                        csp.constraints[:csp.constraintsSizeCommit], csp.objective, csp.target)
+        native, session = self.encoder, self.session
+        session.close()
+        self.newSugarEncoder()
+        self.session = Sat4jSession(self.encoder)
+        with sugarLock:
+            if self.encoder.encode(committed):
+                self.commit()
+                return True
+        self.encoder, self.session = native, session
+        return False
 
-    def satSolve(self):
-        self.stats['variables'] = self.encoder.encoder.getSatVariablesCount()
-        self.stats['clauses'] = self.encoder.encoder.getSatClausesCount()
-        self.stats['size'] = self.encoder.encoder.getSatFileSize()
+    def satSolve(self, timeout=None, commit=True):
+        """
+        timeout : wall-clock seconds for the SAT backend (TimeoutError is raised when it expires)
+        commit : whether the clauses encoded since the last commit are kept afterwards
+        """
+        self.stats['variables'] = self.encoder.satVariablesCount()
+        self.stats['clauses'] = self.encoder.satClausesCount()
+        self.stats['size'] = self.encoder.satFileSize()
         if self.solverName == 'sat4j':
-            from org.sat4j.minisat import SolverFactory
-            from org.sat4j.reader import DimacsReader
-            from org.sat4j.specs import ContradictionException
-            sat4jSolver = SolverFactory.newDefault()
-            reader = DimacsReader(sat4jSolver)
-            writer = open(self.outFileName, 'w')
-            try:
-                problem = reader.parseInstance(self.satFileName)
-                if problem.isSatisfiable():
-                    writer.write('SAT\n')
-                    model = problem.model()
-                    sb = ''
-                    for i in range(model.length):
-                        sb += str(model[i]) + ' '
-                    sb += '0\n'
-                    writer.write(sb)
-                else:
-                    writer.write('UNSAT\n')
-            except ContradictionException:
-                writer.write('UNSAT\n')
-            writer.close()
-            sat4jSolver.reset()
+            model = self.session.solve(timeout=timeout)
+            if commit:
+                self.commit()
+            return self.encoder.decodeModel(model, self.csp)
+        elif self.portfolio:
+            model = self.portfolio.solve(self.satFileName, timeout)
+            self.stats['winner'] = self.portfolio.winner
+            if commit:
+                self.commit()
+            return self.encoder.decodeModel(model, self.csp)
+        elif self.pipeline == 'memory' and self.optNum == 1:
+            res = self.run([self.solverName, self.satFileName], timeout)
+            if commit:
+                self.commit()
+            return self.encoder.decodeModel(parseSatOutput(res.stdout.decode()), self.csp)
         elif self.optNum == 1:
-            res = subprocess.run([self.solverName, self.satFileName], stdout=subprocess.PIPE)
+            res = self.run([self.solverName, self.satFileName], timeout)
             f = open(self.outFileName, 'wb')
             f.write(res.stdout)
             f.close()
         elif self.optNum == 2:
-            subprocess.run([self.solverName, self.satFileName, self.outFileName])
+            self.run([self.solverName, self.satFileName, self.outFileName], timeout)
         else:
             raise('Invalid sat solver information are set')
-        self.encoder.commit()
-        return self.encoder.decode(self.outFileName, csp)
+        if commit:
+            self.commit()
+        return self.encoder.decode(self.outFileName, self.csp)
+
+    def run(self, args, timeout=None):
+        try:
+            return subprocess.run(args, stdout=subprocess.PIPE, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise TimeoutError(f'{self.solverName} timeout')
     
+    def block(self, sol, xs, ps):
+        """
+        Add the clause excluding the values of xs and ps in sol to the CNF
+        Return False if a variable has no SAT encoding
+        """
+        clause = self.encoder.blockingClause(sol, xs, ps)
+        if clause is None:
+            return False
+        self.encoder.addClause(clause)
+        return True
+
+    def canAssumeBounds(self, x):
+        return self.solverName == 'sat4j' and self.encoder.hasVariable(x)
+
+    def satSolveBounds(self, x, lo, hi, timeout=None):
+        """
+        Solve under the assumptions lo <= x <= hi given by the order encoding literals of x
+        (no constraint is added, so nothing has to be cancelled afterwards)
+        """
+        assumptions = self.encoder.boundLiterals(x, lo, hi)
+        if assumptions is None:
+            return None
+        model = self.session.solve(assumptions, timeout)
+        return self.encoder.decodeModel(model, self.csp)
+
     def commit(self):
         self.encoder.commit()
+        self.session.commit()
     
     def cancel(self):
         self.encoder.cancel()
-    
-    def dumpCsp(self, csp, fileName):
-        translator = Translator()
-        expressions = translator.toSugar(csp)
-        f = open(fileName, 'w')
-        for expression in expressions:
-            f.write(str(expression) + '\n')
-        f.close()
+        self.session.cancel()
     
     def dumpCnf(self, csp, fileName):
         self.encode(csp)
@@ -106,119 +263,463 @@ class Solver():
 
     def dump(self, csp, fileName, format='csp'):
         if format == 'csp':
-            self.dumpCsp(csp, fileName)
+            dumpCsp(csp, fileName)
         elif format == 'cnf':
             self.dumpCnf(csp, fileName)
 
+def dumpCsp(csp, fileName):
+    """
+    Write csp in the syntax of Sugar to fileName (written in Python, without the JVM)
+    """
+    with open(fileName, 'w') as f:
+        f.write(''.join(TextTranslator(java=False).toSugarCspText(csp)))
+
+def parseSatOutput(text):
+    """
+    Parse the output of a SAT solver (SAT competition or minisat format)
+    Return the list of literals of the model, or None if it is not satisfiable
+    """
+    result = None
+    lits = []
+    for line in text.splitlines():
+        tokens = line.split()
+        if len(tokens) == 0 or tokens[0] == 'c':
+            continue
+        if tokens[0] == 's':
+            tokens = tokens[1:]
+        elif tokens[0] == 'v':
+            lits += [int(t) for t in tokens[1:]]
+            continue
+        if result is None and len(tokens) > 0 and not tokens[0].lstrip('-').isdigit():
+            result = tokens[0]
+        else:
+            lits += [int(t) for t in tokens]
+    if result is None:
+        raise Exception('Unknown output result of SAT solver')
+    if result.startswith('SAT') or result.startswith('OPT'):
+        return lits
+    elif result.startswith('UNSAT'):
+        return None
+    raise Exception('Unknown output result ' + result)
+
+def javaCommand():
+    startJVM()
+    return os.path.join(str(java.lang.System.getProperty('java.home')), 'bin', 'java')
+
+# sat4j configurations (names of SolverFactory) and SAT solver commands (with optNum) used by defaultPortfolio
+sat4jConfigs = ['Default', 'Glucose21', 'MiniLearningHeapRsatExpSimp', 'MiniSATHeapExpSimp', 'DefaultAutoErasePhaseSaving']
+knownSolvers = [('kissat', 1), ('cadical', 1), ('lingeling', 1), ('clasp', 1), ('glucose', 2), ('minisat', 2)]
+
+def defaultPortfolio(size=None):
+    """
+    SAT solvers found on PATH followed by sat4j configurations (at most size members, the number of cpus by default)
+    """
+    members = [(name, optNum) for (name, optNum) in knownSolvers if shutil.which(name)]
+    members += ['sat4j:' + config for config in sat4jConfigs]
+    return members[:size or os.cpu_count() or 1]
+
+class Portfolio():
+    """
+    Race SAT solvers on the same CNF file, each in its own process
+    The first answer (SAT or UNSAT) is returned and the other processes are killed
+    members : solver commands, (command, optNum) pairs, or 'sat4j:<name>' for a sat4j configuration
+    """
+    def __init__(self, members, workDir):
+        if len(members) == 0:
+            raise Exception('Empty portfolio')
+        self.members = [m if isinstance(m, tuple) else (m, 1) for m in members]
+        self.workDir = workDir
+        self.winner = None
+
+    def command(self, i, satFileName):
+        name, optNum = self.members[i]
+        if name == 'sat4j' or name.startswith('sat4j:'):
+            return [javaCommand(), '-jar', sat4jPath, name[6:] or 'Default', satFileName], None
+        elif optNum == 2:
+            outFileName = f'{self.workDir}/portfolio{i}.out'
+            return [name, satFileName, outFileName], outFileName
+        return [name, satFileName], None
+
+    def solve(self, satFileName, timeout=None):
+        """
+        Return the model of the winner as a list of literals, or None if it is not satisfiable
+        """
+        self.winner = None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        results = queue.Queue()
+        procs = []
+        try:
+            for i in range(len(self.members)):
+                args, outFileName = self.command(i, satFileName)
+                proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                procs.append(proc)
+                threading.Thread(target=self.wait, args=(i, proc, outFileName, results), daemon=True).start()
+            for _ in procs:
+                try:
+                    i, model = results.get(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise TimeoutError('portfolio timeout')
+                if model is not False:
+                    self.winner = self.members[i][0]
+                    return model
+            raise Exception('No SAT solver of the portfolio answered')
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+            for proc in procs:
+                proc.wait()
+
+    def wait(self, i, proc, outFileName, results):
+        out = proc.communicate()[0]
+        try:
+            if outFileName:
+                with open(outFileName) as f:
+                    out = f.read().encode()
+            results.put((i, parseSatOutput(out.decode())))
+        except Exception:
+            results.put((i, False))
+
+def modelToBitSet(model):
+    """
+    Build java.util.BitSet of the true SAT variables in model
+    model is a Java int[] (read through its buffer without copying) or a list of literals
+    """
+    if isinstance(model, JArray):
+        if np is not None:
+            lits = np.asarray(model)
+        else:
+            lits = memoryview(model).cast('B').cast('i')
+    else:
+        lits = model
+    if np is not None:
+        lits = np.asarray(lits, dtype=np.int64)
+        pos = lits[lits > 0]
+        if len(pos) == 0:
+            return java.util.BitSet()
+        bits = np.zeros(pos.max() + 1, dtype=np.uint8)
+        bits[pos] = 1
+        data = np.packbits(bits, bitorder='little').tobytes()
+    else:
+        buf = bytearray(max([abs(lit) for lit in lits], default=0) // 8 + 1)
+        for lit in lits:
+            if lit > 0:
+                buf[lit >> 3] |= 1 << (lit & 7)
+        data = bytes(buf)
+    return java.util.BitSet.valueOf(JArray(JByte)(data))
+
+class Sat4jSession:
+    """
+    sat4j solver kept alive across satSolve calls
+    Clauses of the encoded CNF are loaded once and only the clauses appended
+    by Encoder.encodeDelta are fed afterwards, so learned clauses survive.
+    Uncommitted clauses are guarded by a selector variable s (C or -s) and
+    solved under the assumption s. commit makes them permanent by adding s,
+    cancel disables them by adding -s.
+    """
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.solver = None
+        self.unsat = False
+        self.fedSize = 0
+        self.permanentSize = 0
+        self.selector = None
+        self.guarded = False
+    
+    def close(self):
+        self.solver = None
+        self.unsat = False
+        self.selector = None
+        self.guarded = False
+    
+    def load(self):
+        from org.sat4j.minisat import SolverFactory
+        from org.sat4j.reader import DimacsReader
+        from org.sat4j.specs import ContradictionException
+        self.close()
+        self.solver = SolverFactory.newDefault()
+        self.timeoutMs = self.solver.getTimeoutMs()
+        try:
+            DimacsReader(self.solver).parseInstance(self.encoder.satFileName)
+        except ContradictionException:
+            self.unsat = True
+        self.fedSize = self.permanentSize = self.encoder.satFileSize()
+    
+    def addClause(self, lits):
+        from org.sat4j.core import VecInt
+        from org.sat4j.specs import ContradictionException
+        try:
+            self.solver.addClause(VecInt(JArray(JInt)(lits)))
+        except ContradictionException:
+            self.unsat = True
+    
+    def sync(self):
+        size = self.encoder.satFileSize()
+        if size <= self.fedSize:
+            return
+        if self.selector is None:
+            self.load()
+            return
+        self.solver.newVar(self.encoder.satVariablesCount())
+        with open(self.encoder.satFileName, 'rb') as f:
+            f.seek(self.fedSize)
+            data = f.read(size - self.fedSize)
+        lits = []
+        for line in data.splitlines():
+            if line[:1] in (b'c', b'p'):
+                continue
+            for lit in map(int, line.split()):
+                if lit == 0:
+                    lits.append(-self.selector)
+                    self.addClause(lits)
+                    lits = []
+                else:
+                    lits.append(lit)
+        self.fedSize = size
+        self.guarded = True
+
+    def solve(self, assumptions=[], timeout=None):
+        startJVM()
+        from org.sat4j.core import VecInt
+        from org.sat4j.specs import TimeoutException
+        if self.solver is None:
+            self.load()
+        if self.unsat:
+            return None
+        self.sync()
+        if self.unsat:
+            return None
+        if self.guarded:
+            assumptions = assumptions + [self.selector]
+        if timeout is None:
+            self.solver.setTimeoutMs(self.timeoutMs)
+        elif timeout > 0:
+            self.solver.setTimeoutMs(max(1, int(timeout * 1000)))
+        else:
+            raise TimeoutError('sat4j timeout')
+        try:
+            if len(assumptions) > 0:
+                sat = self.solver.isSatisfiable(VecInt(JArray(JInt)(assumptions)))
+            else:
+                sat = self.solver.isSatisfiable()
+        except TimeoutException:
+            raise TimeoutError('sat4j timeout')
+        if sat:
+            return self.solver.model()
+        return None
+    
+    def commit(self):
+        if self.solver is None:
+            return
+        if self.encoder.isUnsatisfiable():
+            self.close()
+            return
+        if self.guarded:
+            self.addClause([self.selector])
+            self.selector = None
+            self.guarded = False
+        self.permanentSize = self.fedSize
+        if self.selector is None:
+            self.selector = self.encoder.newSatVariable()
+    
+    def cancel(self):
+        if self.solver is None:
+            return
+        if self.encoder.satFileSize() < self.permanentSize:
+            self.close()
+            return
+        if self.guarded:
+            self.addClause([-self.selector])
+            self.selector = self.encoder.newSatVariable()
+            self.guarded = False
+        self.fedSize = self.permanentSize
+
+# Sugar operators of the nodes translated by applying them to the translated children
+sugarOperators = {
+    Abs: 'ABS', Neg: 'NEG', Add: 'ADD', Sum: 'ADD', Sub: 'SUB', Mul: 'MUL', Div: 'DIV', Mod: 'MOD',
+    Max: 'MAX', Min: 'MIN', If: 'IF',
+    Not: 'NOT', And: 'AND', Or: 'OR', Imp: 'IMP', Xor: 'XOR', Iff: 'IFF',
+    Eq: 'EQ', Ne: 'NE', Le: 'LE', Lt: 'LT', Ge: 'GE', Gt: 'GT', Alldifferent: 'ALLDIFFERENT'
+}
+# n-ary nodes whose Sugar operators are binary
+sugarBinaryTypes = {Mul, Max, Min}
+# characters of names escaped as $xx in Sugar
+sugarNameEscape = re.compile('[^A-Za-z0-9_+\\-*/%=<>!&|\u0080-\U0010ffff]')
+# names read by Sugar as integers or keywords, their first character is escaped
+sugarInteger = re.compile('[-+]?[0-9]+')
+sugarKeywords = frozenset([
+    'nil', 'true', 'false', 'int', 'bool', 'dint', 'dbool', 'domain', 'predicate', 'relation', 'supports', 'conflicts',
+    'objective', 'minimize', 'maximize', 'label', 'groups', 'ignore', 'hold', 'weighted',
+    'not', 'and', 'or', 'imp', 'xor', 'iff', 'eq', 'ne', 'le', 'lt', 'ge', 'gt',
+    'neg', 'abs', 'add', 'sub', 'mul', 'div', 'mod', 'pow', 'min', 'max', 'if',
+    'alldifferent', 'weightedsum', 'cumulative', 'element', 'disjunctive', 'lex_less', 'lex_lesseq',
+    'nvalue', 'count', 'global_cardinality', 'global_cardinality_with_costs'])
+
 class Translator:
     def __init__(self):
-        self.sugarVarNameMap = dict()
-        self.sugarBoolNameMap = dict()
+        startJVM()
+        self.operators = {t: getattr(SugarExpr, op) for (t, op) in sugarOperators.items()}
+        # Java atoms by Sugar name or value
+        self.sugarAtomMap = dict()
+        # translated nodes by id (the node is kept to pin its id), so shared nodes are translated once;
+        # it is cleared after each translation (the later deltas only refer to the names and relations)
+        self.sugarExprMap = dict()
+        # translation of the global constraints
+        self.globals = {Table: self.toSugarTable, NegativeTable: self.toSugarTable, Cumulative: self.toSugarCumulative, Disjunctive: self.toSugarDisjunctive, Element: self.toSugarElement}
+        self.initNames()
+
+    def initNames(self):
+        self.sugarNameMap = dict()
+        # Sugar names of the relations by (support, arity, tuples), and their definitions not given to Sugar yet
+        self.relations = dict()
+        self.definitions = []
     
     def createSugarExpr(self, x, *xs):
-        lst = java.util.ArrayList()
-        for xx in xs:
-            lst.add(xx)
-        return SugarExpr.create(x, lst)
+        if 0 < len(xs) <= 4:
+            return SugarExpr.create(x, *xs)
+        return SugarExpr.create(x, JArray(SugarExpr)(xs))
+
+    def createSugarTree(self, op, xs):
+        '''
+        balanced tree of the binary operator op over xs
+        '''
+        while len(xs) > 1:
+            ys = [SugarExpr.create(op, xs[i], xs[i + 1]) for i in range(0, len(xs) - 1, 2)]
+            if len(xs) % 2:
+                ys.append(xs[-1])
+            xs = ys
+        return xs[0]
     
     def toSugarName(self, arg):
-        if isinstance(arg, Var):
-            sugarName = self.sugarVarNameMap.get(arg)
-            if not sugarName:
-                sugarName = self.toSugarName(arg.name)
-                self.sugarVarNameMap[arg] = sugarName
-            return sugarName
-        elif isinstance(arg, BOOL):
-            sugarName = self.sugarBoolNameMap.get(arg)
-            if not sugarName:
-                sugarName = self.toSugarName(arg.name)
-                self.sugarBoolNameMap[arg] = sugarName
-            return sugarName
-        elif isinstance(arg, str):
-            res = ''
-            for c in arg:
-                if 'A' <= c <= 'Z' or 'a' <= c <= 'z' or '0' <= c <= '9' or c in '_+-*/%=<>!&|':
-                    res += c
-                elif 0x80 <= ord(c) <= 0x10ffff:
-                    res += c
-                elif ord(c) < 0x100:
-                    res += '${:02x}'.format(ord(c))
-                else:
-                    res += '${04x}'.format(ord(c))
-            return res
+        name = arg if isinstance(arg, str) else arg.name
+        sugarName = self.sugarNameMap.get(name)
+        if sugarName is None:
+            sugarName = sugarNameEscape.sub(lambda m: '${:02x}'.format(ord(m.group())), name)
+            if sugarInteger.fullmatch(sugarName) or sugarName in sugarKeywords:
+                sugarName = '${:02x}'.format(ord(sugarName[0])) + sugarName[1:]
+            self.sugarNameMap[name] = sugarName
+        return sugarName
 
     def toSugarTerm(self, x):
-        if isinstance(x, NIL):
-            return SugarExpr.NIL
-        elif isinstance(x, Num):
-            return SugarExpr.create(x.v)
-        elif isinstance(x, Var):
-            return SugarExpr.create(self.toSugarName(x.name))
-        elif isinstance(x, Abs):
-            return self.createSugarExpr(SugarExpr.ABS, self.toSugarTerm(x.x0))
-        elif isinstance(x, Neg):
-            return self.createSugarExpr(SugarExpr.NEG, self.toSugarTerm(x.x0))
-        elif isinstance(x, Add):
-            return self.createSugarExpr(SugarExpr.ADD, *map(lambda _: self.toSugarTerm(_), x.xs))
-        elif isinstance(x, Sum):
-            return self.createSugarExpr(SugarExpr.ADD, *map(lambda _: self.toSugarTerm(_), x.xs))
-        elif isinstance(x, Sub):
-            return self.createSugarExpr(SugarExpr.SUB, *map(lambda _: self.toSugarTerm(_), x.xs))
-        elif isinstance(x, Mul):
-            return functools.reduce(lambda x0, x1: self.createSugarExpr(SugarExpr.MUL, self.toSugarTerm(x0), self.toSugarTerm(x1)), x.xs)
-        elif isinstance(x, Div):
-            return self.createSugarExpr(SugarExpr.DIV, self.toSugarTerm(x.x0), self.toSugarTerm(x.x1))
-        elif isinstance(x, Mod):
-            return self.createSugarExpr(SugarExpr.MOD, self.toSugarTerm(x.x0), self.toSugarTerm(x.x1))
-        elif isinstance(x, Max):
-            return functools.reduce(lambda x0, x1: self.createSugarExpr(SugarExpr.MAX, self.toSugarTerm(x0), self.toSugarTerm(x1)), x.xs)
-        elif isinstance(x, Min):
-            return functools.reduce(lambda x0, x1: self.createSugarExpr(SugarExpr.MIN, self.toSugarTerm(x0), self.toSugarTerm(x1)), x.xs)
-        elif isinstance(x, If):
-            return self.createSugarExpr(SugarExpr.IF, self.toSugarConstraint(x.c), self.toSugarTerm(x.x0), self.toSugarTerm(x.x1))
+        return self.toSugarExpr(x)
 
     def toSugarConstraint(self, c):
-        if isinstance(c, FALSE):
-            return SugarExpr.FALSE
-        elif isinstance(c, TRUE):
+        return self.toSugarExpr(c)
+
+    def toSugarExpr(self, x):
+        hit = self.sugarExprMap.get(id(x))
+        if hit is not None:
+            return hit[1]
+        op = self.operators.get(type(x))
+        if isinstance(x, LinearExpr):
+            e = self.toSugarLinear(x)
+        elif type(x) in self.globals:
+            e = self.globals[type(x)](x)
+        elif op is None:
+            e = self.toSugarAtom(x)
+        elif type(x) in sugarBinaryTypes:
+            e = self.createSugarTree(op, [self.toSugarExpr(y) for y in x.children()])
+        else:
+            e = self.createSugarExpr(op, *[self.toSugarExpr(y) for y in x.children()])
+        self.sugarExprMap[id(x)] = (x, e)
+        return e
+
+    def toSugarLinear(self, x):
+        '''
+        one flat (add (mul a1 x1) ... c) of the merged terms of x
+        '''
+        xs, coefs = x.terms()
+        ys = []
+        for (y, a) in zip(xs, coefs):
+            e = self.toSugarAtom(y)
+            ys.append(e if a == 1 else SugarExpr.create(self.operators[Mul], self.toSugarNum(a), e))
+        if x.const != 0 or len(ys) == 0:
+            ys.append(self.toSugarNum(x.const))
+        if len(ys) == 1:
+            return ys[0]
+        return self.createSugarExpr(self.operators[Add], *ys)
+
+    def toSugarNum(self, v):
+        atom = self.sugarAtomMap.get(v)
+        if atom is None:
+            atom = SugarExpr.create(v)
+            self.sugarAtomMap[v] = atom
+        return atom
+
+    def toSugarAtom(self, x):
+        if isinstance(x, Num):
+            return self.toSugarNum(x.v)
+        elif isinstance(x, (Var, BOOL)):
+            key = self.toSugarName(x)
+        elif isinstance(x, NIL):
+            return SugarExpr.NIL
+        elif isinstance(x, TRUE):
             return SugarExpr.TRUE
-        elif isinstance(c, BOOL):
-            return SugarExpr.create(self.toSugarName(c.name))
-        elif isinstance(c, Not):
-            return self.createSugarExpr(SugarExpr.NOT, self.toSugarConstraint(c.c0))
-        elif isinstance(c, And):
-            return self.createSugarExpr(SugarExpr.AND, *map(lambda _: self.toSugarConstraint(_), c.cs))
-        elif isinstance(c, Or):
-            return self.createSugarExpr(SugarExpr.OR, *map(lambda _: self.toSugarConstraint(_), c.cs))
-        elif isinstance(c, Imp):
-            return self.createSugarExpr(SugarExpr.IMP, self.toSugarConstraint(c.c0), self.toSugarConstraint(c.c1))
-        elif isinstance(c, Xor):
-            return self.createSugarExpr(SugarExpr.XOR, self.toSugarConstraint(c.c0), self.toSugarConstraint(c.c1))
-        elif isinstance(c, Iff):
-            return self.createSugarExpr(SugarExpr.IFF, self.toSugarConstraint(c.c0), self.toSugarConstraint(c.c1))
-        elif isinstance(c, Eq):
-            return self.createSugarExpr(SugarExpr.EQ, self.toSugarTerm(c.x0), self.toSugarTerm(c.x1))
-        elif isinstance(c, Ne):
-            return self.createSugarExpr(SugarExpr.NE, self.toSugarTerm(c.x0), self.toSugarTerm(c.x1))
-        elif isinstance(c, Le):
-            return self.createSugarExpr(SugarExpr.LE, self.toSugarTerm(c.x0), self.toSugarTerm(c.x1))
-        elif isinstance(c, Lt):
-            return self.createSugarExpr(SugarExpr.LT, self.toSugarTerm(c.x0), self.toSugarTerm(c.x1))
-        elif isinstance(c, Ge):
-            return self.createSugarExpr(SugarExpr.GE, self.toSugarTerm(c.x0), self.toSugarTerm(c.x1))
-        elif isinstance(c, Gt):
-            return self.createSugarExpr(SugarExpr.GT, self.toSugarTerm(c.x0), self.toSugarTerm(c.x1))
-        elif isinstance(c, Alldifferent):
-            return self.createSugarExpr(SugarExpr.ALLDIFFERENT, *map(lambda _: self.toSugarTerm(_), c.xs))
-        # ## unimplement
-        # ## branch for global constraints
-        # elif isinstance(c, ):
-        #     return 
-
-    # ## unimplement
-    # ## method for global constraints
-    # def toSugarAny(self, a):
-    #     pass
+        elif isinstance(x, FALSE):
+            return SugarExpr.FALSE
+        else:
+            raise Exception('cannot translate ' + str(x) + ' to Sugar')
+        return self.toSugarSymbol(key)
+
+    def toSugarSymbol(self, key):
+        atom = self.sugarAtomMap.get(key)
+        if atom is None:
+            atom = SugarExpr.create(key)
+            self.sugarAtomMap[key] = atom
+        return atom
+
+    def relationName(self, x):
+        '''
+        Sugar name of the relation of the Table x, whose definition is added to the pending definitions when it is new
+        (Sugar encodes a relation compactly by boxes of its conflicting tuples)
+        '''
+        key = (x.support, len(x.xs), x.tuples.tobytes())
+        name = self.relations.get(key)
+        if name is None:
+            # '$' followed by a non hexadecimal digit does not appear in escaped names
+            name = '$r' + str(len(self.relations))
+            self.relations[key] = name
+            kind = 'supports' if x.support else 'conflicts'
+            self.definitions.append(f'(relation {name} {len(x.xs)} ({kind} ' + x.rowsText().replace(',', ' ') + '))\n')
+        return name
+
+    def toSugarTable(self, x):
+        # the arguments of a relation are variables
+        if not all([isinstance(y, Var) for y in x.xs]):
+            return self.toSugarExpr(x.decomposition())
+        return self.createSugarExpr(self.toSugarSymbol(self.relationName(x)), *[self.toSugarTerm(y) for y in x.xs])
+
+    def createSugarList(self, xs):
+        return SugarExpr.create(JArray(SugarExpr)(xs))
+
+    def toSugarCumulative(self, x):
+        # (cumulative ((start duration nil demand) ...) capacity)
+        tasks = [self.createSugarList([self.toSugarTerm(s), self.toSugarTerm(d), SugarExpr.NIL, self.toSugarTerm(h)]) for (s, d, h) in zip(x.starts, x.durations, x.demands)]
+        return SugarExpr.create(SugarExpr.CUMULATIVE, self.createSugarList(tasks), self.toSugarTerm(x.capacity))
+
+    def toSugarDisjunctive(self, x):
+        # (disjunctive ((start duration) ...))
+        tasks = [self.createSugarList([self.toSugarTerm(s), self.toSugarTerm(d)]) for (s, d) in zip(x.starts, x.durations)]
+        return SugarExpr.create(SugarExpr.DISJUNCTIVE, self.createSugarList(tasks))
+
+    def toSugarElement(self, x):
+        # a relation of the pairs (index, item) for an array of constants, otherwise (element index (array) item) where the index starts from 1
+        if x.isConstant():
+            return self.toSugarTable(x.table())
+        index = SugarExpr.create(SugarExpr.ADD, self.toSugarTerm(x.index), self.toSugarNum(1))
+        return SugarExpr.create(SugarExpr.ELEMENT, index, self.createSugarList([self.toSugarTerm(a) for a in x.array]), self.toSugarTerm(x.item))
+
+    def toSugarDefinitions(self, expressions):
+        '''
+        Add the pending relation definitions to expressions (parsed from their text in one call)
+        '''
+        if self.definitions:
+            expressions.addAll(self.parseSugarText(self.definitions))
+            self.definitions = []
+
+    def parseSugarText(self, parts):
+        reader = java.io.BufferedReader(java.io.StringReader(''.join(parts)))
+        return javaSugar.expression.Parser(reader).parse()
 
     def toSugarInt(self, x, d):
         if isinstance(d, IntervalDomain):
@@ -226,9 +727,8 @@ class Translator:
             hi = SugarExpr.create(d.hi)
             return SugarExpr.create(SugarExpr.INT_DEFINITION, self.toSugarTerm(x), lo, hi)
         elif isinstance(d, SetDomain):
-            dom = sorted(d.values)
-            xs = [self.toSugarTerm(x), SugarExpr.create(dom)]
-            return SugarExpr.create(SugarExpr.INT_DEFINITION, xs)
+            dom = self.createSugarExpr(*[SugarExpr.create(v) for v in sorted(d.values)])
+            return SugarExpr.create(SugarExpr.INT_DEFINITION, self.toSugarTerm(x), dom)
 
     def toSugarBool(self, p):
         return SugarExpr.create(SugarExpr.BOOL_DEFINITION, self.toSugarConstraint(p))
@@ -242,8 +742,11 @@ class Translator:
         if csp.objective:
             x = self.createSugarExpr(SugarExpr.OBJECTIVE_DEFINITION, SugarExpr.MINIMIZE if csp.isMinimize() else SugarExpr.MAXIMIZE, self.toSugarTerm(csp.objective))
             expressions.add(x)
-        for c in csp.constraints:
-            expressions.add(self.toSugarConstraint(c))
+        constraints = [self.toSugarConstraint(c) for c in csp.constraints]
+        self.sugarExprMap.clear()
+        self.toSugarDefinitions(expressions)
+        for c in constraints:
+            expressions.add(c)
         return expressions
 
     def toSugarDelta(self, csp):
@@ -252,18 +755,158 @@ class Translator:
             expressions.add(self.toSugarInt(v, csp.dom[v]))
         for p in csp.boolsDelta():
             expressions.add(self.toSugarBool(p))
-        for c in csp.constraintsDelta():
-            expressions.add(self.toSugarConstraint(c))
+        constraints = [self.toSugarConstraint(c) for c in csp.constraintsDelta()]
+        self.sugarExprMap.clear()
+        self.toSugarDefinitions(expressions)
+        for c in constraints:
+            expressions.add(c)
         return expressions
 
+class TextTranslator(Translator):
+    """
+    Translator writing the CSP in the S-expression syntax of Sugar and parsing it with one call to Sugar's Parser,
+    instead of building the Sugar expressions node by node over JPype (the expressions are the same)
+    """
+    def __init__(self, java=True):
+        '''
+        java : whether the text is parsed by Sugar (False to only write it, without the JVM)
+        '''
+        if java:
+            super().__init__()
+        else:
+            self.initNames()
+        self.operatorNames = {t: op.lower() for (t, op) in sugarOperators.items()}
+        self.textGlobals = {Table: self.writeSugarTable, NegativeTable: self.writeSugarTable, Cumulative: self.writeSugarCumulative, Disjunctive: self.writeSugarDisjunctive, Element: self.writeSugarElement}
+
+    def toSugarText(self, x):
+        parts = []
+        self.writeSugarText(x, parts)
+        return ''.join(parts)
+
+    def writeSugarText(self, x, parts):
+        op = self.operatorNames.get(type(x))
+        if isinstance(x, LinearExpr):
+            self.writeSugarLinear(x, parts)
+        elif type(x) in self.textGlobals:
+            self.textGlobals[type(x)](x, parts)
+        elif op is None:
+            parts.append(self.toSugarAtomText(x))
+        elif type(x) in sugarBinaryTypes:
+            # same balanced tree as createSugarTree
+            xs = [self.toSugarText(y) for y in x.children()]
+            while len(xs) > 1:
+                ys = ['(' + op + ' ' + xs[i] + ' ' + xs[i + 1] + ')' for i in range(0, len(xs) - 1, 2)]
+                if len(xs) % 2:
+                    ys.append(xs[-1])
+                xs = ys
+            parts.append(xs[0])
+        else:
+            parts.append('(' + op)
+            for y in x.children():
+                parts.append(' ')
+                self.writeSugarText(y, parts)
+            parts.append(')')
+
+    def writeSugarLinear(self, x, parts):
+        # same expression as toSugarLinear
+        xs, coefs = x.terms()
+        ys = [self.toSugarName(y) if a == 1 else f'(mul {a} {self.toSugarName(y)})' for (y, a) in zip(xs, coefs)]
+        if x.const != 0 or len(ys) == 0:
+            ys.append(str(x.const))
+        parts.append(ys[0] if len(ys) == 1 else '(add ' + ' '.join(ys) + ')')
+
+    def writeSugarTable(self, x, parts):
+        if not all([isinstance(y, Var) for y in x.xs]):
+            self.writeSugarText(x.decomposition(), parts)
+            return
+        parts.append('(' + self.relationName(x))
+        for y in x.xs:
+            parts.append(' ')
+            self.writeSugarText(y, parts)
+        parts.append(')')
+
+    def writeSugarCumulative(self, x, parts):
+        # same expression as toSugarCumulative
+        tasks = ['(' + self.toSugarText(s) + ' ' + self.toSugarText(d) + ' nil ' + self.toSugarText(h) + ')' for (s, d, h) in zip(x.starts, x.durations, x.demands)]
+        parts.append('(cumulative (' + ' '.join(tasks) + ') ' + self.toSugarText(x.capacity) + ')')
+
+    def writeSugarDisjunctive(self, x, parts):
+        tasks = ['(' + self.toSugarText(s) + ' ' + self.toSugarText(d) + ')' for (s, d) in zip(x.starts, x.durations)]
+        parts.append('(disjunctive (' + ' '.join(tasks) + '))')
+
+    def writeSugarElement(self, x, parts):
+        # same expression as toSugarElement
+        if x.isConstant():
+            self.writeSugarTable(x.table(), parts)
+        else:
+            parts.append('(element (add ' + self.toSugarText(x.index) + ' 1) (' + ' '.join([self.toSugarText(a) for a in x.array]) + ') ' + self.toSugarText(x.item) + ')')
+
+    def writeSugarConstraints(self, cs, parts):
+        # the relations used by the constraints are defined before them
+        constraints = []
+        for c in cs:
+            self.writeSugarText(c, constraints)
+            constraints.append('\n')
+        parts += self.definitions
+        self.definitions = []
+        parts += constraints
+
+    def toSugarAtomText(self, x):
+        if isinstance(x, Num):
+            return str(x.v)
+        elif isinstance(x, (Var, BOOL)):
+            return self.toSugarName(x)
+        elif isinstance(x, NIL):
+            return 'nil'
+        elif isinstance(x, TRUE):
+            return 'true'
+        elif isinstance(x, FALSE):
+            return 'false'
+        raise Exception('cannot translate ' + str(x) + ' to Sugar')
+
+    def writeSugarInt(self, x, d, parts):
+        if isinstance(d, IntervalDomain):
+            parts.append(f'(int {self.toSugarName(x)} {d.lo} {d.hi})\n')
+        elif isinstance(d, SetDomain):
+            parts.append(f'(int {self.toSugarName(x)} (' + ' '.join([str(v) for v in sorted(d.values)]) + '))\n')
+
+    def toSugar(self, csp):
+        return self.parseSugarText(self.toSugarCspText(csp))
+
+    def toSugarCspText(self, csp):
+        '''
+        parts of the text of csp in the syntax of Sugar
+        '''
+        parts = []
+        for v in csp.variables:
+            self.writeSugarInt(v, csp.dom[v], parts)
+        for p in csp.bools:
+            parts.append(f'(bool {self.toSugarName(p)})\n')
+        if csp.objective:
+            parts.append('(objective ' + ('minimize ' if csp.isMinimize() else 'maximize '))
+            self.writeSugarText(csp.objective, parts)
+            parts.append(')\n')
+        self.writeSugarConstraints(csp.constraints, parts)
+        return parts
+
+    def toSugarDelta(self, csp):
+        parts = []
+        for v in csp.variablesDelta():
+            self.writeSugarInt(v, csp.dom[v], parts)
+        for p in csp.boolsDelta():
+            parts.append(f'(bool {self.toSugarName(p)})\n')
+        self.writeSugarConstraints(csp.constraintsDelta(), parts)
+        return self.parseSugarText(parts)
+
 class Encoder:
     def __init__(self, satFileName, mapFileName):
         self.satFileName = satFileName
         self.mapFileName = mapFileName
-        self.translator = Translator()
+        self.translator = TextTranslator() if transport == 'text' else Translator()
         self.sugarCsp = javaSugar.csp.CSP()
         self.converter = javaSugar.converter.Converter(self.sugarCsp)
         self.encoder = javaSugar.encoder.Encoder(self.sugarCsp)
+        self.problem = None
     
     def commit(self):
         self.sugarCsp.commit()
@@ -273,7 +916,8 @@ class Encoder:
     def cancel(self):
         self.sugarCsp.cancel()
         self.encoder.cancel()
-        self.encoder.outputMap(self.mapFileName)
+        if self.mapFileName:
+            self.encoder.outputMap(self.mapFileName)
     
     def encode(self, csp):
         expressions = self.translator.toSugar(csp)
@@ -287,8 +931,10 @@ class Encoder:
         else:
             simplifier = javaSugar.converter.Simplifier(self.sugarCsp)
             simplifier.simplify()
-            self.encoder.encode(self.satFileName, False)
-            self.encoder.outputMap(self.mapFileName)
+            self.problem = javaSugar.encoder.FileProblem(self.satFileName)
+            self.encoder.encode(self.problem)
+            if self.mapFileName:
+                self.encoder.outputMap(self.mapFileName)
             return True
 
     def encodeDelta(self, csp):
@@ -300,28 +946,135 @@ class Encoder:
         SugarExpr.clear()
         self.encoder.cancel()
         self.encoder.encodeDelta()
-        self.encoder.outputMap(self.mapFileName)
+        if self.mapFileName:
+            self.encoder.outputMap(self.mapFileName)
+
+    def satVariablesCount(self):
+        return self.encoder.getSatVariablesCount()
+
+    def satClausesCount(self):
+        return self.encoder.getSatClausesCount()
+
+    def satFileSize(self):
+        return self.encoder.getSatFileSize()
+
+    def isUnsatisfiable(self):
+        return self.sugarCsp.isUnsatisfiable()
+
+    def hasVariable(self, x):
+        return self.sugarVariable(x) is not None
+
+    def sugarVariable(self, x):
+        return self.sugarCsp.getIntegerVariable(self.translator.toSugarName(x))
+
+    def sugarBool(self, p):
+        return self.sugarCsp.getBooleanVariable(self.translator.toSugarName(p))
+
+    def codeLE(self, x, a):
+        """
+        SAT literal of x <= a in the order encoding
+        (Problem.TRUE_CODE or Problem.FALSE_CODE if it is decided by the domain)
+        """
+        v = self.sugarVariable(x)
+        d = v.getDomain()
+        if a < d.getLowerBound():
+            return javaSugar.encoder.Problem.FALSE_CODE
+        elif a >= d.getUpperBound():
+            return javaSugar.encoder.Problem.TRUE_CODE
+        return v.getCode() + d.sizeLE(a) - 1
+
+    def boundLiterals(self, x, lo, hi):
+        """
+        Literals for lo <= x <= hi (None if the bounds are inconsistent with the domain)
+        lo or hi can be None for a one-sided bound
+        """
+        TRUE_CODE = javaSugar.encoder.Problem.TRUE_CODE
+        FALSE_CODE = javaSugar.encoder.Problem.FALSE_CODE
+        lits = []
+        if hi is not None:
+            le = self.codeLE(x, hi)
+            if le == FALSE_CODE:
+                return None
+            elif le != TRUE_CODE:
+                lits.append(le)
+        if lo is not None:
+            lt = self.codeLE(x, lo - 1)
+            if lt == TRUE_CODE:
+                return None
+            elif lt != FALSE_CODE:
+                lits.append(-lt)
+        return lits
+
+    def blockingClause(self, sol, xs, ps):
+        """
+        Clause of the order encoding literals x <= v - 1 or x >= v + 1 for each x of xs
+        and of the negated values of ps, where v is the value in sol
+        (None if a variable has no SAT encoding)
+        """
+        TRUE_CODE = javaSugar.encoder.Problem.TRUE_CODE
+        FALSE_CODE = javaSugar.encoder.Problem.FALSE_CODE
+        clause = []
+        for x in xs:
+            if self.sugarVariable(x) is None:
+                return None
+            v = sol.getValue(x)
+            lt = self.codeLE(x, v - 1)
+            if lt != FALSE_CODE:
+                clause.append(lt)
+            le = self.codeLE(x, v)
+            if le != TRUE_CODE:
+                clause.append(-le)
+        for p in ps:
+            b = self.sugarBool(p)
+            if b is None:
+                return None
+            clause.append(-b.getCode() if sol.getValue(p) else b.getCode())
+        return clause
+
+    def addClause(self, clause):
+        self.problem.addClause(JArray(JInt)(clause))
+        self.problem.done()
+
+    def newSatVariable(self):
+        self.problem.addVariables(1)
+        self.problem.commit()
+        return self.problem.variablesCount
 
     def decode(self, outFileName, csp):
         if self.encoder.decode(outFileName):
-            intNameValues = dict()
-            for v in self.sugarCsp.getIntegerVariables():
-                if not v.isAux():
-                    intNameValues[v.getName()] = v.getValue()
-            intValues = dict()
-            for x in csp.variables:
-                s = self.translator.toSugarName(x)
-                if s in intNameValues:
-                    intValues[x] = intNameValues[s]
-            boolNameValues = dict()
-            for v in self.sugarCsp.getBooleanVariables():
-                if not v.isAux():
-                    boolNameValues[v.getName()] = v.getValue()
-            boolValues = dict()
-            for p in csp.bools:
-                s = self.translator.toSugarName(p)
-                if s in boolNameValues:
-                    boolValues[p] = boolNameValues[s]
-            return Solution(intValues, boolValues)
+            return self.solution(csp)
         else:
             None
+
+    def decodeModel(self, model, csp):
+        if model is None:
+            return None
+        bits = modelToBitSet(model)
+        for v in self.sugarCsp.getIntegerVariables():
+            if not v.isAux():
+                v.decode(bits)
+        for v in self.sugarCsp.getBooleanVariables():
+            if not v.isAux():
+                v.decode(bits)
+        return self.solution(csp)
+
+    def solution(self, csp):
+        intNameValues = dict()
+        for v in self.sugarCsp.getIntegerVariables():
+            if not v.isAux():
+                intNameValues[v.getName()] = v.getValue()
+        intValues = dict()
+        for x in csp.variables:
+            s = self.translator.toSugarName(x)
+            if s in intNameValues:
+                intValues[x] = intNameValues[s]
+        boolNameValues = dict()
+        for v in self.sugarCsp.getBooleanVariables():
+            if not v.isAux():
+                boolNameValues[v.getName()] = v.getValue()
+        boolValues = dict()
+        for p in csp.bools:
+            s = self.translator.toSugarName(p)
+            if s in boolNameValues:
+                boolValues[p] = boolNameValues[s]
+        return Solution(intValues, boolValues, csp)
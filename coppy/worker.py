@@ -0,0 +1,27 @@
+"""
+Worker process of solveAll(jobs=n)
+Enumerate the solutions of some cubes: the pickled task is read from stdin
+and the pickled solutions of each cube (as variable name and value pairs) are written to the file given as argument
+"""
+import sys
+import pickle
+from .coppy import *
+
+def main(outFileName):
+    task = pickle.load(sys.stdin.buffer)
+    csp.setAll(*task['csp'])
+    csp.clearObjective()
+    useEncoder(task['encoder'])
+    res = []
+    for cube in task['cubes']:
+        varsSize, boolsSize, consSize = csp.size()
+        csp.add([And(lo <= x, x <= hi) for (x, lo, hi) in cube])
+        sols = solveAll(*task['solver'], project=task['project'])
+        # plain Python values, so that the parent can read them without a JVM
+        res.append([([(str(x.name), int(v)) for x, v in sol.intValues.items()], [(str(p.name), bool(v)) for p, v in sol.boolValues.items()]) for sol in sols])
+        csp.cancel(varsSize, boolsSize, consSize)
+    with open(outFileName, 'wb') as f:
+        pickle.dump(res, f)
+
+if __name__ == '__main__':
+    main(sys.argv[1])
@@ -6,6 +6,9 @@ setup(
     install_requires=[
         'JPype1'
     ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     description="Constraint Programming in Python",
     author='Takane Ohmori',
     packages=find_packages(),
@@ -0,0 +1,36 @@
+"""
+Brute-force references for the tests
+"""
+import itertools
+from coppy import *
+
+def domainValues(d):
+    if isinstance(d, SetDomain):
+        return sorted(d.values)
+    return list(range(d.lb(), d.ub() + 1))
+
+def bruteForce(csp, xs, ps=(), cs=None):
+    """
+    Set of the tuples of the values of xs then ps satisfying the constraints cs (those of csp by default)
+    """
+    cs = csp.constraints if cs is None else cs
+    res = set()
+    for vs in itertools.product(*[domainValues(csp.dom[x]) for x in xs], *[(False, True) for p in ps]):
+        sol = Solution(dict(zip(xs, vs[:len(xs)])), dict(zip(ps, vs[len(xs):])))
+        if all([c.value(sol) for c in cs]):
+            res.add(tuple(vs))
+    return res
+
+def values(sol, xs, ps=()):
+    return tuple([int(sol.getValue(x)) for x in xs] + [bool(sol.getValue(p)) for p in ps])
+
+def runScript(script):
+    """
+    Run a Python script in a fresh process and return the words of its output
+    """
+    import subprocess, sys, os
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get('PYTHONPATH', '')]))
+    out = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=300)
+    assert out.returncode == 0, out.stderr
+    return out.stdout.split()
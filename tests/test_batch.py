@@ -0,0 +1,68 @@
+import itertools
+import pytest
+from coppy import *
+
+np = pytest.importorskip('numpy')
+
+def batchModel():
+    m = Model()
+    with m:
+        a, b = Ints('a b', -2, 2)
+        c = Int('c', {0, 1, 3})
+        p = Bool('p')
+        add(Alldifferent(a, b, c), Imp(p, a // 2 >= b % 2) | (Abs(a) == Max(b, c) - Min(a, 1)))
+        add(Iff(p, If(a > b, a, b) != 0), Table([a, c], [(0, 1), (1, 3), (-2, 0), (2, 1)]) | Xor(p, a * b > 0))
+        add(Element(b + 2, [3, 1, 0, 1, 3], c) | Disjunctive([a, b], [1, 2]))
+    return m, [a, b, c], [p]
+
+def allRows(xs):
+    # rows of all the assignments of the domains widened by 1 (some out of the domains)
+    ranges = [range(-3, 5) for x in xs]
+    ints = np.array(list(itertools.product(*ranges)), dtype=np.int64)
+    ints = np.repeat(ints, 2, axis=0)
+    bools = np.tile(np.array([[False], [True]]), (len(ints) // 2, 1))
+    return ints, bools
+
+def test_evaluate():
+    m, xs, ps = batchModel()
+    ints, bools = allRows(xs)
+    sols = [Solution(dict(zip(xs, map(int, row))), dict(zip(ps, map(bool, bs)))) for (row, bs) in zip(ints, bools)]
+    terms = [xs[0] // (xs[2] + 4), xs[0] % 3, xs[1] - 2 * xs[0] + 1, Abs(xs[1]), If(ps[0], xs[0], xs[2])]
+    with m:
+        for e in terms + m.csp.constraints:
+            assert evaluate(e, ints, bools).tolist() == [e.value(sol) for sol in sols]
+    m.close()
+
+def test_checkSolutions():
+    m, xs, ps = batchModel()
+    ints, bools = allRows(xs)
+    sols = [Solution(dict(zip(xs, map(int, row))), dict(zip(ps, map(bool, bs)))) for (row, bs) in zip(ints, bools)]
+    with m:
+        mask, violations = checkSolutions(ints, bools)
+        assert mask.tolist() == [m.csp.satisfiedBy(sol) for sol in sols]
+        assert violations.tolist() == [sum([not c.value(sol) for sol in sols]) for c in m.csp.constraints]
+        ints, bools = solutionMatrix(solveAll())
+        assert len(ints) == mask.sum() > 0
+        assert checkSolutions(ints, bools)[0].all()
+    m.close()
+
+def test_scheduling():
+    rng = np.random.default_rng(1)
+    with Model() as m:
+        ss, ds, hs = IntList('s', 6, 0, 6), IntList('d', 6, -1, 3), IntList('h', 6, 0, 3)
+        c = Int('c', 0, 6)
+        xs = ss + ds + hs + [c]
+        ints = rng.integers(0, 7, (2000, len(xs)))
+        ints[:, 6:12] = rng.integers(-1, 4, (2000, 6))
+        ints[:, 12:18] = rng.integers(0, 4, (2000, 6))
+        rows = ints.tolist()
+        cumulative = evaluate(Cumulative(ss, ds, hs, c), ints)
+        assert cumulative.tolist() == [cumulativeHolds(r[:6], r[6:12], r[12:18], r[18]) for r in rows]
+        assert 0 < cumulative.sum() < len(rows)
+        disjunctive = evaluate(Disjunctive(ss, ds), ints)
+        assert disjunctive.tolist() == [disjunctiveHolds(r[:6], r[6:12]) for r in rows]
+        assert 0 < disjunctive.sum() < len(rows)
+        # no task
+        assert evaluate(Cumulative([], [], [], c), ints).all()
+        assert evaluate(Disjunctive([], []), ints).all()
+    m.close()
@@ -0,0 +1,77 @@
+import itertools
+import pickle
+import pytest
+from coppy import *
+from coppy.compiler import maxChain
+
+def test_compiledValues():
+    with Model() as m:
+        a, b = Ints('a b', -2, 2)
+        c = Int('c', {1, 3})
+        p, q = Bool('p'), Bool('q')
+        s = a + 2 * b
+        es = [s, a * b - c, a // c, a % c, Abs(s) + Max(a, b, c) - Min(b, 0), If(p, s, c), -(b - a),
+              Alldifferent(a, b, c), Imp(p, s >= c), Iff(Xor(p, q), a < b), Or(And(p, ~q), s != 0, b == c)]
+        for e in es:
+            assert e.compiled(m.csp)
+        for (va, vb, vc, vp, vq) in itertools.product(range(-2, 3), range(-2, 3), (1, 3), (False, True), (False, True)):
+            sol = Solution({a: va, b: vb, c: vc}, {p: vp, q: vq})
+            for e in es:
+                assert sol.getValue(e) == e.value(sol)
+    m.close()
+
+def test_longChains():
+    # chains longer than maxChain are not nested in the generated code
+    with Model() as m:
+        xs = IntList('x', 4 * maxChain, 0, 3)
+        e = Sum([x * (i % 3 - 1) for (i, x) in enumerate(xs)]) + Max(*xs)
+        c = And([x <= 2 for x in xs] + [Or([x == 1 for x in xs])])
+        sol = Solution({x: i % 4 for (i, x) in enumerate(xs)}, {})
+        assert e.compiled(m.csp) and c.compiled(m.csp)
+        assert sol.getValue(e) == e.value(sol)
+        assert sol.getValue(c) is False
+    m.close()
+
+def test_missingValues():
+    # a variable without value raises as value() does
+    with Model() as m:
+        a, b, c = Ints('a b c', 0, 3)
+        p, q = Bool('p'), Bool('q')
+        sol = Solution({a: 1, b: 0}, {p: True})
+        assert sol.getValue(a + b) == 1
+        with pytest.raises(KeyError):
+            sol.getValue(a + c)
+        with pytest.raises(KeyError):
+            sol.getValue(Not(q))
+        add(Iff(p, q))
+        with pytest.raises(KeyError):
+            m.csp.satisfiedBy(Solution({a: 1, b: 0, c: 1}, {p: True}))
+    m.close()
+
+def test_undeclaredVariables():
+    with Model() as m:
+        a = Int('a', 0, 3)
+    m.close()
+    with Model() as m:
+        b = Int('b', 0, 3)
+        # a is not a variable of this CSP: the node is evaluated by value()
+        assert not (a + b).compiled(m.csp)
+        assert Solution({a: 2, b: 1}, {}).getValue(a + b) == 3
+    m.close()
+
+def test_compiledAfterCancel():
+    with Model() as m:
+        a = Int('a', 0, 3)
+        varsSize, boolsSize, consSize = m.csp.size()
+        b = Int('b', 0, 3)
+        e = a - b
+        assert Solution({a: 3, b: 1}, {}).getValue(e) == 2
+        m.csp.cancel(varsSize, boolsSize, consSize)
+        # the ids change, so the function is compiled again
+        c = Int('c', 0, 3)
+        b = Int('b', 0, 3)
+        assert Solution({a: 3, c: 0, b: 1}, {}).getValue(e) == 2
+        f = pickle.loads(pickle.dumps(e))
+        assert f.fn is None
+        assert Solution({a: 3, c: 0, b: 2}, {}).getValue(f) == 1
+    m.close()
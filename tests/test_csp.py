@@ -0,0 +1,187 @@
+import pytest
+from coppy import *
+from helpers import bruteForce, values
+
+def test_variableIds():
+    with Model() as m:
+        xs = IntList('x', 1000, 0, 1)
+        ps = BoolList('p', 10)
+        assert [m.csp.varId(x) for x in xs] == list(range(1000))
+        assert [m.csp.boolId(p) for p in ps] == list(range(10))
+        # a variable declared again keeps its id and domain
+        x = Int('x_3', 5, 9)
+        assert m.csp.varId(x) == 3
+        assert len(m.csp.variables) == 1000 and m.csp.dom[xs[3]].ub() == 1
+        varsSize, boolsSize, consSize = m.csp.size()
+        y = Int('y', 0, 1)
+        q = Bool('q')
+        assert m.csp.varId(y) == 1000 and m.csp.boolId(q) == 10
+        m.csp.cancel(varsSize, boolsSize, consSize)
+        assert 'y' not in m.csp.varIds and 'q' not in m.csp.boolIds
+        y = Int('y', 0, 1)
+        assert m.csp.varId(y) == 1000
+    m.close()
+
+def test_undeclaredVariables():
+    with Model() as m:
+        a = Int('a', 0, 1)
+    m.close()
+    with Model() as m:
+        b = Int('b', 0, 1)
+        p = Bool('p')
+        with pytest.raises(Exception, match='undeclared int variables a'):
+            add(a + b == 1)
+        add(b == 1, Or(p, b == 0))
+        assert len(m.csp.constraints) == 2
+    m.close()
+
+def test_setAll():
+    with Model() as m:
+        a, b = Ints('a b', 0, 2)
+        add(a < b)
+        task = m.csp.getAll()
+    m.close()
+    with Model() as m:
+        m.csp.setAll(*task)
+        assert m.csp.varId(a) == 0 and m.csp.varId(b) == 1
+        assert len(solveAll()) == len(bruteForce(m.csp, [a, b])) == 3
+    m.close()
+
+def test_compactNodes():
+    import pickle
+    with Model() as m:
+        a, b = Ints('a b', 0, 3)
+        p = Bool('p')
+        c = Or(And(a <= b, p), Iff(p, Not(b <= a)), a + b == 2)
+        for node in (c, a <= b, a + b, p):
+            assert not hasattr(node, '__dict__')
+        vs = c.variables()
+        assert [x.name for x in vs] == ['a', 'b']
+        assert [q.name for q in c.bools()] == ['p']
+        assert c.variables() is vs
+        d = pickle.loads(pickle.dumps(c))
+        assert str(d) == str(c)
+        assert [x.name for x in d.variables()] == ['a', 'b']
+    m.close()
+
+def test_deepNodes():
+    # the variables of deep nodes are collected without recursion
+    with Model() as m:
+        xs = IntList('x', 10, 0, 1)
+        c = xs[0] == 0
+        for i in range(20000):
+            c = Or(c, xs[i % 10] == 1) if i % 2 else And(c, xs[i % 10] <= 1)
+        assert [x.name for x in c.variables()] == [x.name for x in xs]
+    m.close()
+
+def test_interning():
+    with Model() as m:
+        a, b = Ints('a b', 0, 3)
+        assert (a + b) is not (a + b)
+        setInterning()
+        try:
+            s = a + b
+            assert (a + b) is s
+            assert (s <= 3) is (a + b <= 3)
+            assert Num(2) is Num(2)
+            assert LinearExpr([a], [1], 2) is LinearExpr([a], [1], 2)
+            e = LinearExpr([a], [1], const=2)
+            assert e is not LinearExpr([a], [1], const=3) and e.const == 2
+            c, d = Int('c', 0, 1), Int('d', 0, 1)
+            assert c is not d
+            add(s <= 3, Or(a + b <= 3, a == b), c + d == 1)
+            assert len(solveAll()) == len(bruteForce(m.csp, [a, b, c, d])) == 20
+        finally:
+            setInterning(False)
+        assert (a + b) is not s
+    m.close()
+
+def test_sharedTranslation():
+    from coppy.sugar import Translator
+    def translatedNodes():
+        with Model() as m:
+            a, b = Ints('a b', 0, 3)
+            c = And(a + b <= 3, a + b >= 1, Or(a + b <= 2, b == 0))
+        m.close()
+        t = Translator()
+        t.toSugarConstraint(c)
+        return len(t.sugarExprMap)
+    n = translatedNodes()
+    setInterning()
+    try:
+        assert translatedNodes() < n
+    finally:
+        setInterning(False)
+
+def test_translationCacheIsCleared():
+    for mode in ('expr', 'text'):
+        setTransport(mode)
+        try:
+            with Model() as m:
+                a, b = Ints('a b', 0, 3)
+                s = a + b
+                add(s >= 2, Table([a, b], [(0, 2), (1, 1), (2, 3), (3, 3)]))
+                solver = m.solver = Solver('sat4j')
+                assert solver.encode(m.csp)
+                translator = solver.encoder.translator
+                assert len(translator.sugarExprMap) == 0
+                m.csp.commit()
+                solver.commit()
+                # a delta using the shared node and the relation of the table after the cache is cleared
+                m.csp.add(s <= 3, Table([b, a], [(0, 2), (1, 1), (3, 2)]))
+                solver.encodeDelta(m.csp)
+                assert len(translator.sugarExprMap) == 0
+                sol = solver.satSolve()
+                assert sol and (sol.getValue(a), sol.getValue(b)) == (1, 1)
+            m.close()
+        finally:
+            setTransport('expr')
+
+def test_linearExpr():
+    from coppy.csp import LinearExpr
+    with Model() as m:
+        a, b, c = Ints('a b c', -2, 2)
+        e = a + 2 * b - a + 3
+        assert isinstance(e, LinearExpr) and e.const == 3
+        xs, coefs = e.terms()
+        assert [x.name for x in xs] == ['b'] and coefs == [2]
+        s = sum([a, b, c, a])
+        assert isinstance(s, LinearExpr) and len(s.xs) == 4
+        assert [(x.name, k) for (x, k) in zip(*s.terms())] == [('a', 2), ('b', 1), ('c', 1)]
+        assert isinstance(-(a - 3 * c), LinearExpr)
+        assert isinstance(Num(2) * Num(3) + 1, Num)
+        # nonlinear terms and coefficients beyond int64 keep their node
+        assert not isinstance(a * b, LinearExpr)
+        assert not isinstance(2**70 * a, LinearExpr)
+        sol = Solution({a: 1, b: -2, c: 2}, {})
+        assert e.value(sol) == -1 and s.value(sol) == 2
+        add(e + s <= 0, 3 * (a - c) != b)
+    m.close()
+    counts = set()
+    for mode, encoderName in (('expr', 'sugar'), ('text', 'sugar'), ('expr', 'native')):
+        setTransport(mode)
+        try:
+            with Model(encoderName=encoderName) as m2:
+                m2.csp.setAll(*m.csp.getAll())
+                found = {values(sol, [a, b, c]) for sol in solveAll()}
+                assert found == bruteForce(m2.csp, [a, b, c])
+                counts.add(len(found))
+            m2.close()
+        finally:
+            setTransport('expr')
+    assert len(counts) == 1
+
+def test_reservedNames():
+    found = []
+    for mode in ('expr', 'text'):
+        setTransport(mode)
+        try:
+            with Model() as m:
+                a, b, c = Int('1', 0, 3), Int('add', 0, 3), Int('-2', 0, 3)
+                p, q = Bool('true'), Bool('not')
+                add(a + b == 3, Imp(p, a > c), Xor(p, q), Or(q, b == 0))
+                found.append({(*values(sol, [a, b, c]), sol.getValue(p), sol.getValue(q)) for sol in solveAll()})
+            m.close()
+        finally:
+            setTransport('expr')
+    assert found[0] == found[1] and len(found[0]) == 19
@@ -0,0 +1,76 @@
+from coppy import *
+from helpers import bruteForce, values
+
+def enumerationModel(encoderName='sugar'):
+    m = Model(encoderName=encoderName)
+    with m:
+        a, b, c = Ints('a b c', 0, 2)
+        p = Bool('p')
+        add(a <= b, Iff(p, b < c))
+    return m, [a, b, c], [p]
+
+def test_iterSolutions():
+    m, xs, ps = enumerationModel()
+    expected = bruteForce(m.csp, xs, ps)
+    with m:
+        size = m.csp.size()
+        found = [values(s, xs, ps) for s in iterSolutions()]
+        assert len(found) == len(expected) and set(found) == expected
+        assert m.csp.size() == size
+        assert len(list(iterSolutions(limit=3))) == 3
+        # a generator closed early restores the CSP
+        it = iterSolutions()
+        next(it)
+        it.close()
+        assert m.csp.size() == size
+        assert len(solveAll()) == len(expected)
+    m.close()
+
+def test_iterSolutionsTimeout():
+    with Model() as m:
+        xs = IntList('x', 8, 0, 9)
+        add(Alldifferent(xs))
+        assert len(list(iterSolutions(timeout=1e-9))) == 0
+    m.close()
+
+def test_projectedEnumeration():
+    for encoderName in ('sugar', 'native'):
+        m, xs, ps = enumerationModel(encoderName)
+        a, b, c = xs
+        expected = bruteForce(m.csp, xs, ps)
+        with m:
+            for project in ([a], [b, c], [a] + ps):
+                # positions of the projected variables in the brute-force tuples (by identity, == builds an Eq)
+                positions = [[id(y) for y in xs + ps].index(id(x)) for x in project]
+                found = [tuple([s.getValue(x) for x in project]) for s in solveAll(project=project)]
+                assert len(found) == len(set(found))
+                assert set(found) == {tuple([v[i] for i in positions]) for v in expected}
+                streamed = [tuple([s.getValue(x) for x in project]) for s in iterSolutions(project=project)]
+                assert sorted(streamed) == sorted(found)
+        m.close()
+
+def test_blockingClausesAddNoConstraint():
+    for encoderName in ('sugar', 'native'):
+        with Model(encoderName=encoderName) as m:
+            a, b = Ints('a b', 0, 3)
+            fixed = Int('fixed', 2, 2)
+            unused = Int('unused', {1, 5})
+            add(a < b, fixed <= b)
+            count = len(m.csp.constraints)
+            found = []
+            while solve() == sat:
+                assert len(m.csp.constraints) == count
+                found.append(tuple([solution(x) for x in (a, b, fixed, unused)]))
+            assert len(found) == len(set(found))
+            assert set(found) == bruteForce(m.csp, [a, b, fixed, unused])
+        m.close()
+
+def test_blockingConstraint():
+    from coppy.coppy import blocking
+    a, b = Ints('a b', 0, 1)
+    p = Bool('p')
+    sol = Solution({a: 0, b: 1}, {p: True})
+    c = blocking(sol, [a, b], [p])
+    assert not c.value(sol)
+    assert c.value(Solution({a: 0, b: 1}, {p: False}))
+    assert c.value(Solution({a: 1, b: 1}, {p: True}))
@@ -0,0 +1,197 @@
+import pytest
+from coppy import *
+
+# (encoder, transport) pairs translating the global constraints
+configurations = [('sugar', 'expr'), ('sugar', 'text'), ('native', 'expr')]
+
+def assertSolutions(build, expected):
+    """
+    Check that the values of the variables returned by build() in the solutions of its model are expected in each configuration
+    """
+    for (encoderName, mode) in configurations:
+        setTransport(mode)
+        try:
+            with Model(encoderName=encoderName) as m:
+                xs = build()
+                found = sorted([tuple([int(sol.getValue(x)) for x in xs]) for sol in solveAll()])
+            m.close()
+        finally:
+            setTransport('expr')
+        assert found == sorted(expected), (encoderName, mode)
+
+def test_emptyTables():
+    def table():
+        a, b = Ints('a b', 0, 1)
+        add(Table([a, b], []))
+        return [a, b]
+    assertSolutions(table, [])
+    def negativeTable():
+        a, b = Ints('a b', 0, 1)
+        add(NegativeTable([a, b], []))
+        return [a, b]
+    assertSolutions(negativeTable, [(0, 0), (0, 1), (1, 0), (1, 1)])
+    def reified():
+        a = Int('a', 0, 1)
+        p = Bool('p')
+        add(Iff(p, Table([a], [])))
+        return [a, p]
+    assertSolutions(reified, [(0, 0), (1, 0)])
+
+def test_tableTuples():
+    def duplicates():
+        # repeated tuples and values outside the domain
+        a = Int('a', 0, 3)
+        add(Table([a], [(1,), (1,), (5,), (3,)]))
+        return [a]
+    assertSolutions(duplicates, [(1,), (3,)])
+    def negated():
+        a, b = Ints('a b', 0, 1)
+        add(Not(Table([a, b], [(0, 0)])))
+        return [a, b]
+    assertSolutions(negated, [(0, 1), (1, 0), (1, 1)])
+    def sharedRelation():
+        a, b = Ints('a b', 0, 2)
+        add(Table([a, b], [(0, 1), (1, 2)]), Table([b, a], [(0, 1), (1, 2)]) | (a == 0))
+        return [a, b]
+    assertSolutions(sharedRelation, [(0, 1)])
+
+def test_tableArguments():
+    np = pytest.importorskip('numpy')
+    with Model() as m:
+        a, b = Ints('a b', 0, 2)
+        t = Table([a, b], np.array([[0, 1], [2, 2]]))
+        assert t.size() == 2
+        assert t.value(Solution({a: 2, b: 2}, {})) and not t.value(Solution({a: 2, b: 1}, {}))
+        assert not NegativeTable([a, b], [(0, 1)]).value(Solution({a: 0, b: 1}, {}))
+        with pytest.raises(Exception):
+            Table([a, b], [(0, 1, 2)])
+        with pytest.raises(Exception):
+            Table([a, b], np.zeros((2, 3), dtype=int))
+        # compiled and batch evaluation
+        assert Solution({a: 1, b: 1}, {}).getValue(t) is False
+        assert evaluate(t, np.array([[0, 1], [2, 2]]), np.zeros((2, 0), dtype=bool)).tolist() == [True, True]
+        assert evaluate(NegativeTable([a, b], []), np.array([[0, 0]]), np.zeros((1, 0), dtype=bool)).tolist() == [True]
+    m.close()
+
+def test_tableOfTerms():
+    # a table of terms which are not variables is translated by its decomposition
+    with Model() as m:
+        a, b = Ints('a b', 0, 2)
+        add(Table([a + b, b], [(3, 1), (4, 2)]))
+        assert sorted([(sol.getValue(a), sol.getValue(b)) for sol in solveAll()]) == [(2, 1), (2, 2)]
+    m.close()
+
+def test_zeroDurations():
+    def cumulative():
+        # tasks of duration 0 use no resource, even beyond the capacity
+        s0, s1 = Ints('s0 s1', 0, 1)
+        add(Cumulative([s0, s1], [0, 0], [5, 5], 0))
+        return [s0, s1]
+    assertSolutions(cumulative, [(0, 0), (0, 1), (1, 0), (1, 1)])
+    def disjunctive():
+        # a task of variable duration 0 overlaps no task
+        s0, s1 = Ints('s0 s1', 0, 1)
+        d = Int('d', 0, 1)
+        add(Disjunctive([s0, s1], [d, 1]))
+        return [s0, s1, d]
+    assertSolutions(disjunctive, [(0, 0, 0), (0, 1, 0), (0, 1, 1), (1, 0, 0), (1, 0, 1), (1, 1, 0)])
+
+def test_resourceLimits():
+    def unitCapacity():
+        s0, s1 = Ints('s0 s1', 0, 2)
+        add(Cumulative([s0, s1], [1, 1], [1, 1], 1))
+        return [s0, s1]
+    assertSolutions(unitCapacity, [(0, 1), (0, 2), (1, 0), (1, 2), (2, 0), (2, 1)])
+    def overDemand():
+        s = Int('s', 0, 1)
+        add(Cumulative([s], [1], [3], 2))
+        return [s]
+    assertSolutions(overDemand, [])
+    def singleTask():
+        s = Int('s', 0, 1)
+        add(Disjunctive([s], [2]))
+        return [s]
+    assertSolutions(singleTask, [(0,), (1,)])
+    def negatedDisjunctive():
+        s0, s1 = Ints('s0 s1', 0, 2)
+        add(Not(Disjunctive([s0, s1], [2, 1])))
+        return [s0, s1]
+    assertSolutions(negatedDisjunctive, [(0, 0), (0, 1), (1, 1), (1, 2), (2, 2)])
+
+def test_schedulingValues():
+    np = pytest.importorskip('numpy')
+    # the load is checked after all the changes at a time
+    assert cumulativeHolds([0, 2], [2, 1], [2, 2], 2)
+    assert not cumulativeHolds([0, 1], [2, 1], [2, 1], 2)
+    assert disjunctiveHolds([0, 0, 2], [0, 2, 1])
+    assert not disjunctiveHolds([0, 1], [2, 1])
+    with Model() as m:
+        s0, s1, h = Ints('s0 s1 h', 0, 2)
+        c = Cumulative([s0, s1], [2, 1], [h, 1], 2)
+        d = Disjunctive([s0, s1], [2, 1])
+        rows = np.array([[0, 1, 1], [0, 1, 2], [0, 2, 2], [1, 0, 0]])
+        sols = [Solution({s0: int(r[0]), s1: int(r[1]), h: int(r[2])}, {}) for r in rows]
+        bools = np.zeros((len(rows), 0), dtype=bool)
+        assert [sol.getValue(c) for sol in sols] == [c.value(sol) for sol in sols] == [True, False, True, True]
+        assert [sol.getValue(d) for sol in sols] == [d.value(sol) for sol in sols] == [False, False, True, True]
+        assert evaluate(c, rows, bools).tolist() == [True, False, True, True]
+        assert evaluate(d, rows, bools).tolist() == [False, False, True, True]
+        # variable demands are encoded by Sugar
+        add(c, h >= 1)
+        expected = [(v0, v1, vh) for v0 in range(3) for v1 in range(3) for vh in (1, 2) if cumulativeHolds([v0, v1], [2, 1], [vh, 1], 2)]
+        assert sorted([(sol.getValue(s0), sol.getValue(s1), sol.getValue(h)) for sol in solveAll()]) == expected
+    m.close()
+
+def test_elementIndexRange():
+    def outOfRange():
+        # the index is restricted to the positions of the array
+        i = Int('i', -2, 5)
+        v = Int('v', 0, 9)
+        add(Element(i, [4, 7], v))
+        return [i, v]
+    assertSolutions(outOfRange, [(0, 4), (1, 7)])
+    def noPosition():
+        i = Int('i', 3, 5)
+        v = Int('v', 0, 9)
+        add(Element(i, [4, 7], v))
+        return [i, v]
+    assertSolutions(noPosition, [])
+    def negated():
+        i = Int('i', 0, 1)
+        v = Int('v', 0, 4)
+        add(Not(Element(i, [4, 7], v)))
+        return [i, v]
+    assertSolutions(negated, [(0, 0), (0, 1), (0, 2), (0, 3), (1, 0), (1, 1), (1, 2), (1, 3), (1, 4)])
+
+def test_elementOfVariables():
+    def single():
+        i = Int('i', 0, 3)
+        a, v = Ints('a v', 0, 2)
+        add(Element(i, [a], v))
+        return [i, a, v]
+    assertSolutions(single, [(0, 0, 0), (0, 1, 1), (0, 2, 2)])
+    def at():
+        xs = TermList([Int('x0', 0, 2), Int('x1', {1, 3}), 2])
+        i = Int('i', 0, 3)
+        add(xs[i] >= 3, xs[i + 1] == 2)
+        return [xs[0], xs[1], i]
+    assertSolutions(at, [(0, 3, 1), (1, 3, 1), (2, 3, 1)])
+
+def test_at():
+    np = pytest.importorskip('numpy')
+    with Model() as m:
+        i = Int('i', -1, 2)
+        v = At([5, Num(7)], i)
+        assert v.aux and m.csp.dom[v].values == {5, 7}
+        assert isinstance(TermList([i, v])[1:], TermList)
+        e = Element(i, [5, 7], v)
+        rows = np.array([[0, 5], [1, 7], [1, 5], [-1, 5], [2, 7]])
+        sols = [Solution({i: int(r[0]), v: int(r[1])}, {}) for r in rows]
+        assert [sol.getValue(e) for sol in sols] == [e.value(sol) for sol in sols] == [True, True, False, False, False]
+        assert evaluate(e, rows, np.zeros((len(rows), 0), dtype=bool)).tolist() == [True, True, False, False, False]
+        assert sorted([(sol.getValue(i), sol.getValue(v)) for sol in solveAll()]) == [(0, 5), (1, 7)]
+        with pytest.raises(Exception):
+            At([], i)
+        with pytest.raises(Exception):
+            At([i + 1], i)
+    m.close()
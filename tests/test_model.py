@@ -0,0 +1,100 @@
+import threading
+from coppy import *
+from helpers import bruteForce, runScript
+
+def test_solveThenSolveAll():
+    with Model() as m:
+        a, b = Ints('a b', 0, 4)
+        add(a + b <= 5)
+        assert solve() == sat
+        assert len(solveAll()) == len(bruteForce(m.csp, [a, b])) == 19
+        # solve() starts again after solveAll()
+        assert solve() == sat
+        assert solve() == sat
+    m.close()
+
+def test_solveAfterOptimization():
+    with Model() as m:
+        a, b = Ints('a b', 0, 4)
+        add(a + b <= 5)
+        minimize(a)
+        assert solve() == 0
+        clearObjective()
+        assert len(solveAll()) == 19
+        found = set()
+        while solve() == sat:
+            found.add((solution(a), solution(b)))
+        assert found == bruteForce(m.csp, [a, b])
+    m.close()
+
+def test_clearObjectiveDuringEnumeration():
+    with Model() as m:
+        a, b = Ints('a b', 0, 4)
+        add(a + b <= 5)
+        assert solve() == sat
+        maximize(b)
+        assert solve() == 4
+        clearObjective()
+        count = 0
+        while solve() == sat:
+            count += 1
+        assert count == 19
+    m.close()
+
+def test_modelsInThreads():
+    counts = {}
+    def run(n):
+        with Model() as m:
+            a, b = Ints('a b', 0, n)
+            add(a < b)
+            counts[n] = len(solveAll())
+        m.close()
+    threads = [threading.Thread(target=run, args=(n,)) for n in (2, 3, 4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counts == {2: 3, 3: 6, 4: 10}
+
+def test_lazyJVM():
+    # the JVM is started by the first solve; it is destroyed at exit unless started by another thread
+    script = '\n'.join([
+        'import threading, jpype.config',
+        'from coppy import *',
+        'import coppy.sugar',
+        'def run():',
+        '    with Model() as m:',
+        '        a = Int("a", 0, 2)',
+        '        add(a > 0)',
+        '        print(coppy.sugar.javaSugar is None, solve() == sat)',
+        '    m.close()',
+        'if THREAD:',
+        '    t = threading.Thread(target=run)',
+        '    t.start()',
+        '    t.join()',
+        'else:',
+        '    run()',
+        'print(jpype.config.destroy_jvm)'])
+    assert runScript('THREAD = False\n' + script) == ['True', 'True', 'True']
+    assert runScript('THREAD = True\n' + script) == ['True', 'True', 'False']
+
+def test_dumpWithoutJVM(tmp_path):
+    fileName = str(tmp_path / 'model.csp')
+    script = '\n'.join([
+        'from coppy import *',
+        'import coppy.sugar',
+        'with Model() as m:',
+        '    a, b = Ints("a b", 0, 3)',
+        '    p = Bool("p")',
+        '    add(Imp(p, a + 2 * b <= 4), Table([a, b], [(0, 1), (2, 1)]) | (a == b))',
+        '    maximize(a)',
+        f'    dump({fileName!r})',
+        '    print(coppy.sugar.javaSugar is None)',
+        'm.close()'])
+    assert runScript(script) == ['True']
+    with open(fileName) as f:
+        text = f.read()
+    assert text.startswith('(int a 0 3)\n(int b 0 3)\n(bool p)\n(objective maximize a)\n')
+    # the file is read back by Sugar
+    from coppy.sugar import TextTranslator
+    assert len(TextTranslator().parseSugarText([text])) == 7
@@ -0,0 +1,94 @@
+from coppy import *
+from coppy.native import NativeEncoder
+from helpers import bruteForce, values
+
+def test_nativeEncoding():
+    with Model(encoderName='native') as m:
+        a, b, c = Ints('a b c', -1, 2)
+        d = Int('d', {0, 3, 5})
+        p, q = Bool('p'), Bool('q')
+        add(Alldifferent(a, b, c), a + 2 * b - c != d - 3, Imp(p, a < b), Xor(q, c >= 1) | (d == 3), Iff(p, ~q))
+        found = set()
+        for sol in m.iterSolutions():
+            assert isinstance(m.solver.encoder, NativeEncoder)
+            found.add(values(sol, [a, b, c, d], [p, q]))
+        assert found == bruteForce(m.csp, [a, b, c, d], [p, q])
+    m.close()
+
+def test_unsupportedConstraintUsesSugar():
+    with Model(encoderName='native') as m:
+        a, b = Ints('a b', 0, 3)
+        add(a * b == 2)
+        found = set()
+        for sol in m.iterSolutions():
+            assert not isinstance(m.solver.encoder, NativeEncoder)
+            found.add(values(sol, [a, b]))
+        assert found == {(1, 2), (2, 1)}
+    m.close()
+
+def test_unsupportedDelta():
+    with Model() as m:
+        a, b = Ints('a b', 0, 3)
+        add(a + b == 3)
+        solver = m.solver = Solver('sat4j', encoderName='native')
+        assert solver.encode(m.csp)
+        assert isinstance(solver.encoder, NativeEncoder)
+        m.csp.commit()
+        solver.commit()
+        # the committed CSP is encoded again by Sugar with the delta
+        m.csp.add(a * b == 2, a > b)
+        solver.encodeDelta(m.csp)
+        assert not isinstance(solver.encoder, NativeEncoder)
+        sol = solver.satSolve(commit=False)
+        assert sol and values(sol, [a, b]) == (2, 1)
+        # the delta is cancelled as with Sugar
+        m.csp.cancel()
+        solver.cancel()
+        m.csp.add(a == 0)
+        solver.encodeDelta(m.csp)
+        sol = solver.satSolve(commit=False)
+        assert sol and values(sol, [a, b]) == (0, 3)
+        m.csp.cancel()
+        solver.cancel()
+        m.csp.add(a * b == 1)
+        solver.encodeDelta(m.csp)
+        assert solver.satSolve(commit=False) is None
+    m.close()
+
+def test_unsupportedDeltaOfAnUnsatisfiableCsp():
+    with Model() as m:
+        a, b, c = Ints('a b c', 0, 1)
+        # unsatisfiable for Sugar before the SAT solver runs, not for NativeEncoder
+        add(Alldifferent(a, b, c))
+        solver = m.solver = Solver('sat4j', encoderName='native')
+        assert solver.encode(m.csp)
+        m.csp.commit()
+        solver.commit()
+        m.csp.add(a * b == 0)
+        solver.encodeDelta(m.csp)
+        assert isinstance(solver.encoder, NativeEncoder)
+        assert solver.satSolve(commit=False) is None
+    m.close()
+
+def test_emptyClauses():
+    # constraints giving clauses of no literal, alone or under a guard
+    def models():
+        yield lambda x, p: [Or([])]
+        yield lambda x, p: [Not(And([]))]
+        yield lambda x, p: [Not(Disjunctive([x], [2]))]
+        yield lambda x, p: [Or(p, Or([])), Imp(p, x == 1)]
+        yield lambda x, p: [Iff(p, Not(And([]))), x <= 1]
+    results = []
+    for build in models():
+        found = []
+        for encoderName in ('sugar', 'native'):
+            with Model(encoderName=encoderName) as m:
+                x = Int('x', 0, 2)
+                p = Bool('p')
+                add(build(x, p))
+                found.append(sorted([values(sol, [x], [p]) for sol in solveAll()]))
+            m.close()
+        assert found[0] == found[1]
+        results.append(found[0])
+    assert results[:3] == [[], [], []]
+    assert results[3] == [(1, True)] and results[4] == [(0, False), (1, False)]
@@ -0,0 +1,77 @@
+from coppy import *
+from helpers import bruteForce
+
+def test_probeBoundsByAssumptions():
+    with Model() as m:
+        a, b = Ints('a b', 0, 9)
+        add(a + b == 9, a != 4)
+        m.solver = Solver('sat4j')
+        assert m.solver.encode(m.csp)
+        m.csp.commit()
+        m.solver.commit()
+        size = m.csp.size()
+        assert m.solver.canAssumeBounds(a)
+        sol = m.probeBounds(a, 3, 5)
+        assert sol and sol.getValue(a) in (3, 5)
+        assert m.probeBounds(a, 4, 4) is None
+        # a failed probe leaves nothing behind
+        sol = m.probeBounds(a, 0, 0)
+        assert sol and sol.getValue(b) == 9
+        assert m.csp.size() == size
+    m.close()
+
+def optimumModel(encoderName, maximizing):
+    m = Model(encoderName=encoderName)
+    with m:
+        xs = IntList('x', 3, 0, 4)
+        c = Int('c', -20, 20)
+        add(c == xs[0] * 2 - xs[1] + 3 * xs[2] - 4, Alldifferent(xs), xs[0] + xs[2] <= 5)
+        if maximizing:
+            maximize(c)
+        else:
+            minimize(c)
+    values = [v[-1] for v in bruteForce(m.csp, xs + [c])]
+    return m, c, max(values) if maximizing else min(values)
+
+def test_strategiesFindTheOptimum():
+    for encoderName in ('sugar', 'native'):
+        for strategy in strategies:
+            for maximizing in (False, True):
+                m, c, expected = optimumModel(encoderName, maximizing)
+                seen = []
+                with m:
+                    res = optimize(strategy, callback=lambda v, sol: seen.append(int(v)))
+                    assert res == expected, (encoderName, strategy, maximizing)
+                    assert isOptimal()
+                    assert solution(c) == expected
+                    assert seen[-1] == expected
+                    # each callback value improves the previous one
+                    assert seen == sorted(seen, reverse=not maximizing) and len(set(seen)) == len(seen)
+                m.close()
+
+def test_solveOptimizesWithTheObjective():
+    m, c, expected = optimumModel('sugar', False)
+    with m:
+        assert solve() == expected
+        assert isOptimal()
+    m.close()
+
+def test_optimizeTimeout():
+    with Model() as m:
+        xs = IntList('x', 6, 0, 9)
+        c = Int('c', 0, 60)
+        add(c == Sum(xs), Alldifferent(xs))
+        minimize(c)
+        assert optimize(timeout=1e-9) == unknown
+        assert not isOptimal()
+        assert optimize('unsat-sat') == 15
+    m.close()
+
+def test_optimizeUnsat():
+    with Model() as m:
+        a = Int('a', 0, 3)
+        add(a > 5)
+        minimize(a)
+        assert optimize() == unsat
+        assert isOptimal()
+    m.close()
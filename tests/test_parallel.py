@@ -0,0 +1,64 @@
+from coppy import *
+from helpers import bruteForce, values, runScript
+
+def test_portfolio():
+    members = ['sat4j:Default', 'sat4j:Glucose21']
+    with Model() as m:
+        a, b = Ints('a b', 0, 2)
+        add(a + b == 2)
+        sols = solveAll(solverName=members)
+        assert {values(s, [a, b]) for s in sols} == bruteForce(m.csp, [a, b])
+        assert len(sols) == 3
+        assert m.solver.stats['winner'] in members
+    m.close()
+    with Model() as m:
+        a = Int('a', 0, 2)
+        add(a > 2)
+        assert solve(solverName=members) == unsat
+    m.close()
+
+def test_defaultPortfolio():
+    members = defaultPortfolio(3)
+    assert 0 < len(members) <= 3
+    assert all([isinstance(s, (str, tuple)) for s in members])
+
+def cubeModel():
+    m = Model()
+    with m:
+        a, b, c = Ints('a b c', 0, 3)
+        p = Bool('p')
+        add(a + b + c <= 5, Imp(p, a < c))
+    return m, [a, b, c], [p]
+
+def test_cubesGiveAllSolutions():
+    m, xs, ps = cubeModel()
+    expected = bruteForce(m.csp, xs, ps)
+    with m:
+        for kwargs in ({}, {'split': xs[1]}, {'cubes': 3}):
+            sols = solveAll(jobs=2, **kwargs)
+            assert len(sols) == len(expected)
+            assert {values(s, xs, ps) for s in sols} == expected
+    m.close()
+
+def test_splitRange():
+    from coppy.coppy import splitRange
+    for (lo, hi, n) in [(0, 9, 3), (2, 3, 4), (-5, 5, 1), (7, 7, 2)]:
+        ranges = splitRange(lo, hi, n)
+        assert 0 < len(ranges) <= n
+        # disjoint ranges covering [lo, hi] in order
+        assert [v for (l, h) in ranges for v in range(l, h + 1)] == list(range(lo, hi + 1))
+
+def test_cubesInAFreshProcess():
+    # the parent process has not used Sugar (nor started the JVM) before solveAll
+    script = '\n'.join([
+        'from coppy import *',
+        'import coppy.sugar',
+        'with Model() as m:',
+        '    a, b = Ints("a b", 0, 4)',
+        '    p = Bool("p")',
+        '    add(a < b, Iff(p, a == 0))',
+        '    assert coppy.sugar.javaSugar is None',
+        '    sols = solveAll(jobs=2)',
+        '    print(len(sols), *sorted(set(type(v).__name__ for s in sols for v in list(s.intValues.values()) + list(s.boolValues.values()))))',
+        'm.close()'])
+    assert runScript(script) == ['10', 'bool', 'int']
@@ -0,0 +1,74 @@
+import csv
+import json
+import pytest
+from coppy import *
+
+np = pytest.importorskip('numpy')
+
+def test_columns():
+    with Model() as m:
+        a = Int('a', -1, 300)
+        b = Int('b', {0, 2, 5})
+        p = Bool('p')
+        sset = SolutionSet(chunkSize=2)
+        for (va, vb, vp) in [(300, 0, True), (-1, 5, False), (7, 2, True)]:
+            sset.append(Solution({a: va, b: vb}, {p: vp}))
+        # two rows are packed, the last one is pending
+        assert len(sset) == 3
+        assert sset[a].dtype == np.int16 and sset[b].dtype == np.int8 and sset[p].dtype == bool
+        assert sset[a].tolist() == [300, -1, 7] and sset['b'].tolist() == [0, 5, 2] and sset[p].tolist() == [True, False, True]
+        assert sset[a - 2 * b].tolist() == [300, -11, 3]
+        assert sset[Iff(p, a > b)].tolist() == [True, True, True]
+        assert sset[-1].getValue(a) == 7 and sset[1].getValue(p) is False
+        assert list(sset.columns()) == ['a', 'b', 'p']
+        with pytest.raises(KeyError):
+            sset['c']
+    m.close()
+
+def test_emptyAndProjected():
+    with Model() as m:
+        a, b = Ints('a b', 0, 3)
+        sset = SolutionSet()
+        assert len(sset) == 0 and sset[a].tolist() == [] and sset.matrix()[0].shape == (0, 2)
+        sset = SolutionSet(variables=[b], bools=[])
+        sset.append(Solution({a: 1, b: 2}, {}))
+        assert sset[b].tolist() == [2]
+        with pytest.raises(Exception):
+            sset[a + b]
+        # a solution without the value of a variable of the CSP
+        sset = SolutionSet()
+        sset.append(Solution({a: 1}, {}))
+        with pytest.raises(Exception):
+            sset.flush()
+    m.close()
+
+def test_sinks(tmp_path):
+    names = ['a', 'b', 'p']
+    rows = [(1, -2, True), (0, 3, False), (2, 0, False)]
+    with Model() as m:
+        a, b = Int('a', 0, 2), Int('b', -2, 3)
+        p = Bool('p')
+        sinks = [NdjsonSink(str(tmp_path / 'sols.ndjson')), CsvSink(str(tmp_path / 'sols.csv')), NpySink(str(tmp_path / 'sols.npy'))]
+        with SolutionSet(chunkSize=2, sinks=sinks, keep=False) as sset:
+            sset.extend([Solution({a: va, b: vb}, {p: vp}) for (va, vb, vp) in rows])
+        assert len(sset) == 3
+        with pytest.raises(Exception):
+            sset[a]
+    m.close()
+    with open(tmp_path / 'sols.ndjson') as f:
+        assert [tuple([json.loads(line)[name] for name in names]) for line in f] == rows
+    with open(tmp_path / 'sols.csv') as f:
+        lines = list(csv.reader(f))
+    assert lines[0] == names
+    assert [(int(va), int(vb), bool(int(vp))) for (va, vb, vp) in lines[1:]] == rows
+    array = np.load(tmp_path / 'sols.npy', mmap_mode='r')
+    assert array.dtype == np.int64 and array.tolist() == [[1, -2, 1], [0, 3, 0], [2, 0, 0]]
+
+def test_emptyNpySink(tmp_path):
+    with Model() as m:
+        a = Int('a', 0, 2)
+        add(a > 2)
+        with SolutionSet(sinks=[NpySink(str(tmp_path / 'sols.npy'))], keep=False) as sset:
+            sset.extend(m.iterSolutions())
+    m.close()
+    assert np.load(tmp_path / 'sols.npy').shape == (0, 1)
@@ -0,0 +1,120 @@
+import pytest
+from coppy import *
+from helpers import bruteForce, values
+
+def test_solveEnumeratesAllSolutions():
+    with Model() as m:
+        a, b = Ints('a b', 0, 3)
+        p = Bool('p')
+        add(a != b, Imp(p, a + b <= 2))
+        found = []
+        while solve() == sat:
+            found.append((int(solution(a)), int(solution(b)), bool(solution(p))))
+        assert len(found) == len(set(found))
+        assert set(found) == bruteForce(m.csp, [a, b], [p])
+        # the search restarts after unsat
+        assert solve() == sat
+    m.close()
+
+def test_liveSessionAcrossSolves():
+    with Model() as m:
+        a, b = Ints('a b', 0, 5)
+        add(a + b == 5)
+        assert solve() == sat
+        session = m.solver.session.solver
+        assert solve() == sat
+        assert m.solver.session.solver is session
+    m.close()
+
+def test_uncommittedClausesAreCancelled():
+    with Model() as m:
+        a, b = Ints('a b', 0, 5)
+        add(a + b == 5)
+        solver = m.solver = Solver('sat4j')
+        assert solver.encode(m.csp)
+        m.csp.commit()
+        solver.commit()
+        m.csp.add(a >= 4)
+        solver.encodeDelta(m.csp)
+        sol = solver.satSolve(commit=False)
+        assert sol and sol.getValue(a) >= 4
+        m.csp.cancel()
+        solver.cancel()
+        m.csp.add(a <= 0)
+        solver.encodeDelta(m.csp)
+        sol = solver.satSolve(commit=False)
+        assert sol and sol.getValue(a) == 0 and sol.getValue(b) == 5
+    m.close()
+
+def externalSolver(directory):
+    """
+    Command running sat4j as an external SAT solver (SAT competition output)
+    """
+    from coppy.sugar import javaCommand, sat4jPath
+    path = directory / 'sat4j.sh'
+    path.write_text(f'#!/bin/sh\nexec "{javaCommand()}" -jar "{sat4jPath}" "$@"\n')
+    path.chmod(0o755)
+    return str(path)
+
+def test_pipelinesGiveTheSameSolutions(tmp_path):
+    from coppy.sugar import memDir
+    command = externalSolver(tmp_path)
+    for (solverName, pipeline) in [('sat4j', 'memory'), (command, 'file'), (command, 'memory')]:
+        with Model() as m:
+            a, b = Ints('a b', -1, 1)
+            p = Bool('p')
+            add(Or(p, a < b), a * 2 != b, Imp(p, a == 0))
+            sols = solveAll(solverName=solverName, pipeline=pipeline)
+            assert {values(s, [a, b], [p]) for s in sols} == bruteForce(m.csp, [a, b], [p])
+            assert len(sols) == len(bruteForce(m.csp, [a, b], [p]))
+            if pipeline == 'memory':
+                assert m.solver.mapFileName is None
+                assert m.solver.workDir.startswith(memDir)
+        m.close()
+
+def test_modelToBitSet():
+    import coppy.sugar as sugar
+    sugar.startJVM()
+    for lits in ([1, -2, 3, -9, 10], [-1, -2], []):
+        expected = [lit for lit in lits if lit > 0]
+        for model in (lits, sugar.JArray(sugar.JInt)(lits)):
+            bits = sugar.modelToBitSet(model)
+            assert [i for i in range(12) if bits.get(i)] == expected
+
+def test_decodedSolutionsSatisfyTheCsp():
+    with Model() as m:
+        a = Int('a', {-3, 0, 2, 5})
+        b = Int('b', -2, 4)
+        p, q = Bools('p q')
+        add(Iff(p, a > b), Xor(p, q), a + b >= 1)
+        sols = solveAll()
+        assert all([m.satisfiedBy(s) for s in sols])
+        assert {values(s, [a, b], [p, q]) for s in sols} == bruteForce(m.csp, [a, b], [p, q])
+    m.close()
+
+def transportSolutions(mode):
+    """
+    Solutions and SAT sizes of a model translated with the given transport
+    """
+    setTransport(mode)
+    try:
+        with Model() as m:
+            # names escaped in the Sugar syntax
+            a = Int('a (1)', -2, 2)
+            b = Int('b.c', {0, 2, 3})
+            c = Int('c', 0, 3)
+            p = Bool('p q')
+            add(Alldifferent(a, b, c), Abs(a) + Max(b, c) - Min(a, c) <= 4)
+            add(Imp(p, If(a > 0, b, c) == 2), Xor(p, c % 2 == 0) | (c // 2 == 1))
+            found = {values(sol, [a, b, c], [p]) for sol in solveAll()}
+            assert found == bruteForce(m.csp, [a, b, c], [p])
+            sizes = (m.solver.stats['variables'], m.solver.stats['clauses'])
+        m.close()
+        return found, sizes
+    finally:
+        setTransport('expr')
+
+def test_transportsGiveTheSameEncoding():
+    assert transportSolutions('expr') == transportSolutions('text')
+    with pytest.raises(Exception):
+        setTransport('json')